@@ -5,6 +5,7 @@ Create 5 red-themed glitch art pieces for Fusion Art RED 2025
 """
 
 from src.glitch_effects import GlitchArtist
+from src import tone
 from PIL import Image
 import numpy as np
 import os
@@ -64,11 +65,9 @@ def create_red_pieces():
     
     # Red enhancement
     img_array2 = np.array(glitched2)
-    img_array2[:, :, 0] = np.clip(img_array2[:, :, 0] * 1.5, 0, 255)
-    img_array2[:, :, 1] = np.clip(img_array2[:, :, 1] * 0.5, 0, 255)
-    img_array2[:, :, 2] = np.clip(img_array2[:, :, 2] * 0.5, 0, 255)
+    tone.scale_channels(img_array2, (1.5, 0.5, 0.5))
     
-    Image.fromarray(img_array2.astype(np.uint8)).save(
+    Image.fromarray(img_array2).save(
         'examples_output/red_competition/02_crimson_corruption.png'
     )
     print("✅ Saved: 02_crimson_corruption.png (Red glitch static)\n")
@@ -126,11 +125,9 @@ def create_red_pieces():
     
     # Deep red tint
     img_array4 = np.array(glitched4)
-    img_array4[:, :, 0] = np.clip(img_array4[:, :, 0] * 1.4, 0, 255)
-    img_array4[:, :, 1] = np.clip(img_array4[:, :, 1] * 0.3, 0, 255)
-    img_array4[:, :, 2] = np.clip(img_array4[:, :, 2] * 0.3, 0, 255)
+    tone.scale_channels(img_array4, (1.4, 0.3, 0.3))
     
-    Image.fromarray(img_array4.astype(np.uint8)).save(
+    Image.fromarray(img_array4).save(
         'examples_output/red_competition/04_scarlet_decay.png'
     )
     print("✅ Saved: 04_scarlet_decay.png (Dark red glitch)\n")
@@ -4,12 +4,19 @@ NFT Ranking Web App
 Compare two random NFTs side-by-side and build a ranking over time
 """
 
-from flask import Flask, render_template, jsonify, request, send_from_directory
+from flask import Flask, render_template, jsonify, request, send_file
 import os
-import json
 import random
+import threading
+import time
 from pathlib import Path
 
+from catalog import Catalog
+from pair_scheduler import PairScheduler
+from ranking_db import SqliteRankingStore
+from ranking_store import DEFAULT_ELO, RankingStore, UnknownItem
+from thumbnails import FORMATS, IMAGE_SUFFIXES, ThumbnailCache, snap_width
+
 app = Flask(__name__)
 
 # Paths
@@ -19,124 +26,82 @@ NFT_DIRS = [
     '../imported_images',
 ]
 
+BASE_DIR = Path(__file__).parent.parent
 RANKINGS_FILE = 'rankings.json'
+VOTE_LOG_FILE = 'votes.jsonl'
+CATALOG_CACHE_FILE = '.catalog_cache.json'
+THUMBNAIL_DIR = '.thumbnails'
+MEDIA_MAX_AGE = 3600                 # Seconds browsers may reuse media fetched without a version
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600  # ...and with one (a changed file gets a new URL)
+VIDEO_SUFFIXES = ('.mp4', '.webm', '.mov')
 
 
-def is_valid_image_file(file_path):
-    """Check if file is actually a valid image/video"""
-    import subprocess
-    
-    try:
-        # Use 'file' command to check actual file type
-        result = subprocess.run(
-            ['file', '--mime-type', '-b', str(file_path)],
-            capture_output=True,
-            text=True,
-            timeout=2
-        )
-        
-        mime_type = result.stdout.strip()
-        
-        # Valid types
-        valid_types = [
-            'image/png', 'image/jpeg', 'image/gif', 'image/webp',
-            'video/mp4', 'video/quicktime', 'video/webm'
-        ]
-        
-        is_valid = any(valid in mime_type for valid in valid_types)
-        
-        if not is_valid:
-            print(f"⚠️  Skipping corrupted: {file_path.name} (type: {mime_type})")
-        
-        return is_valid
-        
-    except Exception as e:
-        # If check fails, assume it's valid
-        return True
-
-
-def get_all_nfts():
-    """Get list of all NFT image files (excluding corrupted)"""
-    nfts = []
-    
-    base_path = Path(__file__).parent.parent
-    
-    for nft_dir in NFT_DIRS:
-        path = Path(__file__).parent / nft_dir
-        if path.exists():
-            for file in path.glob('*'):
-                if file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif', '.mp4', '.webm', '.mov']:
-                    # Check if actually valid
-                    if is_valid_image_file(file):
-                        relative = str(file.relative_to(base_path))
-                        nfts.append({
-                            'path': str(file),
-                            'name': file.name,  # Full filename with extension
-                            'relative_path': relative
-                        })
-    
-    print(f"✅ Found {len(nfts)} valid NFTs (corrupted files filtered out)")
-    return nfts
+# Indexed once at startup; directories are rescanned only when they change
+catalog = Catalog(
+    [Path(__file__).parent / nft_dir for nft_dir in NFT_DIRS],
+    base_dir=BASE_DIR,
+    cache_path=Path(__file__).parent / CATALOG_CACHE_FILE,
+)
 
+# Display-sized copies of the images; the ones the pair cards use are rendered
+# in the background at startup (in a random order, so several worker processes
+# mostly work on different files). RANKER_PREWARM=0 turns that off.
+thumbnails = ThumbnailCache(Path(__file__).parent / THUMBNAIL_DIR)
+if os.environ.get('RANKER_PREWARM', '1') != '0':
+    thumbnails.prewarm(random.sample([nft['path'] for nft in catalog.items()], len(catalog)))
 
-def load_rankings():
-    """Load current rankings"""
-    rankings_path = Path(__file__).parent / RANKINGS_FILE
-    
-    if rankings_path.exists():
-        with open(rankings_path, 'r') as f:
-            existing = json.load(f)
-            
-            # Add any new NFTs that weren't in rankings yet
-            current_nfts = get_all_nfts()
-            for nft in current_nfts:
-                if nft['name'] not in existing:
-                    existing[nft['name']] = {
-                        'name': nft['name'],
-                        'path': nft['relative_path'],
-                        'elo': 1500,
-                        'wins': 0,
-                        'losses': 0,
-                        'comparisons': 0
-                    }
-            
-            return existing
-    
-    # Initialize with ELO ratings
-    nfts = get_all_nfts()
-    rankings = {}
-    
-    for nft in nfts:
-        rankings[nft['name']] = {
-            'name': nft['name'],
-            'path': nft['relative_path'],
-            'elo': 1500,  # Starting ELO rating
-            'wins': 0,
-            'losses': 0,
-            'comparisons': 0
-        }
+
+def nft_json(nft, elo=None):
+    """An NFT as the page needs it: name, versioned media URL, image or video"""
+    from urllib.parse import quote
     
-    return rankings
+    data = {
+        'name': nft['name'],
+        'path': '/nft/' + quote(nft['relative_path']) + '?v=' + nft['version'],
+        'kind': 'video' if nft['name'].lower().endswith(VIDEO_SUFFIXES) else 'image',
+    }
+    if elo is not None:
+        data['elo'] = round(elo)
+    return data
 
 
-def save_rankings(rankings):
-    """Save rankings to file"""
-    rankings_path = Path(__file__).parent / RANKINGS_FILE
-    with open(rankings_path, 'w') as f:
-        json.dump(rankings, f, indent=2)
+# Ratings live in memory, every vote is appended to votes.jsonl and a background
+# writer saves rankings.json; with RANKER_DB set they live in SQLite instead
+# (several worker processes can share it)
+if os.environ.get('RANKER_DB'):
+    store = SqliteRankingStore(os.environ['RANKER_DB'],
+                               import_json=Path(__file__).parent / RANKINGS_FILE)
+else:
+    store = RankingStore(Path(__file__).parent / RANKINGS_FILE,
+                         log_path=Path(__file__).parent / VOTE_LOG_FILE)
 
 
-def calculate_new_elo(winner_elo, loser_elo, k=32):
-    """Calculate new ELO ratings after a match"""
-    # Expected scores
-    expected_winner = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
-    expected_loser = 1 / (1 + 10 ** ((winner_elo - loser_elo) / 400))
-    
-    # New ratings
-    new_winner_elo = winner_elo + k * (1 - expected_winner)
-    new_loser_elo = loser_elo + k * (0 - expected_loser)
-    
-    return new_winner_elo, new_loser_elo
+# Picks informative pairs; ratings follow this process's votes and are re-read
+# from the store when the catalog changes or every SCHEDULER_RESYNC seconds
+scheduler = PairScheduler()
+SCHEDULER_RESYNC = 60.0
+TOURNAMENT_SIZES = range(4, 9)   # NFTs per tournament round
+DEFAULT_TOURNAMENT_SIZE = 6
+MAX_PAGE = 500                   # Most entries per leaderboard page
+MAX_PAIR_QUEUE = 10              # Most pairs per /api/random-pair request
+MAX_VOTE_BATCH = 100             # Most votes per /api/votes request
+PICK_ATTEMPTS = 3                # Picks (with a resync between) before giving up on missing files
+_scheduler_state = {'catalog_version': None, 'synced_at': 0.0}
+_scheduler_lock = threading.Lock()
+
+
+def sync_scheduler(force=False):
+    """Load the catalog's NFTs and their ratings into the pair scheduler if due (or force)"""
+    catalog.refresh(force=force)
+    store.sync_catalog(catalog)
+    with _scheduler_lock:
+        if (not force and catalog.version == _scheduler_state['catalog_version']
+                and time.monotonic() - _scheduler_state['synced_at'] < SCHEDULER_RESYNC):
+            return
+        rankings = store.snapshot()
+        scheduler.sync((nft['name'], rankings[nft['name']]['elo'], rankings[nft['name']]['comparisons'])
+                       for nft in catalog.items() if nft['name'] in rankings)
+        _scheduler_state.update(catalog_version=catalog.version, synced_at=time.monotonic())
 
 
 @app.route('/')
@@ -145,126 +110,301 @@ def index():
     return render_template('index.html')
 
 
+def next_catalog_group(size):
+    """
+    The scheduler's next `size` NFTs as catalog items, in random order
+
+    None if there are too few NFTs. A file removed since the scheduler was
+    synced forces a resync and another pick, up to PICK_ATTEMPTS picks
+    (then None too).
+    """
+    for _ in range(PICK_ATTEMPTS):
+        names = scheduler.next_group(size)
+        if names is None:
+            return None
+        nfts = [catalog.get(name) for name in random.sample(names, len(names))]
+        if None not in nfts:
+            return nfts
+        sync_scheduler(force=True)
+    return None
+
+
+def next_pair_json():
+    """The scheduler's next pair as {'nft1', 'nft2'} (sides shuffled); None if too few NFTs"""
+    pair = next_catalog_group(2)
+    if pair is None:
+        return None
+    
+    elo = [(store.get(nft['name']) or {}).get('elo', DEFAULT_ELO) for nft in pair]
+    return {'nft1': nft_json(pair[0], elo[0]), 'nft2': nft_json(pair[1], elo[1])}
+
+
 @app.route('/api/random-pair')
 def get_random_pair():
-    """Get two random NFTs to compare"""
-    from urllib.parse import quote
-    
-    nfts = get_all_nfts()
+    """
+    Get the next two NFTs to compare (least-compared NFT vs a close rating)
+
+    ?count=N returns {"pairs": [...]} with the next N pairs, for the page to queue
+    """
+    sync_scheduler()
+    count = request.args.get('count', type=int)
+    pairs = [next_pair_json() for _ in range(min(max(count or 1, 1), MAX_PAIR_QUEUE))]
     
-    if len(nfts) < 2:
+    if None in pairs:
         return jsonify({'error': 'Not enough NFTs'}), 400
     
-    pair = random.sample(nfts, 2)
-    
-    # URL encode the paths properly
-    return jsonify({
-        'nft1': {
-            'name': pair[0]['name'],
-            'path': '/nft/' + quote(pair[0]['relative_path'])
-        },
-        'nft2': {
-            'name': pair[1]['name'],
-            'path': '/nft/' + quote(pair[1]['relative_path'])
-        }
-    })
+    return jsonify({'pairs': pairs} if count else pairs[0])
+
+
+def vote_names(vote):
+    """(winner, loser) from a {"winner", "loser"} vote; (None, None) unless both are non-empty strings"""
+    if isinstance(vote, dict):
+        winner, loser = vote.get('winner'), vote.get('loser')
+        if isinstance(winner, str) and isinstance(loser, str) and winner and loser:
+            return winner, loser
+    return None, None
 
 
 @app.route('/api/vote', methods=['POST'])
 def record_vote():
     """Record a vote and update rankings"""
-    data = request.json
-    winner_name = data.get('winner')
-    loser_name = data.get('loser')
+    winner_name, loser_name = vote_names(request.get_json(silent=True))
     
     if not winner_name or not loser_name:
         return jsonify({'error': 'Missing winner or loser'}), 400
+    if winner_name == loser_name:
+        return jsonify({'error': 'Winner and loser are the same NFT'}), 400
+    
+    store.sync_catalog(catalog)
+    try:
+        new_winner_elo, new_loser_elo = store.record_vote(winner_name, loser_name)
+    except UnknownItem as e:
+        return jsonify({'error': f'Unknown NFT: {e.args[0]}'}), 400
+    scheduler.update(winner_name, new_winner_elo)
+    scheduler.update(loser_name, new_loser_elo)
+    
+    return jsonify({
+        'success': True,
+        'winner_new_elo': round(new_winner_elo),
+        'loser_new_elo': round(new_loser_elo)
+    })
+
+
+@app.route('/api/votes', methods=['POST'])
+def record_votes():
+    """
+    Record a batch of votes ({"votes": [{"winner", "loser"}, ...]}) in one update
+
+    The page queues votes and sends them together. Votes naming an NFT that
+    no longer exists are skipped rather than failing the batch.
+    """
+    data = request.get_json(silent=True)
+    votes = data.get('votes') if isinstance(data, dict) else None
+    if not isinstance(votes, list) or not 1 <= len(votes) <= MAX_VOTE_BATCH:
+        return jsonify({'error': f'votes must be a list of 1 to {MAX_VOTE_BATCH} votes'}), 400
+    
+    store.sync_catalog(catalog)
+    results, skipped = [], 0
+    for vote in votes:
+        winner, loser = vote_names(vote)
+        if winner and winner != loser and winner in store and loser in store:
+            results.append((winner, loser))
+        else:
+            skipped += 1
     
-    rankings = load_rankings()
+    new_elo = store.record_votes(results) if results else {}
+    for name, elo in new_elo.items():
+        scheduler.update(name, elo)
     
-    # Get current ELO ratings
-    winner_elo = rankings[winner_name]['elo']
-    loser_elo = rankings[loser_name]['elo']
+    return jsonify({
+        'success': True,
+        'recorded': len(results),
+        'skipped': skipped,
+        'new_elo': {name: round(elo) for name, elo in new_elo.items()}
+    })
+
+
+def tournament_results(data):
+    """
+    The (winner, loser) comparisons a tournament round implies
+
+    {"ranking": [best, ..., worst]} gives every pair in that order (k-1 + ... + 1
+    results); {"winner": name, "nfts": [all shown]} gives the winner over each other one.
+    """
+    def names(value):
+        return isinstance(value, list) and all(isinstance(name, str) and name for name in value)
+
+    if not isinstance(data, dict):
+        raise ValueError('Expected a JSON object')
+    if data.get('ranking'):
+        order = data['ranking']
+        if not names(order):
+            raise ValueError('ranking must be a list of NFT names')
+        results = [(a, b) for i, a in enumerate(order) for b in order[i + 1:]]
+    elif data.get('winner') and data.get('nfts'):
+        order, winner = data['nfts'], data['winner']
+        if not names(order) or not isinstance(winner, str):
+            raise ValueError('winner must be an NFT name and nfts a list of them')
+        if winner not in order:
+            raise ValueError('Winner is not one of the NFTs')
+        results = [(winner, other) for other in order if other != winner]
+    else:
+        raise ValueError('Missing ranking, or winner and nfts')
+    if not 2 <= len(order) <= max(TOURNAMENT_SIZES):
+        raise ValueError(f'A round has 2 to {max(TOURNAMENT_SIZES)} NFTs')
+    if len(set(order)) != len(order):
+        raise ValueError('The same NFT appears twice')
+    return results
+
+
+@app.route('/api/tournament')
+def get_tournament():
+    """Get the next k NFTs (?size=4..8) to rank against each other"""
+    size = request.args.get('size', DEFAULT_TOURNAMENT_SIZE, type=int)
+    if size not in TOURNAMENT_SIZES:
+        return jsonify({'error': f'size must be {min(TOURNAMENT_SIZES)} to {max(TOURNAMENT_SIZES)}'}), 400
     
-    # Calculate new ratings
-    new_winner_elo, new_loser_elo = calculate_new_elo(winner_elo, loser_elo)
+    sync_scheduler()
+    nfts = next_catalog_group(size)
     
-    # Update rankings
-    rankings[winner_name]['elo'] = new_winner_elo
-    rankings[winner_name]['wins'] += 1
-    rankings[winner_name]['comparisons'] += 1
+    if nfts is None:
+        return jsonify({'error': 'Not enough NFTs'}), 400
     
-    rankings[loser_name]['elo'] = new_loser_elo
-    rankings[loser_name]['losses'] += 1
-    rankings[loser_name]['comparisons'] += 1
+    return jsonify({'nfts': [nft_json(nft) for nft in nfts]})
+
+
+@app.route('/api/tournament/vote', methods=['POST'])
+def record_tournament_vote():
+    """Record a tournament round as all the pairwise results it implies"""
+    try:
+        results = tournament_results(request.get_json(silent=True) or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    save_rankings(rankings)
+    store.sync_catalog(catalog)
+    try:
+        new_elo = store.record_votes(results)
+    except UnknownItem as e:
+        return jsonify({'error': f'Unknown NFT: {e.args[0]}'}), 400
+    for name, elo in new_elo.items():
+        scheduler.update(name, elo)
     
     return jsonify({
         'success': True,
-        'winner_new_elo': round(new_winner_elo),
-        'loser_new_elo': round(new_loser_elo)
+        'comparisons': len(results),
+        'new_elo': {name: round(elo) for name, elo in new_elo.items()}
     })
 
 
+def versioned_json(build):
+    """
+    JSON response tagged with the rankings version
+
+    A client re-polling with If-None-Match gets a 304 without the body being
+    built while nothing has changed.
+    """
+    store.sync_catalog(catalog)
+    etag = store.state_version()
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'  # Cache, but revalidate every time
+    return response
+
+
+def ranking_method():
+    method = request.args.get('method', 'elo')
+    if method not in ('elo', 'bt'):
+        raise ValueError('method must be elo or bt')
+    return method
+
+
 @app.route('/api/rankings')
 def get_rankings():
-    """Get full rankings sorted by ELO"""
-    rankings = load_rankings()
-    
-    # Sort by ELO
-    sorted_rankings = sorted(
-        rankings.values(),
-        key=lambda x: x['elo'],
-        reverse=True
-    )
-    
-    return jsonify(sorted_rankings)
+    """Get full rankings sorted by ELO (?method=bt: Bradley-Terry scores with 95% intervals)"""
+    try:
+        method = ranking_method()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return versioned_json(lambda: store.ranked(method=method))
+
+
+@app.route('/api/leaderboard')
+def get_leaderboard():
+    """One page of the rankings (?offset=0&limit=50, optional ?method=bt)"""
+    try:
+        method = ranking_method()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    offset = max(0, request.args.get('offset', 0, type=int))
+    limit = min(max(1, request.args.get('limit', 50, type=int)), MAX_PAGE)
+
+    def build():
+        items = store.ranked(limit=limit, offset=offset, method=method)
+        for rank, item in enumerate(items, offset + 1):
+            item['rank'] = rank
+        return {'total': len(store), 'offset': offset, 'limit': limit, 'items': items}
+
+    return versioned_json(build)
+
+
+@app.route('/api/top')
+def get_top():
+    """The top k NFTs (?k=10, optional ?method=bt)"""
+    try:
+        method = ranking_method()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    k = min(max(1, request.args.get('k', 10, type=int)), MAX_PAGE)
+    return versioned_json(lambda: store.ranked(limit=k, method=method))
 
 
 @app.route('/api/stats')
 def get_stats():
     """Get statistics"""
-    rankings = load_rankings()
-    
-    total_comparisons = sum(r['comparisons'] for r in rankings.values()) // 2
-    total_nfts = len(rankings)
-    
-    # Get top 5 and bottom 5
-    sorted_rankings = sorted(rankings.values(), key=lambda x: x['elo'], reverse=True)
-    
-    return jsonify({
-        'total_nfts': total_nfts,
-        'total_comparisons': total_comparisons,
-        'top_5': sorted_rankings[:5],
-        'bottom_5': sorted_rankings[-5:] if len(sorted_rankings) >= 5 else []
-    })
+    return versioned_json(store.stats)
 
 
 @app.route('/nft/<path:filename>')
 def serve_nft(filename):
-    """Serve NFT images"""
+    """Serve NFT media (?w=<px>: a resized WebP/JPEG copy of an image)"""
     from urllib.parse import unquote
     
-    base_dir = Path(__file__).parent.parent
-    # Decode URL-encoded filename
+    # Decode URL-encoded filename; only files in the catalog are served
     decoded_filename = unquote(filename)
-    full_path = base_dir / decoded_filename
+    nft = catalog.get(os.path.basename(decoded_filename))
+    if nft is None or nft['relative_path'] != os.path.normpath(decoded_filename):
+        return "File not found", 404
+    full_path = nft['path']
+    if not os.path.isfile(full_path):
+        return "File not found", 404
     
-    print(f"📥 Request: {filename}")
-    print(f"   Decoded: {decoded_filename}")
-    print(f"   Full path: {full_path}")
-    print(f"   Exists: {full_path.exists()}")
+    # URLs from the API carry the file's version, so they can be cached for good
+    max_age = IMMUTABLE_MAX_AGE if request.args.get('v') else MEDIA_MAX_AGE
+    width = request.args.get('w', type=int)
     
-    try:
-        if not full_path.exists():
-            print(f"   ❌ File not found!")
-            return "File not found", 404
-        
-        return send_from_directory(base_dir, decoded_filename)
-    except Exception as e:
-        print(f"   ❌ Error serving: {e}")
-        return f"Error: {str(e)}", 500
+    if width and full_path.lower().endswith(IMAGE_SUFFIXES):
+        fmt = 'webp' if request.accept_mimetypes['image/webp'] else 'jpg'
+        try:
+            variant, name = thumbnails.get(full_path, snap_width(width), fmt)
+        except OSError as e:
+            print(f"⚠️  Serving the original of {decoded_filename}: {e}")
+        else:
+            response = send_file(variant, mimetype=FORMATS[fmt], etag=name, conditional=True, max_age=max_age)
+            response.vary.add('Accept')
+            return cache_forever(response, max_age)
+    
+    # Originals (and every video) with ETag, If-Modified-Since and Range support
+    response = send_file(full_path, conditional=True, max_age=max_age)
+    return cache_forever(response, max_age)
+
+
+def cache_forever(response, max_age):
+    if max_age == IMMUTABLE_MAX_AGE:
+        response.cache_control.immutable = True
+    return response
 
 
 if __name__ == '__main__':
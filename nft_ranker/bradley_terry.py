@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Bradley-Terry Ranking
+Maximum-likelihood strengths fitted to every comparison at once
+
+Where ELO nudges two ratings per vote (so the result depends on vote order),
+Bradley-Terry finds the strengths p that best explain all the results:
+P(i beats j) = p_i / (p_i + p_j). The fit takes Newton steps on the
+log-strengths using the diagonal of the Hessian, over the compared pairs only
+(sparse win counts) and vectorized with bincount. It converges several times
+faster than the classic MM iteration, and it starts from the previous
+solution, so refitting after a few new votes takes a few iterations.
+
+Every NFT also plays `prior` virtual wins and losses against an average NFT
+(strength 1). That keeps unbeaten or unvoted NFTs finite, anchors the scale
+and pulls NFTs with few votes towards the middle. Scores are reported on the
+ELO scale (1500 = average, 400 points = 10:1 odds) with a 95% interval.
+"""
+
+import math
+import threading
+
+import numpy as np
+
+
+SCALE = 400 / math.log(10)   # Log-strength -> ELO points
+Z95 = 1.96
+
+
+class BradleyTerry:
+    """Pairwise win counts and the strengths fitted to them"""
+
+    def __init__(self, prior=1.0, tol=1e-6, max_iter=300):
+        """
+        Args:
+            prior: Virtual wins and losses each NFT has against an average NFT
+            tol: Stop when no log-strength moves more than this
+            max_iter: Iterations per fit (a later fit carries on from there)
+        """
+        self.prior = prior
+        self.tol = tol
+        self.max_iter = max_iter
+
+        self.lock = threading.Lock()
+        self.pairs = {}           # i << 32 | j (i < j) -> slot
+        self.a = np.zeros(0, dtype=np.int64)
+        self.b = np.zeros(0, dtype=np.int64)
+        self.a_wins = np.zeros(0)  # Times a beat b
+        self.games = np.zeros(0)   # Times a and b met
+        self.base_wins = np.zeros(0)    # Results with no known opponent, e.g. votes
+        self.base_losses = np.zeros(0)  # from before the vote log (vs an average NFT)
+        self.theta = np.zeros(0)   # Log-strengths from the last fit
+        self.se = np.zeros(0)
+        self.votes = 0
+        self.fitted_votes = -1
+
+    def __len__(self):
+        return len(self.theta)
+
+    def _grow(self, n):
+        """Make room for items 0..n-1 (caller holds the lock)"""
+        if n > len(self.theta):
+            extra = n - len(self.theta)
+            self.theta = np.concatenate([self.theta, np.zeros(extra)])
+            self.se = np.concatenate([self.se, np.zeros(extra)])
+            self.base_wins = np.concatenate([self.base_wins, np.zeros(extra)])
+            self.base_losses = np.concatenate([self.base_losses, np.zeros(extra)])
+            self.fitted_votes = -1
+
+    def add(self, winner, loser):
+        """Count one result between item indices"""
+        self.add_many([winner], [loser])
+
+    def add_many(self, w, l):
+        """Count results from winner/loser index arrays"""
+        w, l = np.asarray(w, dtype=np.int64), np.asarray(l, dtype=np.int64)
+        if not len(w):
+            return
+        keys, inverse = np.unique(np.minimum(w, l) << 32 | np.maximum(w, l), return_inverse=True)
+        games = np.bincount(inverse, minlength=len(keys))
+        a_wins = np.bincount(inverse, w < l, minlength=len(keys))
+
+        with self.lock:
+            self._grow(int(max(w.max(), l.max())) + 1)
+            slots = np.array([self.pairs.get(k, -1) for k in keys.tolist()], dtype=np.int64)
+            new = slots < 0
+            if new.any():
+                start = len(self.pairs)
+                slots[new] = np.arange(start, start + int(new.sum()))
+                self.pairs.update(zip(keys[new].tolist(), slots[new].tolist()))
+                if len(self.pairs) > len(self.a):
+                    capacity = max(256, 2 * len(self.pairs))
+                    self.a = np.resize(self.a, capacity)
+                    self.b = np.resize(self.b, capacity)
+                    self.a_wins = np.resize(self.a_wins, capacity)
+                    self.games = np.resize(self.games, capacity)
+                self.a[slots[new]] = keys[new] >> 32
+                self.b[slots[new]] = keys[new] & 0xFFFFFFFF
+                self.a_wins[slots[new]] = self.games[slots[new]] = 0
+            self.games[slots] += games  # Keys are unique, so no slot repeats
+            self.a_wins[slots] += a_wins
+            self.votes += len(w)
+
+    def set_baseline(self, wins, losses):
+        """Results per item whose opponents aren't known (counted against an average NFT)"""
+        with self.lock:
+            self._grow(len(wins))
+            n = len(wins)
+            self.base_wins[:n] = np.maximum(wins, 0)
+            self.base_losses[:n] = np.maximum(losses, 0)
+            self.fitted_votes = -1
+
+    def fit(self, n=None):
+        """
+        Refit if there are new results
+
+        Args:
+            n: Number of items to return (items with no results yet get the prior)
+
+        Returns (theta, se) arrays: log-strengths and their standard errors.
+        """
+        with self.lock:
+            if n is not None:
+                self._grow(n)
+            if self.fitted_votes == self.votes:
+                return self.theta.copy(), self.se.copy()
+            m = len(self.pairs)
+            a, b = self.a[:m].copy(), self.b[:m].copy()
+            a_wins, games = self.a_wins[:m].copy(), self.games[:m].copy()
+            base_w = self.base_wins + self.prior
+            base_games = self.base_wins + self.base_losses + 2 * self.prior
+            theta = self.theta.copy()
+            votes = self.votes
+
+        n = len(theta)
+        wins = (np.bincount(a, a_wins, minlength=n) + np.bincount(b, games - a_wins, minlength=n)
+                + base_w)
+        for _ in range(self.max_iter):
+            p = np.exp(theta)
+            q = p[a] / (p[a] + p[b])           # P(a beats b)
+            q_base = p / (p + 1)               # P(beating the average NFT)
+            expected = (np.bincount(a, games * q, minlength=n) + np.bincount(b, games * (1 - q), minlength=n)
+                        + base_games * q_base)
+            pair_info = games * q * (1 - q)
+            info = (np.bincount(a, pair_info, minlength=n) + np.bincount(b, pair_info, minlength=n)
+                    + base_games * q_base * (1 - q_base))
+            step = np.clip((wins - expected) / info, -1.0, 1.0)
+            theta = theta + step
+            if not n or np.abs(step).max() < self.tol:
+                break
+
+        # Standard errors from the Fisher information (its diagonal)
+        se = 1 / np.sqrt(info)
+
+        with self.lock:
+            self.theta[:n], self.se[:n] = theta, se
+            self.fitted_votes = votes if len(self.theta) == n else -1
+            return self.theta.copy(), self.se.copy()
+
+    def scores(self, n=None):
+        """(score, low, high) arrays on the ELO scale"""
+        theta, se = self.fit(n)
+        score = 1500 + SCALE * theta
+        margin = Z95 * SCALE * se
+        return score, score - margin, score + margin
+
+
+def with_scores(entry, score, low, high):
+    """An entry with its Bradley-Terry score and 95% interval added"""
+    entry['bt_score'] = round(float(score), 1)
+    entry['bt_ci'] = [round(float(low), 1), round(float(high), 1)]
+    return entry
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+NFT Catalog
+In-memory index of the rankable files, built once and refreshed incrementally
+
+A directory is only rescanned when its mtime changes (files added, removed or
+renamed - the downloader renames complete files into place). Each file's
+type check is cached by (path, size, mtime) and persisted, so restarts don't
+re-check an unchanged collection either.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent / 'scripts'))
+from nft_media import NotMedia, sniff_file
+
+
+# Suffixes the ranker shows, and the content types it accepts behind them
+SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.mp4', '.webm', '.mov')
+VALID_TYPES = ('.png', '.jpg', '.gif', '.webp', '.mp4', '.webm', '.mov')
+
+CACHE_VERSION = 1
+
+
+class Catalog:
+    """Valid media files across several directories, keyed by file name"""
+
+    def __init__(self, dirs, base_dir, cache_path=None, refresh_interval=2.0):
+        """
+        Args:
+            dirs: Directories to index
+            base_dir: Directory relative paths are given from
+            cache_path: JSON file for validation results (None = memory only)
+            refresh_interval: Seconds between directory mtime checks
+        """
+        self.dirs = [Path(d) for d in dirs]
+        self.base_dir = Path(base_dir)
+        self.cache_path = cache_path
+        self.refresh_interval = refresh_interval
+
+        self.lock = threading.Lock()
+        self.version = 0          # Bumped whenever the set of items changes
+        self._dir_mtimes = {}     # dir -> mtime_ns at last scan
+        self._dir_items = {}      # dir -> {name: item}
+        self._dir_files = {}      # dir -> paths checked in the last scan
+        self._items = []
+        self._by_name = {}
+        self._checked_at = 0.0
+        self._validated = {}      # path -> [size, mtime_ns, ok]
+        self._cache_dirty = False
+
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self._validated = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+        self.refresh(force=True)
+
+    def items(self):
+        """Current items ({'path', 'name', 'relative_path', 'version'}), refreshing if due"""
+        self.refresh()
+        return self._items
+
+    def get(self, name):
+        self.refresh()
+        return self._by_name.get(name)
+
+    def __len__(self):
+        return len(self._items)
+
+    def refresh(self, force=False):
+        """Rescan directories whose mtime changed; returns True if the items changed"""
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.refresh_interval:
+            return False
+
+        with self.lock:
+            if not force and now - self._checked_at < self.refresh_interval:
+                return False
+            self._checked_at = now
+
+            changed = False
+            for directory in self.dirs:
+                try:
+                    mtime = directory.stat().st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime == self._dir_mtimes.get(directory) and directory in self._dir_items:
+                    continue
+                self._dir_mtimes[directory] = mtime
+                if mtime is not None:
+                    items = self._scan(directory)
+                else:
+                    items, self._dir_files[directory] = {}, set()
+                # Also a change when a file is replaced under the same name (new version)
+                if items != self._dir_items.get(directory):
+                    changed = True
+                self._dir_items[directory] = items
+
+            if changed or force:
+                by_name = {}
+                for directory in self.dirs:
+                    by_name.update(self._dir_items[directory])
+                self._by_name = by_name
+                self._items = list(by_name.values())
+                self.version += 1
+                print(f"✅ Found {len(self._items)} valid NFTs (corrupted files filtered out)")
+
+            self._save_cache()
+            return changed
+
+    def _scan(self, directory):
+        rel_dir = os.path.relpath(directory, self.base_dir)
+        items = {}
+        files = self._dir_files[directory] = set()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith(SUFFIXES) or not entry.is_file():
+                    continue
+                files.add(entry.path)
+                if self._is_valid(entry):
+                    items[entry.name] = {
+                        'path': entry.path,
+                        'name': entry.name,  # Full filename with extension
+                        'relative_path': os.path.join(rel_dir, entry.name),
+                        'version': f"{entry.stat().st_mtime_ns:x}",  # For cache-busting media URLs
+                    }
+        return items
+
+    def _is_valid(self, entry):
+        """Check the file's content type, using the cached result while it is unchanged"""
+        st = entry.stat()
+        cached = self._validated.get(entry.path)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+
+        try:
+            valid = sniff_file(entry.path) in VALID_TYPES
+            reason = 'not an image or video'
+        except (NotMedia, OSError) as e:
+            valid, reason = False, e
+        if not valid:
+            print(f"⚠️  Skipping corrupted: {entry.name} ({reason})")
+
+        self._validated[entry.path] = [st.st_size, st.st_mtime_ns, valid]
+        self._cache_dirty = True
+        return valid
+
+    def _save_cache(self):
+        if not self.cache_path or not self._cache_dirty:
+            return
+        live = set().union(*self._dir_files.values())
+        files = {p: v for p, v in self._validated.items() if p in live}
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'files': files}, f)
+            os.replace(tmp_path, self.cache_path)
+            self._cache_dirty = False
+        except OSError:
+            pass  # Only a startup optimisation
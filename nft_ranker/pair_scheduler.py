@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+Pair Scheduler
+Chooses the next comparison so each vote tells us as much as possible
+
+Uniform random pairs spend most votes on outcomes we can already predict,
+and an NFT nobody has voted on can go unseen for a long time. The scheduler
+instead:
+
+- Shows the NFT that has been shown least (never-voted NFTs first). A
+  min-heap keyed by times shown gives it in O(log n); stale heap entries are
+  skipped when popped.
+- Pairs it with an NFT of close rating, where the outcome is least certain.
+  NFTs sit in rating buckets (25 ELO points wide by default), so the partner
+  comes from the nearest non-empty buckets. It's the least shown of a few
+  candidates drawn from there.
+- Now and then (`explore`) picks a partner at random instead, so distant
+  parts of the ranking keep getting compared with each other.
+
+Times shown start at each NFT's comparison count, so an NFT with few votes is
+also an NFT whose rating is still uncertain.
+"""
+
+import heapq
+import random
+import threading
+
+
+class PairScheduler:
+    """Active pair selection over a set of named items with ratings"""
+
+    def __init__(self, bucket_width=25, explore=0.1, candidates=3, seed=None):
+        """
+        Args:
+            bucket_width: Rating points per bucket
+            explore: Chance of a random partner instead of a close one
+            candidates: Partners drawn from the nearest buckets (least shown wins)
+            seed: Random seed (for reproducible tests)
+        """
+        self.bucket_width = bucket_width
+        self.explore = explore
+        self.candidates = candidates
+        self.random = random.Random(seed)
+
+        self.lock = threading.Lock()
+        self.shown = {}       # name -> times offered
+        self.rating = {}      # name -> rating
+        self.bucket_of = {}   # name -> bucket number
+        self.buckets = {}     # bucket number -> [names]
+        self.slot = {}        # name -> position in its bucket list
+        self.names = []       # Every item, for random partners
+        self.heap = []        # (shown, tiebreak, name); stale entries skipped on pop
+
+    def __len__(self):
+        return len(self.names)
+
+    def sync(self, items):
+        """Rebuild from (name, rating, comparisons) tuples, keeping times shown"""
+        with self.lock:
+            shown, self.shown = self.shown, {}
+            self.rating, self.bucket_of, self.buckets, self.slot, self.names = {}, {}, {}, {}, []
+            for name, rating, comparisons in items:
+                self.shown[name] = max(shown.get(name, 0), comparisons)
+                self.names.append(name)
+                self._place(name, rating)
+            self.heap = [(count, self.random.random(), name) for name, count in self.shown.items()]
+            heapq.heapify(self.heap)
+
+    def update(self, name, rating):
+        """Move an item to its new rating's bucket (after a vote)"""
+        with self.lock:
+            if name in self.rating:
+                self._remove(name)
+                self._place(name, rating)
+
+    # ------------------------------------------------------------------
+    # Buckets
+    # ------------------------------------------------------------------
+
+    def _place(self, name, rating):
+        bucket = int(rating // self.bucket_width)
+        members = self.buckets.setdefault(bucket, [])
+        self.rating[name] = rating
+        self.bucket_of[name] = bucket
+        self.slot[name] = len(members)
+        members.append(name)
+
+    def _remove(self, name):
+        """Swap-remove from its bucket in O(1)"""
+        bucket = self.bucket_of.pop(name)
+        members = self.buckets[bucket]
+        i = self.slot.pop(name)
+        last = members.pop()
+        if last != name:
+            members[i] = last
+            self.slot[last] = i
+        if not members:
+            del self.buckets[bucket]
+
+    def _close_partners(self, name, want):
+        """Up to `want` items from the buckets nearest to name's rating"""
+        home = self.bucket_of[name]
+        # Ratings span a few thousand points at most, so this is a bounded walk
+        reach = max(home - min(self.buckets), max(self.buckets) - home)
+        found = []
+        for distance in range(reach + 1):
+            for bucket in ((home,) if distance == 0 else (home - distance, home + distance)):
+                members = self.buckets.get(bucket)
+                if not members:
+                    continue
+                for _ in range(min(want, len(members))):
+                    other = members[self.random.randrange(len(members))]
+                    if other != name and other not in found:
+                        found.append(other)
+            if len(found) >= want:
+                break
+        return found
+
+    # ------------------------------------------------------------------
+    # Selection
+    # ------------------------------------------------------------------
+
+    def _mark_shown(self, name):
+        self.shown[name] += 1
+        heapq.heappush(self.heap, (self.shown[name], self.random.random(), name))
+
+    def _least_shown(self):
+        while True:
+            count, _, name = heapq.heappop(self.heap)
+            if self.shown.get(name) == count:
+                return name
+
+    def next_pair(self):
+        """The next (name, name) to compare; None if there are fewer than two items"""
+        group = self.next_group(2)
+        return None if group is None else tuple(group)
+
+    def next_group(self, size):
+        """
+        The next `size` items to compare together (a tournament round)
+
+        The least-shown item, and the least shown of `candidates` close-rated
+        items per remaining place. Returns fewer items if there aren't enough,
+        None if there are fewer than two.
+        """
+        with self.lock:
+            if len(self.names) < 2:
+                return None
+            size = min(size, len(self.names))
+            if len(self.heap) > 4 * len(self.names):
+                self.heap = [(count, self.random.random(), name) for name, count in self.shown.items()]
+                heapq.heapify(self.heap)
+
+            first = self._least_shown()
+            candidates = self._close_partners(first, self.candidates * (size - 1))
+            candidates.sort(key=lambda other: (self.shown[other], abs(self.rating[other] - self.rating[first])))
+            group = [first] + candidates[:size - 1]
+            if len(group) == size and self.random.random() < self.explore:
+                group.pop()  # Room for a random opponent, so distant ratings get compared too
+            while len(group) < size:
+                other = self.random.choice(self.names)
+                if other not in group:
+                    group.append(other)
+
+            for name in group:
+                self._mark_shown(name)
+            return group
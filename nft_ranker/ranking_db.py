@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+SQLite Ranking Store
+Rankings and vote history in SQLite (WAL mode), for hosting the ranker
+with several worker processes
+
+Every vote is one short write transaction: read both ratings, apply the ELO
+update, append the vote. WAL lets readers carry on while it commits, and
+BEGIN IMMEDIATE makes concurrent voters queue instead of overwriting each
+other. Drop-in replacement for RankingStore; select it with RANKER_DB.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from bradley_terry import BradleyTerry, with_scores
+from ranking_store import DEFAULT_ELO, UnknownItem, calculate_new_elo
+from vote_log import LOG_KEY
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    path TEXT NOT NULL,
+    added_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ratings (
+    item_id INTEGER PRIMARY KEY REFERENCES items(id),
+    elo REAL NOT NULL,
+    wins INTEGER NOT NULL DEFAULT 0,
+    losses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ratings_by_elo ON ratings(elo);
+CREATE TABLE IF NOT EXISTS votes (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    winner_id INTEGER NOT NULL REFERENCES items(id),
+    loser_id INTEGER NOT NULL REFERENCES items(id)
+);
+"""
+
+_ENTRY_SQL = """
+SELECT i.name, i.path, r.elo, r.wins, r.losses
+FROM ratings r JOIN items i ON i.id = r.item_id
+"""
+
+_ID_ENTRY_SQL = """
+SELECT r.item_id, i.name, i.path, r.elo, r.wins, r.losses
+FROM ratings r JOIN items i ON i.id = r.item_id
+"""
+
+
+def _entry(row):
+    name, path, elo, wins, losses = row
+    return {'name': name, 'path': path, 'elo': elo, 'wins': wins, 'losses': losses,
+            'comparisons': wins + losses}
+
+
+class SqliteRankingStore:
+    """
+    RankingStore backed by a SQLite database
+
+    Args:
+        path: Database file (created on first use)
+        import_json: rankings.json to import when the database is new
+    """
+
+    def __init__(self, path, import_json=None, k=32, busy_timeout=10.0):
+        self.path = str(path)
+        self.k = k
+        self.busy_timeout = busy_timeout
+        self.catalog_version = None
+        self._local = threading.local()
+        self.bt = None            # Bradley-Terry model (item ids as indices), built on first use
+        self._bt_lock = threading.Lock()
+        self._bt_last_vote = 0    # Highest votes.id counted into it
+        self._stats = None        # (state_version, stats)
+
+        conn = self._conn()
+        conn.executescript(SCHEMA)
+        if import_json and os.path.exists(import_json):
+            self._import(conn, import_json)
+
+    def _conn(self):
+        """This thread's connection (sqlite3 connections can't be shared between threads)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')  # Durable at checkpoints; safe with WAL
+            self._local.conn = conn
+        return conn
+
+    def _import(self, conn, json_path):
+        """Copy a rankings.json into an empty database"""
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM items LIMIT 1').fetchone() is None:
+                with open(json_path, 'r') as f:
+                    rankings = json.load(f)
+                rankings.pop(LOG_KEY, None)
+                now = time.time()
+                for entry in rankings.values():
+                    cur = conn.execute('INSERT INTO items (name, path, added_at) VALUES (?, ?, ?)',
+                                       (entry['name'], entry.get('path', ''), now))
+                    conn.execute('INSERT INTO ratings (item_id, elo, wins, losses) VALUES (?, ?, ?, ?)',
+                                 (cur.lastrowid, entry.get('elo', DEFAULT_ELO),
+                                  entry.get('wins', 0), entry.get('losses', 0)))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def __len__(self):
+        return self._conn().execute('SELECT COUNT(*) FROM items').fetchone()[0]
+
+    def __contains__(self, name):
+        return self._conn().execute('SELECT 1 FROM items WHERE name = ?', (name,)).fetchone() is not None
+
+    # ------------------------------------------------------------------
+    # Items
+    # ------------------------------------------------------------------
+
+    def sync_catalog(self, catalog):
+        """Add catalog items the database doesn't have (only when the catalog changed)"""
+        if catalog.version == self.catalog_version:
+            return
+        conn = self._conn()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for nft in catalog.items():
+                cur = conn.execute('INSERT OR IGNORE INTO items (name, path, added_at) VALUES (?, ?, ?)',
+                                   (nft['name'], nft['relative_path'], now))
+                if cur.rowcount:
+                    conn.execute('INSERT INTO ratings (item_id, elo) VALUES (?, ?)',
+                                 (cur.lastrowid, DEFAULT_ELO))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        self.catalog_version = catalog.version
+
+    def get(self, name):
+        row = self._conn().execute(_ENTRY_SQL + 'WHERE i.name = ?', (name,)).fetchone()
+        return _entry(row) if row else None
+
+    def snapshot(self):
+        """Every item as {name: entry}, the rankings.json layout"""
+        return {row[0]: _entry(row) for row in self._conn().execute(_ENTRY_SQL)}
+
+    def ranked(self, limit=None, offset=0, method='elo'):
+        """Entries by ELO (walks the ratings_by_elo index), or by Bradley-Terry score with method='bt'"""
+        if method == 'bt':
+            bt = self._bradley_terry()
+            rows = self._conn().execute(_ID_ENTRY_SQL).fetchall()
+            score, low, high = bt.scores(max((row[0] for row in rows), default=0) + 1)
+            rows.sort(key=lambda row: -score[row[0]])
+            end = None if limit is None else offset + limit
+            return [with_scores(_entry(row[1:]), score[row[0]], low[row[0]], high[row[0]])
+                    for row in rows[offset:end]]
+
+        rows = self._conn().execute(_ENTRY_SQL + 'ORDER BY r.elo DESC, r.item_id DESC LIMIT ? OFFSET ?',
+                                    (-1 if limit is None else limit, offset))
+        return [_entry(row) for row in rows]
+
+    def _bradley_terry(self):
+        """This process's Bradley-Terry model, topped up with votes committed since the last call"""
+        conn = self._conn()
+        with self._bt_lock:
+            if self.bt is None:
+                conn.execute('BEGIN')  # Votes and totals from one snapshot
+                try:
+                    votes = np.array(conn.execute('SELECT id, winner_id, loser_id FROM votes').fetchall(),
+                                     dtype=np.int64).reshape(-1, 3)
+                    totals = conn.execute('SELECT item_id, wins, losses FROM ratings').fetchall()
+                finally:
+                    conn.execute('COMMIT')
+                n = max((row[0] for row in totals), default=0) + 1
+                wins, losses = np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64)
+                for item_id, w, l in totals:
+                    wins[item_id], losses[item_id] = w, l
+                self.bt = BradleyTerry()
+                self.bt.add_many(votes[:, 1], votes[:, 2])
+                # Wins and losses imported from rankings.json count against an average NFT
+                self.bt.set_baseline(wins - np.bincount(votes[:, 1], minlength=n),
+                                     losses - np.bincount(votes[:, 2], minlength=n))
+            else:
+                votes = np.array(conn.execute('SELECT id, winner_id, loser_id FROM votes WHERE id > ?',
+                                              (self._bt_last_vote,)).fetchall(), dtype=np.int64).reshape(-1, 3)
+                self.bt.add_many(votes[:, 1], votes[:, 2])
+            if len(votes):
+                self._bt_last_vote = int(votes[:, 0].max())
+            return self.bt
+
+    def rank(self, name):
+        """1-based leaderboard position of an item (None if unknown)"""
+        row = self._conn().execute(
+            'SELECT (SELECT COUNT(*) FROM ratings o WHERE o.elo > r.elo '
+            '        OR (o.elo = r.elo AND o.item_id > r.item_id)) + 1 '
+            'FROM ratings r JOIN items i ON i.id = r.item_id WHERE i.name = ?', (name,)).fetchone()
+        return row[0] if row else None
+
+    def state_version(self):
+        """Token that changes whenever rankings change (for ETags): last vote and item ids"""
+        last_vote, last_item = self._conn().execute(
+            'SELECT (SELECT MAX(id) FROM votes), (SELECT MAX(id) FROM items)').fetchone()
+        return f"db-{last_vote or 0}-{last_item or 0}"
+
+    def stats(self):
+        """Item count, comparison count, top 5 and bottom 5 (recomputed only after a change)"""
+        version = self.state_version()
+        cached = self._stats
+        if cached and cached[0] == version:
+            return cached[1]
+        stats = self._compute_stats()
+        self._stats = (version, stats)
+        return stats
+
+    def _compute_stats(self):
+        conn = self._conn()
+        total_nfts, total_comparisons = conn.execute(
+            'SELECT COUNT(*), COALESCE(SUM(wins + losses), 0) / 2 FROM ratings').fetchone()
+        bottom = [_entry(row) for row in conn.execute(_ENTRY_SQL + 'ORDER BY r.elo ASC, r.item_id ASC LIMIT 5')]
+        return {
+            'total_nfts': total_nfts,
+            'total_comparisons': total_comparisons,
+            'top_5': self.ranked(limit=5),
+            'bottom_5': bottom[::-1] if total_nfts >= 5 else [],
+        }
+
+    # ------------------------------------------------------------------
+    # Votes
+    # ------------------------------------------------------------------
+
+    def record_vote(self, winner, loser):
+        """Apply one comparison in its own transaction; returns the (winner, loser) ELO after it"""
+        elo = self.record_votes([(winner, loser)])
+        return elo[winner], elo[loser]
+
+    def record_votes(self, results):
+        """
+        Apply several (winner, loser) comparisons, in order, in one transaction
+
+        Nothing is applied if any name is unknown. Returns {name: ELO after}
+        for every NFT involved.
+        """
+        names = list(dict.fromkeys(name for pair in results for name in pair))
+        conn = self._conn()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = {name: [item_id, elo, 0, 0] for name, item_id, elo in conn.execute(
+                'SELECT i.name, r.item_id, r.elo FROM items i JOIN ratings r ON r.item_id = i.id '
+                f'WHERE i.name IN ({", ".join("?" * len(names))})', names)}
+            for name in names:
+                if name not in rows:
+                    raise UnknownItem(name)
+
+            now = time.time()
+            votes = []
+            for winner, loser in results:
+                w, l = rows[winner], rows[loser]
+                w[1], l[1] = calculate_new_elo(w[1], l[1], self.k)
+                w[2] += 1
+                l[3] += 1
+                votes.append((now, w[0], l[0]))
+            conn.executemany('UPDATE ratings SET elo = ?, wins = wins + ?, losses = losses + ? WHERE item_id = ?',
+                             [(elo, wins, losses, item_id) for item_id, elo, wins, losses in rows.values()])
+            conn.executemany('INSERT INTO votes (ts, winner_id, loser_id) VALUES (?, ?, ?)', votes)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return {name: row[1] for name, row in rows.items()}
+
+    # ------------------------------------------------------------------
+    # Persistence (every vote is already committed)
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        pass
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Ranking Store
+ELO ratings held in memory, written to rankings.json in the background
+
+Votes update a few array slots under a lock, so they cost the same however
+large the collection is and concurrent votes can't overwrite each other. A
+writer thread saves a snapshot (temp file + rename, so the file is never
+half-written) every few seconds or after a batch of votes.
+
+A leaderboard list of (-elo, index) is kept sorted as votes come in (two
+bisect moves per vote), and comparison totals are running counts, so a
+leaderboard page or the stats cost the size of what they return.
+
+With a vote log, each vote is appended to it before it is applied and the
+snapshot records how far into the log it goes. Startup loads the snapshot and
+replays only the votes after that point. A snapshot from before the log
+existed is kept as the log's base, so a full replay can start from it.
+"""
+
+import atexit
+import bisect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+from bradley_terry import BradleyTerry, with_scores
+from vote_log import LOG_KEY, VoteLog, index_votes, replay_elo
+
+
+DEFAULT_ELO = 1500
+
+
+def calculate_new_elo(winner_elo, loser_elo, k=32):
+    """Calculate new ELO ratings after a match"""
+    # Expected scores
+    expected_winner = 1 / (1 + 10 ** ((loser_elo - winner_elo) / 400))
+    expected_loser = 1 / (1 + 10 ** ((winner_elo - loser_elo) / 400))
+
+    # New ratings
+    new_winner_elo = winner_elo + k * (1 - expected_winner)
+    new_loser_elo = loser_elo + k * (0 - expected_loser)
+
+    return new_winner_elo, new_loser_elo
+
+
+class UnknownItem(KeyError):
+    """A vote named an item the store doesn't have"""
+
+
+class RankingStore:
+    """
+    Array-backed ratings: item i has elo[i], wins[i] and losses[i]
+
+    Args:
+        path: rankings.json to load from and save to
+        log_path: Vote log (votes.jsonl) to append every vote to; None = no log
+        flush_interval: Seconds between background saves while votes are pending
+        flush_every: Save as soon as this many votes are pending
+    """
+
+    def __init__(self, path, log_path=None, flush_interval=5.0, flush_every=25, k=32):
+        self.path = str(path)
+        self.log = VoteLog(log_path) if log_path else None
+        self.log_offset = 0       # Log bytes included in the ratings
+        self.flush_interval = flush_interval
+        self.flush_every = flush_every
+        self.k = k
+
+        self.lock = threading.Lock()
+        self.names = []
+        self.paths = []
+        self.index = {}
+        self.elo = np.zeros(0)
+        self.wins = np.zeros(0, dtype=np.int64)
+        self.losses = np.zeros(0, dtype=np.int64)
+        self.catalog_version = None
+        self.bt = None            # Bradley-Terry model, built on first use
+        self.order = None         # Leaderboard: sorted (-elo, i); built once loading is done
+        self.results = 0          # Sum of wins and losses (two per comparison)
+        self.version = 0          # Bumped on every change to ratings or items
+        self._epoch = f"{os.getpid():x}{int(time.time()):x}"  # Versions from another run differ
+
+        self.pending = 0          # Votes not yet on disk
+        self._save_lock = threading.Lock()  # Snapshots land in the order they were taken
+        self._wake = threading.Condition(self.lock)
+        self._closed = False
+
+        meta = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                data = json.load(f)
+            meta = data.pop(LOG_KEY, {})
+            for entry in data.values():
+                i = self._add(entry['name'], entry.get('path', ''), entry.get('elo', DEFAULT_ELO))
+                self.wins[i] = entry.get('wins', 0)
+                self.losses[i] = entry.get('losses', 0)
+        if self.log:
+            if not meta:  # Snapshot from before the log: what a full replay starts from
+                self.log.save_base({name: self.entry(i) for i, name in enumerate(self.names)})
+            self._replay_tail(meta.get('offset', 0))
+        n = len(self.names)
+        self.order = sorted(zip((-self.elo[:n]).tolist(), range(n)))
+        self.results = int(self.wins[:n].sum() + self.losses[:n].sum())
+
+        self._writer = threading.Thread(target=self._write_behind, name='rankings-writer', daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    # ------------------------------------------------------------------
+    # Items
+    # ------------------------------------------------------------------
+
+    def _add(self, name, path, elo=DEFAULT_ELO):
+        """Append an item, growing the arrays geometrically (caller holds the lock or is __init__)"""
+        i = len(self.names)
+        if i == len(self.elo):
+            capacity = max(64, 2 * i)
+            self.elo = np.resize(self.elo, capacity)
+            self.wins = np.resize(self.wins, capacity)
+            self.losses = np.resize(self.losses, capacity)
+        self.names.append(name)
+        self.paths.append(path)
+        self.index[name] = i
+        self.elo[i] = elo
+        self.wins[i] = 0
+        self.losses[i] = 0
+        if self.order is not None:
+            bisect.insort(self.order, (-float(elo), i))
+        self.version += 1
+        return i
+
+    def _move(self, i, elo):
+        """Set item i's ELO, keeping the leaderboard sorted (caller holds the lock)"""
+        del self.order[bisect.bisect_left(self.order, (-float(self.elo[i]), i))]
+        self.elo[i] = elo
+        bisect.insort(self.order, (-float(elo), i))
+
+    def _replay_tail(self, offset):
+        """Apply the votes logged after the snapshot was taken"""
+        size = self.log.size()
+        if offset > size:
+            print(f"⚠️  Vote log is shorter than {os.path.basename(self.path)} expects; "
+                  f"only votes added from now on will be replayed")
+            offset = size
+        _, winners, losers, self.log_offset = self.log.read(offset)
+        if not winners:
+            return
+
+        for name in dict.fromkeys(winners + losers):
+            if name not in self.index:
+                self._add(name, '')  # Path filled in by sync_catalog
+        w, l = index_votes(winners, losers, self.index)
+        n = len(self.names)
+        elo, wins, losses = replay_elo(w, l, n, self.k, initial=self.elo[:n])
+        self.elo[:n] = elo
+        self.wins[:n] += wins
+        self.losses[:n] += losses
+        self.pending += len(w)
+        print(f"🔁 Replayed {len(w)} votes from the vote log")
+
+    def sync_catalog(self, catalog):
+        """Add catalog items the store hasn't seen (only when the catalog changed)"""
+        if catalog.version == self.catalog_version:
+            return
+        items = catalog.items()
+        with self.lock:
+            for nft in items:
+                i = self.index.get(nft['name'])
+                if i is None:
+                    self._add(nft['name'], nft['relative_path'])
+                    self.pending += 1
+                elif not self.paths[i]:
+                    self.paths[i] = nft['relative_path']
+                    self.pending += 1
+                    self.version += 1
+            self.catalog_version = catalog.version
+
+    def entry(self, i):
+        """Item i in the rankings.json format"""
+        wins, losses = int(self.wins[i]), int(self.losses[i])
+        return {
+            'name': self.names[i],
+            'path': self.paths[i],
+            'elo': float(self.elo[i]),
+            'wins': wins,
+            'losses': losses,
+            'comparisons': wins + losses,
+        }
+
+    def get(self, name):
+        with self.lock:
+            i = self.index.get(name)
+            return None if i is None else self.entry(i)
+
+    def snapshot(self):
+        """Every item as {name: entry}, the rankings.json layout"""
+        with self.lock:
+            return {name: self.entry(i) for i, name in enumerate(self.names)}
+
+    def ranked(self, limit=None, offset=0, method='elo'):
+        """Entries by ELO (or by Bradley-Terry score with method='bt'), highest first"""
+        end = None if limit is None else offset + limit
+        if method == 'bt':
+            with self.lock:
+                n = len(self.names)
+                bt = self._bradley_terry()
+            score, low, high = bt.scores(n)  # Outside the lock: votes carry on during a refit
+            with self.lock:
+                order = np.argsort(-score[:n], kind='stable')
+                return [with_scores(self.entry(i), score[i], low[i], high[i]) for i in order[offset:end]]
+
+        with self.lock:
+            return [self.entry(i) for _, i in self.order[offset:end]]
+
+    def rank(self, name):
+        """1-based leaderboard position of an item (None if unknown)"""
+        with self.lock:
+            i = self.index.get(name)
+            return None if i is None else bisect.bisect_left(self.order, (-float(self.elo[i]), i)) + 1
+
+    def _bradley_terry(self):
+        """The Bradley-Terry model, counted from the vote log on first use (caller holds the lock)"""
+        if self.bt is None:
+            n = len(self.names)
+            w = l = np.zeros(0, dtype=np.int64)
+            if self.log:
+                _, winners, losers, _ = self.log.read(0)
+                known = [(a, b) for a, b in zip(winners, losers) if a in self.index and b in self.index]
+                w, l = index_votes([a for a, _ in known], [b for _, b in known], self.index)
+            self.bt = BradleyTerry()
+            self.bt.add_many(w, l)
+            # Wins and losses from before the log count against an average NFT
+            self.bt.set_baseline(self.wins[:n] - np.bincount(w, minlength=n),
+                                 self.losses[:n] - np.bincount(l, minlength=n))
+        return self.bt
+
+    def stats(self):
+        """Item count, comparison count, top 5 and bottom 5"""
+        with self.lock:
+            n = len(self.names)
+            return {
+                'total_nfts': n,
+                'total_comparisons': self.results // 2,
+                'top_5': [self.entry(i) for _, i in self.order[:5]],
+                'bottom_5': [self.entry(i) for _, i in self.order[-5:]] if n >= 5 else [],
+            }
+
+    def state_version(self):
+        """Token that changes whenever rankings change (for ETags)"""
+        with self.lock:
+            return f"{self._epoch}-{self.version}"
+
+    # ------------------------------------------------------------------
+    # Votes
+    # ------------------------------------------------------------------
+
+    def record_vote(self, winner, loser):
+        """Apply one comparison; returns the (winner, loser) ELO after it"""
+        elo = self.record_votes([(winner, loser)])
+        return elo[winner], elo[loser]
+
+    def record_votes(self, results):
+        """
+        Apply several (winner, loser) comparisons at once, in order
+
+        One lock hold and one log write for the lot (e.g. a tournament round).
+        Nothing is applied if any name is unknown. Returns {name: ELO after}
+        for every NFT involved.
+        """
+        with self.lock:
+            try:
+                ids = [(self.index[winner], self.index[loser]) for winner, loser in results]
+            except KeyError as e:
+                raise UnknownItem(e.args[0]) from None
+            if self.log:
+                self.log_offset = self.log.append_many(results)
+
+            for w, l in ids:
+                new_w, new_l = calculate_new_elo(self.elo[w], self.elo[l], self.k)
+                self._move(w, new_w)
+                self._move(l, new_l)
+                self.wins[w] += 1
+                self.losses[l] += 1
+            self.results += 2 * len(ids)
+            self.version += 1
+            if self.bt is not None:
+                self.bt.add_many([w for w, _ in ids], [l for _, l in ids])
+
+            self.pending += len(ids)
+            if self.pending >= self.flush_every:
+                self._wake.notify()
+            return {self.names[i]: float(self.elo[i]) for pair in ids for i in pair}
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def flush(self):
+        """Write a snapshot now if anything changed since the last one"""
+        with self._save_lock:
+            with self.lock:
+                written = self.pending
+                if not written:
+                    return
+                data = {name: self.entry(i) for i, name in enumerate(self.names)}
+                if self.log:
+                    data[LOG_KEY] = {'offset': self.log_offset}
+
+            tmp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.path)
+            # Only once the snapshot is saved: a failed write is retried
+            with self.lock:
+                self.pending -= written
+
+    def _write_behind(self):
+        while True:
+            with self.lock:
+                self._wake.wait_for(lambda: self._closed or self.pending >= self.flush_every,
+                                    timeout=self.flush_interval)
+                if self._closed:
+                    return
+            try:
+                self.flush()
+            except OSError as e:
+                print(f"⚠️  Could not save rankings: {e}")
+                with self.lock:  # Votes stay pending; try again after the interval
+                    self._wake.wait_for(lambda: self._closed, timeout=self.flush_interval)
+
+    def close(self):
+        """Stop the writer and save anything pending"""
+        with self.lock:
+            self._closed = True
+            self._wake.notify()
+        self.flush()
+        if self.log:
+            self.log.close()
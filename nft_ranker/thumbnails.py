@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Thumbnail Cache
+Display-sized WebP/JPEG copies of the NFT images, made once and kept on disk
+
+Originals are often multi-MB PNGs shown in a 500px card. Each image gets
+variants at a few widths, rendered on first request (or ahead of time by the
+pre-warm pool) and stored as <content hash>-<width>.<ext>. Identical
+artworks (editions) therefore share their variants, and an edited file gets
+new ones. Content hashes are remembered by (path, size, mtime) in
+index.json, so a file is only hashed again when it changes.
+
+Animated GIFs become animated WebP (a still JPEG for the rare client that
+can't take WebP). Videos aren't touched; the app serves them with Range
+requests.
+"""
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from PIL import Image, ImageSequence
+
+
+WIDTHS = (400, 800, 1600)   # Tournament card, pair card, pair card on a HiDPI screen
+IMAGE_SUFFIXES = ('.png', '.jpg', '.jpeg', '.gif', '.webp')
+FORMATS = {'webp': 'image/webp', 'jpg': 'image/jpeg'}
+
+INDEX_VERSION = 1
+
+
+def snap_width(requested):
+    """The smallest variant width at least as wide as requested (the largest if none is)"""
+    for width in WIDTHS:
+        if width >= requested:
+            return width
+    return WIDTHS[-1]
+
+
+class ThumbnailCache:
+    """Resized variants of source images, keyed by content hash, width and format"""
+
+    def __init__(self, cache_dir, quality=80, workers=2):
+        """
+        Args:
+            cache_dir: Where variants and the hash index live (created if missing)
+            quality: WebP/JPEG quality
+            workers: Threads for pre-warming
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.quality = quality
+        self.workers = workers
+
+        self.lock = threading.Lock()
+        self._hashes = {}      # path -> [size, mtime_ns, sha256]
+        self._inflight = {}    # variant name -> Future
+        self._index_dirty = False
+        self._pool = None
+
+        index_path = self.cache_dir / 'index.json'
+        if index_path.exists():
+            try:
+                with open(index_path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == INDEX_VERSION:
+                    self._hashes = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+        atexit.register(self.save_index)
+
+    # ------------------------------------------------------------------
+    # Keys
+    # ------------------------------------------------------------------
+
+    def content_hash(self, path):
+        """SHA-256 of the file, reused while its size and mtime are unchanged"""
+        path = str(path)
+        st = os.stat(path)
+        cached = self._hashes.get(path)
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        with self.lock:
+            self._hashes[path] = [st.st_size, st.st_mtime_ns, digest.hexdigest()]
+            self._index_dirty = True
+        return digest.hexdigest()
+
+    def variant_name(self, path, width, fmt):
+        return f"{self.content_hash(path)[:32]}-{width}.{fmt}"
+
+    # ------------------------------------------------------------------
+    # Variants
+    # ------------------------------------------------------------------
+
+    def get(self, path, width, fmt='webp'):
+        """
+        Path of the variant of `path` at `width` in `fmt` ('webp' or 'jpg'), rendering it if needed
+
+        Returns (variant_path, name); the name (hash, width, format) makes a
+        good ETag. Raises OSError if the source can't be read or decoded.
+        """
+        name = self.variant_name(path, width, fmt)
+        out = self.cache_dir / name
+        if out.exists():
+            return out, name
+
+        with self.lock:
+            future = self._inflight.get(name)
+            owner = future is None
+            if owner:
+                future = self._inflight[name] = Future()
+        if owner:
+            try:
+                self._render(path, width, fmt, out)
+                future.set_result(out)
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                with self.lock:
+                    del self._inflight[name]
+        return future.result(), name
+
+    def _render(self, path, width, fmt, out):
+        tmp = out.with_name(f"{out.name}.{threading.get_ident()}.tmp")
+        try:
+            with Image.open(path) as im:
+                scale = min(1.0, width / im.width)  # Never upscale
+                size = (max(1, round(im.width * scale)), max(1, round(im.height * scale)))
+                animated = getattr(im, 'is_animated', False)
+
+                if animated and fmt == 'webp':
+                    frames = [frame.convert('RGBA').resize(size, Image.LANCZOS)
+                              for frame in ImageSequence.Iterator(im)]
+                    frames[0].save(tmp, 'WEBP', save_all=True, append_images=frames[1:],
+                                   duration=im.info.get('duration', 100), loop=im.info.get('loop', 0),
+                                   quality=self.quality)
+                elif fmt == 'webp':
+                    image = im.convert('RGBA' if im.mode in ('RGBA', 'LA', 'P') else 'RGB')
+                    image.resize(size, Image.LANCZOS).save(tmp, 'WEBP', quality=self.quality, method=4)
+                else:
+                    image = im.convert('RGBA')
+                    flat = Image.new('RGB', image.size, (0, 0, 0))  # The ranker's black cards
+                    flat.paste(image, mask=image.getchannel('A'))
+                    flat.resize(size, Image.LANCZOS).save(tmp, 'JPEG', quality=self.quality,
+                                                          optimize=True, progressive=True)
+            os.replace(tmp, out)
+        except (Image.DecompressionBombError, SyntaxError, ValueError) as e:
+            raise OSError(f"Can't make a thumbnail of {path}: {e}") from e
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+
+    # ------------------------------------------------------------------
+    # Pre-warming
+    # ------------------------------------------------------------------
+
+    def prewarm(self, paths, widths=(800,), formats=('webp',)):
+        """Render variants in the background; returns the futures"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='thumbnails')
+        futures = [self._pool.submit(self._warm_one, path, width, fmt)
+                   for path in paths if str(path).lower().endswith(IMAGE_SUFFIXES)
+                   for width in widths for fmt in formats]
+        if futures:
+            threading.Thread(target=self._after, args=(futures,), daemon=True).start()
+        return futures
+
+    def _warm_one(self, path, width, fmt):
+        try:
+            self.get(path, width, fmt)
+        except OSError as e:
+            print(f"⚠️  No thumbnail for {os.path.basename(str(path))}: {e}")
+
+    def _after(self, futures):
+        wait(futures)
+        self.save_index()
+
+    def save_index(self):
+        with self.lock:
+            if not self._index_dirty:
+                return
+            data = {'version': INDEX_VERSION, 'files': dict(self._hashes)}
+            self._index_dirty = False
+        index_path = self.cache_dir / 'index.json'
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            pass  # Hashes are recomputed if the index is missing
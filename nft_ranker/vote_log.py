@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Vote Log
+Append-only record of every comparison, and a batch replay that rebuilds
+ratings from it
+
+Each vote is one JSON line: {"t": unix time, "w": winner, "l": loser}. The
+log is never rewritten, so ratings can be recomputed from it at any time with
+a different K-factor (or another algorithm). Ratings from before the log
+existed are kept beside it (votes.base.json) and a replay starts from them.
+Replay applies ELO in waves:
+consecutive votes that share no item are independent, so each wave is a
+handful of numpy operations instead of one Python update per vote.
+
+Usage:
+    python nft_ranker/vote_log.py                       # replay, print top 10 and timing
+    python nft_ranker/vote_log.py --k 24 --output rankings_k24.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+
+# Key in rankings.json recording how much of the log the snapshot includes.
+# Item keys are file names with a media suffix, so it can't clash with one.
+LOG_KEY = '__vote_log__'
+
+START_ELO = 1500  # Same as ranking_store.DEFAULT_ELO (which imports this module)
+
+
+class VoteLog:
+    """JSONL vote log; offsets are byte positions, so a reader can resume at one"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.base_path = os.path.splitext(self.path)[0] + '.base.json'
+        self._file = None
+
+    def save_base(self, rankings):
+        """Keep the rankings the log starts from ({name: entry}), unless already kept"""
+        if os.path.exists(self.base_path):
+            return
+        tmp_path = f"{self.base_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(rankings, f, indent=2)
+        os.replace(tmp_path, self.base_path)
+
+    def load_base(self):
+        """The rankings the log starts from, or None if they weren't kept"""
+        if not os.path.exists(self.base_path):
+            return None
+        with open(self.base_path, 'r') as f:
+            return json.load(f)
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, winner, loser, ts=None):
+        """Write one vote; returns the log size after it"""
+        return self.append_many([(winner, loser)], ts)
+
+    def append_many(self, results, ts=None):
+        """Write (winner, loser) votes in one write; returns the log size after them"""
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+        t = round(time.time() if ts is None else ts, 3)
+        lines = [json.dumps({'t': t, 'w': winner, 'l': loser}, separators=(',', ':')) + '\n'
+                 for winner, loser in results]
+        self._file.write(''.join(lines).encode('utf-8'))
+        self._file.flush()
+        return self._file.tell()
+
+    def read(self, offset=0):
+        """
+        Votes from `offset` on
+
+        Returns (timestamps, winners, losers, end_offset). A last line without
+        its newline (a write cut short) is left for the next read.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            data = b''
+        end = data.rfind(b'\n') + 1
+        lines = [line for line in data[:end].split(b'\n') if line.strip()]
+        votes = json.loads(b'[' + b','.join(lines) + b']')  # One parse instead of one per line
+        timestamps = np.array([v['t'] for v in votes], dtype=np.float64)
+        return timestamps, [v['w'] for v in votes], [v['l'] for v in votes], offset + end
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def index_votes(winners, losers, index):
+    """Item index arrays (w, l) for the votes; names not in `index` are added to it"""
+    ids = np.array([index.setdefault(name, len(index)) for name in winners + losers], dtype=np.int64)
+    return ids[:len(winners)], ids[len(winners):]
+
+
+def vote_waves(w, l, n):
+    """
+    Wave number of each vote: one more than the last wave that touched either item
+
+    Votes in the same wave share no item, and every vote comes after the
+    earlier votes on its items, so applying waves in order equals the
+    sequential replay.
+    """
+    last = [0] * n
+    waves = []
+    for a, b in zip(w.tolist(), l.tolist()):
+        x = max(last[a], last[b]) + 1
+        last[a] = last[b] = x
+        waves.append(x)
+    return np.array(waves, dtype=np.int64)
+
+
+def replay_elo(w, l, n, k=32, initial=None):
+    """
+    Replay votes (winner/loser index arrays, in log order) into ELO ratings
+
+    Args:
+        w, l: Item indices of each vote's winner and loser
+        n: Number of items
+        k: ELO K-factor
+        initial: Starting ratings (default: START_ELO for everyone)
+
+    Returns (elo, wins, losses) arrays of length n.
+    """
+    elo = np.full(n, float(START_ELO)) if initial is None else np.array(initial, dtype=np.float64)
+    wins = np.bincount(w, minlength=n)
+    losses = np.bincount(l, minlength=n)
+    if not len(w):
+        return elo, wins, losses
+
+    waves = vote_waves(w, l, n)
+    n_waves = int(waves.max())
+    if n_waves * 8 > len(w):
+        # Mostly one long chain (a few items in every vote): waves would be tiny
+        for a, b in zip(w.tolist(), l.tolist()):
+            expected = 1 / (1 + 10 ** ((elo[b] - elo[a]) / 400))
+            delta = k * (1 - expected)
+            elo[a] += delta
+            elo[b] -= delta
+        return elo, wins, losses
+
+    order = np.argsort(waves, kind='stable')
+    bounds = np.searchsorted(waves[order], np.arange(1, n_waves + 2))
+    w, l = w[order], l[order]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        a, b = w[start:end], l[start:end]
+        expected = 1 / (1 + 10 ** ((elo[b] - elo[a]) / 400))
+        delta = k * (1 - expected)
+        elo[a] += delta
+        elo[b] -= delta
+    return elo, wins, losses
+
+
+def main():
+    here = Path(__file__).parent
+    parser = argparse.ArgumentParser(description='Recompute rankings from the vote log')
+    parser.add_argument('--log', default=str(here / 'votes.jsonl'), help='Vote log to replay')
+    parser.add_argument('--rankings', default=str(here / 'rankings.json'),
+                        help='Current rankings (for item paths and unvoted items)')
+    parser.add_argument('--k', type=float, default=32, help='ELO K-factor (default: 32)')
+    parser.add_argument('--output', default='', help='Write the recomputed rankings here')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.log):
+        sys.exit(f"❌ No vote log at {args.log}")
+
+    rankings = {}
+    if os.path.exists(args.rankings):
+        with open(args.rankings, 'r') as f:
+            rankings = json.load(f)
+    meta = rankings.pop(LOG_KEY, {})
+    paths = {e['name']: e.get('path', '') for e in rankings.values()}
+
+    log = VoteLog(args.log)
+    start = time.perf_counter()
+    _, winners, losers, end = log.read()
+    read_s = time.perf_counter() - start
+
+    base = log.load_base()
+    if base is None:
+        # Without the starting ratings, a rebuild is only complete if the log
+        # holds every comparison the snapshot counts
+        logged = len(winners) - len(log.read(min(meta.get('offset', 0), end))[1])
+        unlogged = sum(e.get('wins', 0) for e in rankings.values()) - logged
+        if unlogged > 0:
+            message = (f"{unlogged} votes in {os.path.basename(args.rankings)} predate the log and "
+                       f"{os.path.basename(log.base_path)} (their starting ratings) is missing")
+            if args.output:
+                sys.exit(f"❌ Not writing: {message}")
+            print(f"⚠️  {message}; those NFTs start from {START_ELO} in this preview")
+        base = {}
+
+    index = {name: i for i, name in enumerate(dict.fromkeys(list(paths) + list(base)))}
+    w, l = index_votes(winners, losers, index)
+    names = list(index)
+    initial = np.array([base[name].get('elo', START_ELO) if name in base else START_ELO for name in names],
+                       dtype=np.float64)
+    elo, wins, losses = replay_elo(w, l, len(names), k=args.k, initial=initial)
+    wins += np.array([base.get(name, {}).get('wins', 0) for name in names], dtype=np.int64)
+    losses += np.array([base.get(name, {}).get('losses', 0) for name in names], dtype=np.int64)
+    total_s = time.perf_counter() - start
+
+    print(f"✅ Replayed {len(w)} votes over {len(names)} NFTs (K={args.k:g}) in "
+          f"{total_s * 1000:.1f}ms ({read_s * 1000:.1f}ms reading the log)")
+    print("\n🏆 Top 10:")
+    for rank, i in enumerate(np.argsort(-elo, kind='stable')[:10], 1):
+        print(f"   {rank:2d}. {elo[i]:7.1f}  {names[i]} ({wins[i]}W/{losses[i]}L)")
+
+    if args.output:
+        rankings = {LOG_KEY: {'offset': end}}  # The app carries on from the end of the log
+        for i, name in enumerate(names):
+            rankings[name] = {
+                'name': name,
+                'path': paths.get(name) or base.get(name, {}).get('path', ''),
+                'elo': float(elo[i]),
+                'wins': int(wins[i]),
+                'losses': int(losses[i]),
+                'comparisons': int(wins[i] + losses[i]),
+            }
+        with open(args.output, 'w') as f:
+            json.dump(rankings, f, indent=2)
+        print(f"\n💾 Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Downloader Benchmark
+Sync a synthetic wallet from the local stand-in server (no network needed)
+and report files/sec, bytes/sec and tail latency per scenario, optionally
+comparing against a saved baseline
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from download_my_nfts import NFTDownloader
+from nft_standin_server import EVM_WALLET, TEZOS_WALLET, StandinServer
+import argparse
+import contextlib
+import io
+import json
+import platform
+import shutil
+import tempfile
+import time
+
+
+# Stand-in server settings per scenario (on top of the command-line defaults)
+SCENARIOS = {
+    'clean': {},
+    'slow-gateway': {'slow_gateways': 1},
+    'flaky': {'error_rate': 0.05, 'truncate_rate': 0.05},
+    'throttled': {'throttle_rps': 25},
+    'editions': {'unique_media_fraction': 0.25},
+}
+
+
+def run_scenario(name, overrides, args):
+    """Cold sync into an empty folder, then an incremental re-sync"""
+    settings = {
+        'tokens': args.tokens, 'media_kb': args.media_kb, 'latency_ms': args.latency_ms,
+        'jitter_ms': args.jitter_ms, 'gateways': args.gateways, 'slow_ms': args.slow_ms,
+    }
+    overrides = dict(overrides)
+    fraction = overrides.pop('unique_media_fraction', None)
+    if fraction:
+        settings['unique_media'] = max(1, int(args.tokens * fraction))
+    settings.update(overrides)
+
+    standin = StandinServer(**settings).start()
+    output_dir = tempfile.mkdtemp(prefix=f'nft_bench_{name}_')
+
+    config = standin.downloader_config()
+    config['download'] = {
+        'max_workers': args.workers,
+        'per_host_concurrency': args.per_host,
+        'per_host_rate': args.rate,
+    }
+    if args.hedge_delay is not None:
+        config['ipfs_hedge_delay'] = args.hedge_delay
+
+    def sync(downloader):
+        if args.chain == 'tezos':
+            downloader.download_tezos_nfts(TEZOS_WALLET)
+        else:
+            downloader.download_evm_nfts(EVM_WALLET)
+
+    log = sys.stdout if args.verbose else io.StringIO()
+    try:
+        with contextlib.redirect_stdout(log):
+            downloader = NFTDownloader(output_dir=output_dir, config=config)
+            start = time.perf_counter()
+            sync(downloader)
+            cold = time.perf_counter() - start
+            report = downloader.engine.stats.report()
+
+            resync_downloader = NFTDownloader(output_dir=output_dir, config=config)
+            start = time.perf_counter()
+            sync(resync_downloader)
+            resync = time.perf_counter() - start
+    finally:
+        standin.stop()
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    files = report['files']
+    return {
+        'scenario': name,
+        'settings': settings,
+        'wall_s': cold,
+        'files_ok': files['ok'],
+        'files_linked': files['linked'],
+        'files_failed': files['failed'],
+        'bytes': report['bytes'],
+        'files_per_s': (files['ok'] + files['linked']) / cold,
+        'bytes_per_s': report['bytes'] / cold,
+        'file_p50_s': report['file_p50_s'],
+        'file_p95_s': report['file_p95_s'],
+        'file_p99_s': report['file_p99_s'],
+        'request_p95_s': report['latency_p95_s'],
+        'requests': report['requests'],
+        'retries': report['retries'],
+        'resync_s': resync,
+    }
+
+
+def compare_to_baseline(results, baseline, threshold=0.10):
+    """
+    Compare results against a baseline run
+
+    Returns a list of regressions where throughput fell, or tail latency or
+    re-sync time grew, by more than the threshold (0.10 = 10%).
+    """
+    regressions = []
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+
+        for metric, higher_is_better in (('files_per_s', True), ('file_p95_s', False),
+                                         ('resync_s', False)):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append({
+                    'case': name,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': change,
+                })
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the NFT downloader against a local stand-in server')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help=f"Comma-separated scenarios from {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument('--chain', default='tezos', choices=['tezos', 'evm'],
+                        help='Wallet to sync (tezos: objkt + IPFS; evm: Alchemy + IPFS/HTTP)')
+    parser.add_argument('--tokens', type=int, default=300, help='Tokens in the synthetic wallet')
+    parser.add_argument('--media-kb', type=int, default=64, help='Approximate artwork size')
+    parser.add_argument('--latency-ms', type=float, default=20, help='Server latency per response')
+    parser.add_argument('--jitter-ms', type=float, default=10, help='Random extra latency')
+    parser.add_argument('--gateways', type=int, default=3, help='IPFS gateways')
+    parser.add_argument('--slow-ms', type=float, default=1500, help='Extra latency of slow gateways')
+    parser.add_argument('--workers', type=int, default=8, help='Downloader max_workers')
+    parser.add_argument('--per-host', type=int, default=4, help='Downloader per_host_concurrency')
+    parser.add_argument('--rate', type=float, default=0, help='Downloader per_host_rate (0 = unlimited)')
+    parser.add_argument('--hedge-delay', type=float, default=None,
+                        help='Gateway hedge delay in seconds (default: adaptive)')
+    parser.add_argument('--verbose', action='store_true', help='Show the downloader output')
+    parser.add_argument('--output', default='', help='Write results JSON here')
+    parser.add_argument('--baseline', default='', help='Compare against this results JSON')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Regression threshold as a fraction (default: 0.10)')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    for name in scenarios:
+        if name not in SCENARIOS:
+            parser.error(f"Unknown scenario: {name}")
+
+    print("\n" + "="*70)
+    print("⏱️  NFT DOWNLOADER BENCHMARK")
+    print("="*70)
+    print(f"   Wallet: {args.tokens} {args.chain} tokens, ~{args.media_kb}KB each")
+    print(f"   Downloader: {args.workers} workers, {args.per_host} per host, "
+          f"rate {args.rate or 'unlimited'}\n")
+
+    print(f"{'Scenario':<14} {'files/s':>8} {'MB/s':>7} {'p50':>7} {'p95':>7} {'p99':>7} "
+          f"{'failed':>6} {'retries':>7} {'resync':>7}")
+
+    results = {}
+    for name in scenarios:
+        r = run_scenario(name, SCENARIOS[name], args)
+        results[name] = r
+        print(f"{name:<14} {r['files_per_s']:>8.1f} {r['bytes_per_s'] / (1024 * 1024):>7.2f} "
+              f"{r['file_p50_s'] * 1000:>6.0f}ms {r['file_p95_s'] * 1000:>5.0f}ms "
+              f"{r['file_p99_s'] * 1000:>5.0f}ms {r['files_failed']:>6} {r['retries']:>7} "
+              f"{r['resync_s']:>6.2f}s")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        environment = {'python': platform.python_version(), 'machine': platform.machine(),
+                       'cpus': os.cpu_count(), 'args': vars(args)}
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment, 'results': results}, f, indent=2)
+        print(f"\n💾 Results saved: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f).get('results', {})
+
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+
+        print("\n" + "="*70)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"   {r['case']} {r['metric']}: {r['baseline']:.4g} → {r['current']:.4g} "
+                      f"({r['change']:+.1%})")
+            sys.exit(1)
+        print("✅ No regressions against baseline")
+
+
+if __name__ == '__main__':
+    main()
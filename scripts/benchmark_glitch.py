@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Glitch Benchmark Suite
+Time every GlitchArtist effect and GenerativeGlitchArt base generator across
+image sizes, modes and parameter presets, and compare against a saved baseline
+"""
+
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from src.glitch_effects import GlitchArtist
+from src.generative_glitch import GenerativeGlitchArt
+from src import backends
+from src.backends import available_backends, choose_backend
+from PIL import Image
+import numpy as np
+import argparse
+import json
+import platform
+import random
+import time
+import tracemalloc
+
+
+SIZES = {
+    '512': 512,
+    '1K': 1024,
+    '2K': 2048,
+    '4K': 4096,
+    '8K': 8192,
+}
+
+MODES = ['RGB', 'RGBA', 'L']
+
+# Parameter presets for every GlitchArtist effect method
+EFFECT_PRESETS = {
+    'pixel_sort': {
+        'default': {},
+        'vertical': {'threshold': 180, 'direction': 'vertical'},
+    },
+    'rgb_shift': {
+        'default': {'r_shift': (10, 0), 'b_shift': (-10, 0)},
+        'heavy': {'r_shift': (40, 5), 'g_shift': (0, -5), 'b_shift': (-40, 5)},
+    },
+    'scan_lines': {
+        'default': {},
+        'heavy': {'line_height': 5, 'intensity': 0.5},
+    },
+    'data_mosh': {
+        'default': {},
+        'heavy': {'corruption_rate': 0.05, 'block_size': 20},
+    },
+    'jpeg_compression_artifacts': {
+        'default': {},
+        'heavy': {'quality': 1, 'iterations': 10},
+    },
+    'wave_distortion': {
+        'default': {},
+        'vertical': {'amplitude': 20, 'frequency': 0.1, 'direction': 'vertical'},
+    },
+    'color_channel_swap': {
+        'default': {},
+        'bgr': {'swap_type': 'rgb_to_bgr'},
+    },
+    'slice_and_shift': {
+        'default': {},
+        'heavy': {'num_slices': 40, 'max_shift': 200},
+    },
+    'random_glitch_combo': {
+        'low': {'intensity': 'low'},
+        'medium': {'intensity': 'medium'},
+        'high': {'intensity': 'high'},
+    },
+}
+
+# Parameter presets for every GenerativeGlitchArt base generator
+GENERATOR_PRESETS = {
+    'create_base_gradient': {
+        'default': {},
+    },
+    'create_geometric_base': {
+        'default': {},
+        'dense': {'num_shapes': 200},
+    },
+    'create_noise_base': {
+        'color': {'noise_type': 'color'},
+        'grayscale': {'noise_type': 'grayscale'},
+        'perlin': {'noise_type': 'perlin'},
+    },
+    'create_vaporwave_aesthetic': {
+        'default': {},
+    },
+    'create_cyberpunk_aesthetic': {
+        'default': {},
+    },
+}
+
+
+def make_source_image(size, mode, seed=0):
+    """Deterministic test image: gradient plus noise, so every effect has work to do"""
+    rng = np.random.default_rng(seed)
+    ramp = np.linspace(0, 255, size, dtype=np.float32)
+    base = np.stack([
+        ramp[None, :].repeat(size, axis=0),
+        ramp[:, None].repeat(size, axis=1),
+        255 - ramp[None, :].repeat(size, axis=0),
+    ], axis=2)
+    noise = rng.integers(-40, 40, (size, size, 3))
+    pixels = np.clip(base + noise, 0, 255).astype(np.uint8)
+    return Image.fromarray(pixels).convert(mode)
+
+
+def _seed(seed):
+    random.seed(seed)
+    np.random.seed(seed)
+
+
+def _measure(run, repeats, budget, seed, memory):
+    """
+    Call run() repeatedly and collect timings
+
+    Stops early once the time budget is spent (always at least one timed run).
+    Peak memory comes from a separate tracemalloc run, since tracing slows
+    the timed runs down.
+    """
+    times = []
+    spent = 0.0
+    for _ in range(repeats):
+        _seed(seed)
+        elapsed = run()
+        times.append(elapsed)
+        spent += elapsed
+        if spent >= budget:
+            break
+
+    peak = None
+    if memory:
+        _seed(seed)
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    return {
+        'runs': len(times),
+        'mean': float(np.mean(times)),
+        'p95': float(np.percentile(times, 95)),
+        'min': float(np.min(times)),
+        'peak_bytes': peak,
+    }
+
+
+def benchmark_effect(effect, params, size, mode, backend, repeats, budget, seed, memory):
+    """Benchmark one GlitchArtist effect call on a fresh copy of the source image"""
+    source = make_source_image(size, mode, seed)
+
+    def run():
+        # No effect cache: every repeat must run the kernel, not load a stored result
+        glitcher = GlitchArtist(image=source.copy(), backend=backend, cache=False)
+        method = getattr(glitcher, effect)
+        start = time.perf_counter()
+        method(**params)
+        return time.perf_counter() - start
+
+    return _measure(run, repeats, budget, seed, memory)
+
+
+def benchmark_generator(generator, params, size, repeats, budget, seed, memory):
+    """Benchmark one GenerativeGlitchArt base generator"""
+    def run():
+        art = GenerativeGlitchArt(width=size, height=size)
+        method = getattr(art, generator)
+        start = time.perf_counter()
+        method(**params)
+        return time.perf_counter() - start
+
+    return _measure(run, repeats, budget, seed, memory)
+
+
+def build_cases(effects, generators, sizes, modes):
+    """Expand the benchmark matrix into (case_id, kind, name, preset, size, mode) tuples"""
+    cases = []
+    for size_label in sizes:
+        for effect in effects:
+            for preset in EFFECT_PRESETS[effect]:
+                for mode in modes:
+                    case_id = f"{effect}/{preset}/{size_label}/{mode}"
+                    cases.append((case_id, 'effect', effect, preset, size_label, mode))
+        for generator in generators:
+            for preset in GENERATOR_PRESETS[generator]:
+                case_id = f"{generator}/{preset}/{size_label}/RGB"
+                cases.append((case_id, 'generator', generator, preset, size_label, 'RGB'))
+    return cases
+
+
+def run_suite(cases, backend='auto', repeats=5, budget=10.0, seed=0, memory=True):
+    """Run every case, returning {case_id: result}"""
+    results = {}
+
+    for idx, (case_id, kind, name, preset, size_label, mode) in enumerate(cases, 1):
+        size = SIZES[size_label]
+        print(f"[{idx}/{len(cases)}] {case_id}", end=' ', flush=True)
+
+        try:
+            if kind == 'effect':
+                params = EFFECT_PRESETS[name][preset]
+                result = benchmark_effect(name, params, size, mode, backend,
+                                          repeats, budget, seed, memory)
+            else:
+                params = GENERATOR_PRESETS[name][preset]
+                result = benchmark_generator(name, params, size,
+                                             repeats, budget, seed, memory)
+        except Exception as e:
+            # Some effects don't support every mode (e.g. pixel_sort on 'L')
+            results[case_id] = {'error': f"{type(e).__name__}: {e}"}
+            print(f"⚠️  unsupported ({type(e).__name__})")
+            continue
+
+        results[case_id] = result
+        peak = f"{result['peak_bytes'] / (1024 * 1024):.1f}MB" if result['peak_bytes'] is not None else '-'
+        print(f"mean {result['mean'] * 1000:.1f}ms  p95 {result['p95'] * 1000:.1f}ms  peak {peak}")
+
+    return results
+
+
+def compare_to_baseline(results, baseline, threshold=0.10):
+    """
+    Compare results against a baseline run
+
+    Returns a list of regressions where mean time or peak memory grew by more
+    than the threshold (0.10 = 10%).
+    """
+    regressions = []
+
+    for case_id, result in results.items():
+        base = baseline.get(case_id)
+        if not base or 'error' in result or 'error' in base:
+            continue
+
+        for metric in ('mean', 'peak_bytes'):
+            old, new = base.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            if change > threshold:
+                regressions.append({
+                    'case': case_id,
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': change,
+                })
+
+    return regressions
+
+
+def environment_info(backend):
+    """Metadata saved alongside results so baselines are comparable"""
+    cv2 = backends.cv2  # None when OpenCV isn't installed
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pillow': Image.__version__,
+        'opencv': cv2.__version__ if cv2 is not None else None,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'backend': backend,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark glitch effects and generators')
+    parser.add_argument('--sizes', default=','.join(SIZES),
+                        help=f"Comma-separated sizes from {', '.join(SIZES)} (default: all)")
+    parser.add_argument('--modes', default=','.join(MODES),
+                        help='Comma-separated image modes for effects (default: RGB,RGBA,L)')
+    parser.add_argument('--only', default='',
+                        help='Comma-separated effect/generator names to run (default: all)')
+    parser.add_argument('--backend', default='auto', choices=['auto', 'numpy', 'opencv'],
+                        help='GlitchArtist kernel backend')
+    parser.add_argument('--repeats', type=int, default=5, help='Max timed runs per case')
+    parser.add_argument('--budget', type=float, default=10.0,
+                        help='Stop repeating a case after this many seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for every run')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the tracemalloc peak run')
+    parser.add_argument('--quick', action='store_true',
+                        help='Smoke run: 512 only, RGB only, 1 repeat')
+    parser.add_argument('--output', default='', help='Write results JSON here')
+    parser.add_argument('--baseline', default='', help='Compare against this results JSON')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='Regression threshold as a fraction (default: 0.10)')
+    args = parser.parse_args()
+
+    sizes = args.sizes.split(',')
+    modes = args.modes.split(',')
+    repeats = args.repeats
+    if args.quick:
+        sizes, modes, repeats = ['512'], ['RGB'], 1
+
+    for size_label in sizes:
+        if size_label not in SIZES:
+            parser.error(f"Unknown size: {size_label}")
+
+    only = set(filter(None, args.only.split(',')))
+    effects = [e for e in EFFECT_PRESETS if not only or e in only]
+    generators = [g for g in GENERATOR_PRESETS if not only or g in only]
+
+    print("\n" + "="*70)
+    print("⏱️  GLITCH BENCHMARK SUITE")
+    print("="*70)
+
+    # Settle 'auto' backend choices up front so the micro-benchmark isn't timed
+    if args.backend == 'auto':
+        for effect in effects:
+            if len(available_backends(effect)) > 1:
+                choose_backend(effect)
+
+    cases = build_cases(effects, generators, sizes, modes)
+    print(f"   Cases: {len(cases)}  Backend: {args.backend}\n")
+
+    results = run_suite(cases, backend=args.backend, repeats=repeats,
+                        budget=args.budget, seed=args.seed, memory=not args.no_memory)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or '.', exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump({'environment': environment_info(args.backend), 'results': results}, f, indent=2)
+        print(f"\n💾 Results saved: {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f).get('results', {})
+
+        regressions = compare_to_baseline(results, baseline, args.threshold)
+
+        print("\n" + "="*70)
+        if regressions:
+            print(f"❌ {len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for r in regressions:
+                print(f"   {r['case']} {r['metric']}: {r['baseline']:.4g} → {r['current']:.4g} "
+                      f"(+{r['change']:.0%})")
+            print("="*70 + "\n")
+            sys.exit(1)
+
+        print(f"✅ No regressions beyond {args.threshold:.0%}")
+        print("="*70 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,28 +4,81 @@ NFT Downloader - Download your owned NFTs from Tezos (Objkt) and EVM chains
 """
 
 import requests
+import copy
 import json
 import os
 from pathlib import Path
-import time
+import shutil
 import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+from nft_gateways import GatewayError, GatewayRacer, GatewayScoreboard, ipfs_path
+from nft_media import MEDIA_EXTENSIONS, MediaVerifier, NotMedia, media_extension, sniff_file
+from nft_store import MediaStore
+from nft_sync import (ALCHEMY_NFT_API, OBJKT_GRAPHQL, OPENSEA_API, SIMPLEHASH_API, SyncError,
+                      SyncManifest, iter_alchemy_pages, iter_objkt_pages, iter_opensea_pages,
+                      iter_simplehash_pages, token_key, wallet_key)
+from nft_transfer import DownloadEngine, IncompleteDownload, ResumeMismatch, write_stream
 
 
 class NFTDownloader:
-    def __init__(self, output_dir='downloaded_nfts'):
+    def __init__(self, output_dir='downloaded_nfts', engine=None, config=None):
         self.output_dir = output_dir
         os.makedirs(output_dir, exist_ok=True)
         
         # Load API keys from config if available
-        self.config = self.load_config()
+        self.config = config if config is not None else self.load_config()
+        
+        # Pooled sessions, per-host limits and retries (config.json "download" section)
+        self.engine = engine or DownloadEngine.from_config(self.config.get('download'))
+        
+        # Tokens seen per wallet and where they were saved (incremental syncs)
+        self.manifest = SyncManifest(output_dir)
         
-        # IPFS gateways (fallbacks if one fails)
-        self.ipfs_gateways = [
+        # Holdings APIs (overridable in config.json "endpoints")
+        self.endpoints = {
+            'objkt': OBJKT_GRAPHQL,
+            'alchemy': ALCHEMY_NFT_API,
+            'opensea': OPENSEA_API,
+            'simplehash': SIMPLEHASH_API,
+        }
+        self.endpoints.update(self.config.get('endpoints', {}))
+        
+        # Content-addressed media store; per-token files link into it
+        self.store = MediaStore(output_dir, **self.config.get('media_store', {}))
+        
+        # IPFS gateways
+        self.ipfs_gateways = self.config.get('ipfs_gateways') or [
             'https://ipfs.io/ipfs/',
             'https://cloudflare-ipfs.com/ipfs/',
             'https://gateway.pinata.cloud/ipfs/',
             'https://dweb.link/ipfs/',
         ]
+        
+        # Hedged requests to the best two gateways, ranked by a persisted scoreboard
+        scoreboard = GatewayScoreboard(
+            self.ipfs_gateways, os.path.join(output_dir, '.sync', 'gateways.json'))
+        self.gateways = GatewayRacer(self.engine, scoreboard,
+                                     hedge_delay=self.config.get('ipfs_hedge_delay'))
+        
+        # Images are decode-checked in the background; failures are quarantined
+        self.verifier = MediaVerifier(self.quarantine, workers=self.config.get('verify_workers', 2))
+        self.quarantine_dir = os.path.join(output_dir, '.quarantine')
+    
+    def fork(self):
+        """
+        Downloader for syncing another wallet alongside this one
+        
+        Shares the manifest, media store, gateway scores and the engine's
+        connections, limits and workers, but counts its own transfer stats.
+        """
+        fork = copy.copy(self)
+        fork.engine = self.engine.child()
+        fork.gateways = GatewayRacer(fork.engine, self.gateways.scoreboard,
+                                     hedge_delay=self.gateways.hedge_delay,
+                                     max_hedge_delay=self.gateways.max_hedge_delay)
+        return fork
     
     def load_config(self):
         """Load API keys from config.json"""
@@ -40,107 +93,62 @@ class NFTDownloader:
         
         return {}
     
-    def download_tezos_nfts(self, wallet_address):
-        """Download NFTs owned on Tezos (via Objkt API)"""
+    def download_tezos_nfts(self, wallet_address, full=False):
+        """
+        Sync NFTs owned on Tezos (via Objkt API)
+        
+        Only holdings changed since the last sync are listed, unless full=True
+        (a full listing also notices tokens that left the wallet).
+        Returns False if the wallet could not be listed.
+        """
         
         print(f"🔍 Fetching Tezos NFTs for: {wallet_address}")
         print("="*70)
         
-        # Objkt GraphQL API
-        url = "https://data.objkt.com/v3/graphql"
-        
-        query = """
-        query GetUserTokens($address: String!) {
-          token_holder(
-            where: {
-              holder_address: {_eq: $address}
-              quantity: {_gt: "0"}
-            }
-            limit: 100
-          ) {
-            token {
-              token_id
-              name
-              description
-              artifact_uri
-              display_uri
-              thumbnail_uri
-              fa_contract
-            }
-            quantity
-          }
-        }
-        """
-        
-        variables = {"address": wallet_address}
+        wallet = wallet_key('tezos', wallet_address)
+        since = None if full else self.manifest.wallet(wallet).get('cursor')
+        if since:
+            print(f"🔁 Incremental sync: holdings changed since {since}")
         
         try:
-            response = requests.post(
-                url,
-                json={'query': query, 'variables': variables},
-                headers={'Content-Type': 'application/json'},
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                print(f"❌ Error: API returned status {response.status_code}")
-                return
-            
-            data = response.json()
-            
-            if 'errors' in data:
-                print(f"❌ API Error: {data['errors']}")
-                return
-            
-            holdings = data.get('data', {}).get('token_holder', [])
-            
-            if not holdings:
+            try:
+                records = self.collect(iter_objkt_pages(
+                    self.engine, wallet_address, since=since, url=self.endpoints['objkt']))
+            except SyncError as e:
+                if not since:
+                    raise
+                print(f"⚠️  Incremental query failed ({e}), listing everything instead")
+                since = None
+                records = self.collect(iter_objkt_pages(
+                    self.engine, wallet_address, url=self.endpoints['objkt']))
+            
+            if not records and not self.manifest.tokens_for(wallet):
                 print("📭 No NFTs found for this address")
-                return
-            
-            print(f"✅ Found {len(holdings)} NFTs!\n")
+                return True
             
             # Create Tezos folder
             tezos_dir = os.path.join(self.output_dir, 'tezos')
-            os.makedirs(tezos_dir, exist_ok=True)
+            self.sync_wallet(wallet, records, tezos_dir, complete=since is None)
             
-            for idx, holding in enumerate(holdings, 1):
-                token = holding['token']
-                quantity = holding['quantity']
-                
-                token_id = token.get('token_id', 'unknown')
-                name = token.get('name', f'Token_{token_id}')
-                contract = token.get('fa_contract', 'unknown')
-                
-                print(f"\n[{idx}/{len(holdings)}] {name}")
-                print(f"   Token ID: {token_id}")
-                print(f"   Contract: {contract}")
-                print(f"   Owned: {quantity}")
-                
-                # Try different URI fields (artifact_uri is usually the full quality)
-                uri = (token.get('artifact_uri') or 
-                       token.get('display_uri') or 
-                       token.get('thumbnail_uri'))
-                
-                if uri:
-                    print(f"   URI: {uri[:60]}...")
-                    
-                    # Download the NFT
-                    filename = self.sanitize_filename(f"{name}_{token_id}")
-                    self.download_from_uri(uri, tezos_dir, filename)
-                else:
-                    print("   ⚠️  No media URI found")
-                
-                # Small delay to be nice to servers
-                time.sleep(0.5)
+            # Resume from the newest change objkt reported (server clock, not ours)
+            changes = [r['changed_at'] for r in records if r['changed_at']]
+            cursor = max(changes + ([since] if since else []), default=None)
+            self.manifest.update_wallet(wallet, cursor=cursor, last_sync=time.time())
+            self.manifest.save()
             
-            print(f"\n✅ Tezos NFTs downloaded to: {tezos_dir}")
+            print(f"\n✅ Tezos NFTs synced to: {tezos_dir}")
+            return True
             
         except Exception as e:
             print(f"❌ Error fetching Tezos NFTs: {e}")
+            return False
     
-    def download_evm_nfts(self, wallet_address):
-        """Download NFTs owned on EVM chains (Ethereum, Polygon, etc.)"""
+    def download_evm_nfts(self, wallet_address, full=False):
+        """
+        Sync NFTs owned on EVM chains (Ethereum, Polygon, etc.)
+        
+        Returns False if the wallet could not be listed.
+        """
         
         print(f"\n🔍 Fetching EVM NFTs for: {wallet_address}")
         print("="*70)
@@ -150,7 +158,7 @@ class NFTDownloader:
         
         if alchemy_key and alchemy_key != 'PASTE_YOUR_ALCHEMY_KEY_HERE':
             print("✅ Using Alchemy API key from config.json")
-            return self.download_with_alchemy(wallet_address, alchemy_key)
+            return self.download_with_alchemy(wallet_address, alchemy_key, full=full)
         else:
             print("⚠️  No Alchemy API key found in config.json")
             print("   See ALCHEMY_SETUP.md for instructions")
@@ -158,63 +166,27 @@ class NFTDownloader:
         print("\n📝 Trying OpenSea public API (limited)...")
         
         # Try OpenSea API (no key needed but rate limited)
-        url = f"https://api.opensea.io/api/v2/chain/ethereum/account/{wallet_address}/nfts"
-        
-        headers = {
-            'Accept': 'application/json',
-            'X-API-KEY': self.config.get('opensea_api_key', '')
-        }
-        
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 429:
+            records = self.collect(iter_opensea_pages(
+                self.engine, wallet_address, self.config.get('opensea_api_key', ''),
+                url=self.endpoints['opensea']))
+        except SyncError as e:
+            if e.status == 429:
                 print("⚠️  Rate limited. Try again in a few minutes or add API key.")
-                return
-            
-            if response.status_code != 200:
-                print(f"⚠️  API returned status {response.status_code}")
-                print("   Trying alternative method...")
-                self.download_evm_simple(wallet_address)
-                return
-            
-            data = response.json()
-            nfts = data.get('nfts', [])
-            
-            if not nfts:
-                print("📭 No NFTs found (or rate limited)")
-                return
-            
-            print(f"✅ Found {len(nfts)} NFTs!\n")
-            
-            # Create EVM folder
-            evm_dir = os.path.join(self.output_dir, 'evm')
-            os.makedirs(evm_dir, exist_ok=True)
-            
-            for idx, nft in enumerate(nfts[:50], 1):  # Limit to 50 for free tier
-                name = nft.get('name', 'Unnamed')
-                token_id = nft.get('identifier', 'unknown')
-                collection = nft.get('collection', 'Unknown')
-                
-                print(f"\n[{idx}/{len(nfts)}] {name}")
-                print(f"   Collection: {collection}")
-                print(f"   Token ID: {token_id}")
-                
-                # Get image URL
-                image_url = nft.get('image_url') or nft.get('display_image_url')
-                
-                if image_url:
-                    filename = self.sanitize_filename(f"{collection}_{name}_{token_id}")
-                    self.download_from_uri(image_url, evm_dir, filename)
-                else:
-                    print("   ⚠️  No image URL found")
-                
-                time.sleep(0.5)
-            
-            print(f"\n✅ EVM NFTs downloaded to: {evm_dir}")
-            
+                return False
+            print(f"⚠️  {e}")
+            print("   Trying alternative method...")
+            return self.download_evm_simple(wallet_address)
         except Exception as e:
             print(f"❌ Error fetching EVM NFTs: {e}")
+            return False
+        
+        if not records:
+            print("📭 No NFTs found (or rate limited)")
+            return True
+        
+        self.finish_evm_sync(wallet_address, records, complete=True)
+        return True
     
     def download_evm_simple(self, wallet_address):
         """Simpler EVM method using public APIs"""
@@ -222,205 +194,375 @@ class NFTDownloader:
         
         # Try SimpleHash API (free tier, no key needed for basic queries)
         try:
-            url = f"https://api.simplehash.com/api/v0/nfts/owners?chains=ethereum,polygon&wallet_addresses={wallet_address}"
+            records = self.collect(iter_simplehash_pages(
+                self.engine, wallet_address, url=self.endpoints['simplehash']))
             
-            headers = {
-                'Accept': 'application/json',
-                'X-API-KEY': ''  # Works without key for limited requests
-            }
-            
-            response = requests.get(url, headers=headers, timeout=30)
-            
-            if response.status_code == 200:
-                data = response.json()
-                nfts = data.get('nfts', [])
-                
-                if nfts:
-                    print(f"✅ Found {len(nfts)} EVM NFTs!\n")
-                    
-                    evm_dir = os.path.join(self.output_dir, 'evm')
-                    os.makedirs(evm_dir, exist_ok=True)
-                    
-                    for idx, nft in enumerate(nfts[:50], 1):
-                        name = nft.get('name', 'Unnamed')
-                        token_id = nft.get('token_id', 'unknown')
-                        collection = nft.get('collection', {}).get('name', 'Unknown')
-                        
-                        print(f"\n[{idx}/{len(nfts[:50])}] {name}")
-                        print(f"   Collection: {collection}")
-                        
-                        image_url = nft.get('image_url') or nft.get('previews', {}).get('image_large_url')
-                        
-                        if image_url:
-                            filename = self.sanitize_filename(f"{collection}_{name}_{token_id}")
-                            self.download_from_uri(image_url, evm_dir, filename)
-                        
-                        time.sleep(0.5)
-                    
-                    print(f"\n✅ EVM NFTs downloaded to: {evm_dir}")
-                    return
+            if records:
+                self.finish_evm_sync(wallet_address, records, complete=True)
+                return True
             
             print("⚠️  Public API rate limited or wallet has no EVM NFTs")
             print("\n💡 To download EVM NFTs, you can:")
             print("   1. Get free Alchemy API key: https://www.alchemy.com/")
             print("   2. Or manually export from OpenSea/marketplace")
             print("   3. Or provide IPFS hashes directly (option 4 in menu)")
+            return False
             
         except Exception as e:
             print(f"❌ Error: {e}")
             print("\n💡 For EVM NFTs, consider:")
             print("   - Getting free Alchemy API key: https://www.alchemy.com/")
             print("   - Or use OpenSea's export feature")
+            return False
     
-    def download_with_alchemy(self, wallet_address, api_key):
-        """Download using Alchemy API"""
+    def download_with_alchemy(self, wallet_address, api_key, full=False):
+        """
+        Sync using Alchemy API
+        
+        After the first sync, pages are requested newest transfer first and
+        listing stops at the first page that holds nothing new.
+        """
         
         print("🔑 Using Alchemy API...")
         
-        # Alchemy getNFTs endpoint
-        url = f"https://eth-mainnet.g.alchemy.com/nft/v3/{api_key}/getNFTsForOwner"
-        
-        params = {
-            'owner': wallet_address,
-            'withMetadata': 'true',
-            'pageSize': 100
-        }
+        wallet = wallet_key('evm', wallet_address)
+        incremental = not full and bool(self.manifest.wallet(wallet).get('last_sync'))
         
         try:
-            response = requests.get(url, params=params, timeout=30)
-            
-            if response.status_code != 200:
-                print(f"❌ Alchemy API error: {response.status_code}")
-                return
-            
-            data = response.json()
-            nfts = data.get('ownedNfts', [])
-            
-            if not nfts:
+            records = []
+            complete = True
+            pages = iter_alchemy_pages(self.engine, api_key, wallet_address, newest_first=incremental,
+                                       url=self.endpoints['alchemy'])
+            for page in pages:
+                records.extend(page)
+                if incremental and page and all(
+                        self.manifest.is_current(token_key(r), r['uri']) for r in page):
+                    print("🔁 Reached tokens from the last sync, stopping early")
+                    complete = False
+                    pages.close()
+                    break
+            
+            if not records:
                 print("📭 No NFTs found")
-                return
+                return True
             
-            print(f"✅ Found {len(nfts)} Ethereum NFTs!\n")
-            
-            evm_dir = os.path.join(self.output_dir, 'evm')
-            os.makedirs(evm_dir, exist_ok=True)
-            
-            for idx, nft in enumerate(nfts, 1):
-                title = nft.get('name') or nft.get('title', 'Unnamed')
-                token_id = nft.get('tokenId', 'unknown')
-                contract = nft.get('contract', {}).get('name', 'Unknown')
-                
-                print(f"\n[{idx}/{len(nfts)}] {title}")
-                print(f"   Collection: {contract}")
-                print(f"   Token ID: {token_id}")
-                
-                # Get image URL (try multiple sources)
-                media = nft.get('image', {})
-                image_url = (
-                    media.get('originalUrl') or 
-                    media.get('cachedUrl') or
-                    nft.get('gateway', '')
-                )
-                
-                if image_url:
-                    filename = self.sanitize_filename(f"{contract}_{title}_{token_id}")
-                    self.download_from_uri(image_url, evm_dir, filename)
-                else:
-                    print("   ⚠️  No image URL found")
-                
-                time.sleep(0.3)
-            
-            print(f"\n✅ Ethereum NFTs downloaded to: {evm_dir}")
+            self.finish_evm_sync(wallet_address, records, complete=complete)
+            return True
             
         except Exception as e:
             print(f"❌ Error with Alchemy: {e}")
+            return False
+    
+    def finish_evm_sync(self, wallet_address, records, complete):
+        evm_dir = os.path.join(self.output_dir, 'evm')
+        wallet = wallet_key('evm', wallet_address)
+        self.sync_wallet(wallet, records, evm_dir, complete=complete)
+        self.manifest.update_wallet(wallet, last_sync=time.time())
+        self.manifest.save()
+        print(f"\n✅ EVM NFTs synced to: {evm_dir}")
+    
+    def collect(self, pages):
+        """Concatenate listing pages, reporting progress on multi-page wallets"""
+        records = []
+        for number, page in enumerate(pages, 1):
+            records.extend(page)
+            if number > 1:
+                print(f"   📄 Page {number}: {len(records)} tokens so far")
+        return records
     
-    def download_from_uri(self, uri, output_dir, filename):
-        """Download file from URI (supports IPFS, HTTP, etc.)"""
+    def sync_wallet(self, wallet, records, chain_dir, complete):
+        """
+        Merge a listing into the manifest, then download whatever is missing
         
-        try:
-            # Handle IPFS URIs
-            if uri.startswith('ipfs://'):
-                ipfs_hash = uri.replace('ipfs://', '')
-                download_url = self.ipfs_gateways[0] + ipfs_hash
-            elif uri.startswith('ar://'):
-                # Arweave
-                arweave_hash = uri.replace('ar://', '')
-                download_url = f'https://arweave.net/{arweave_hash}'
+        Args:
+            wallet: Wallet key ('tezos:tz1...', 'evm:0x...')
+            records: Token records from the listing (all holdings, or just changes)
+            chain_dir: Folder for this chain's files
+            complete: records is the wallet's full holdings (drop tokens not in it)
+        """
+        os.makedirs(chain_dir, exist_ok=True)
+        
+        changed = [r for r in records if self.manifest.update(r, wallet)]
+        if complete:
+            self.manifest.retire(wallet, {token_key(r) for r in records})
+        held = self.manifest.tokens_for(wallet)
+        
+        print(f"✅ Found {len(held)} NFTs! ({len(changed)} new or changed since last sync)\n")
+        
+        for idx, record in enumerate(changed, 1):
+            print(f"\n[{idx}/{len(changed)}] {record['name']}")
+            if record['collection']:
+                print(f"   Collection: {record['collection']}")
+            print(f"   Token ID: {record['token_id']}")
+            print(f"   Contract: {record['contract']}")
+            if record['quantity']:
+                print(f"   Owned: {record['quantity']}")
+            if record['uri']:
+                print(f"   URI: {record['uri'][:60]}...")
             else:
-                download_url = uri
-            
-            # Determine file extension
-            ext = self.get_extension_from_url(download_url)
-            if not filename.endswith(ext):
-                filename = f"{filename}{ext}"
-            
-            output_path = os.path.join(output_dir, filename)
-            
-            # Skip if already downloaded
-            if os.path.exists(output_path):
-                print(f"   ⏭️  Already exists: {filename}")
+                print("   ⚠️  No media URI found")
+        
+        jobs = [(entry['uri'], chain_dir, self.token_filename(entry), key)
+                for key, entry in held.items() if self.manifest.needs_download(entry)]
+        if not jobs:
+            print("\n✨ Every file is already downloaded")
+        self.download_all(jobs)
+    
+    def repair(self, keys=None):
+        """
+        Re-download broken tokens straight from the manifest, without listing wallets
+        
+        Args:
+            keys: Only these token keys; default every held token whose file
+                  is missing, failed or corrupt
+        
+        Returns the number of tokens queued.
+        """
+        with self.manifest.lock:
+            entries = {k: dict(e) for k, e in self.manifest.tokens.items()
+                       if (keys is None and e['wallets']) or (keys is not None and k in keys)}
+        
+        jobs = [(entry['uri'], self.chain_dir(entry), self.token_filename(entry), key)
+                for key, entry in entries.items() if self.manifest.needs_download(entry)]
+        if not jobs:
+            print("✨ Nothing to repair")
+            return 0
+        
+        print(f"🩹 Repairing {len(jobs)} tokens from the manifest")
+        self.download_all(jobs)
+        return len(jobs)
+    
+    def chain_dir(self, entry):
+        """Folder a token's file lives in (where it was saved before, if known)"""
+        if entry.get('path'):
+            return os.path.join(self.output_dir, os.path.dirname(entry['path']))
+        return os.path.join(self.output_dir, 'tezos' if entry['chain'] == 'tezos' else 'evm')
+    
+    def token_filename(self, entry):
+        """Base filename for a token (the extension is added when downloading)"""
+        if entry.get('path'):
+            return os.path.splitext(os.path.basename(entry['path']))[0]
+        if entry['chain'] == 'tezos':
+            return self.sanitize_filename(f"{entry['name']}_{entry['token_id']}")
+        return self.sanitize_filename(f"{entry['collection']}_{entry['name']}_{entry['token_id']}")
+    
+    def download_all(self, jobs):
+        """
+        Download (uri, output_dir, filename[, token_key]) jobs concurrently
+        
+        Jobs carrying a token key update the manifest as they finish.
+        Reports throughput at the end.
+        """
+        if not jobs:
+            return []
+        
+        print(f"\n⬇️  Downloading {len(jobs)} files ({self.engine.max_workers} at a time)...")
+        self.engine.stats.reset()
+        results = self.engine.run(self._run_job, jobs)
+        self.verifier.wait()
+        self.gateways.scoreboard.save()
+        self.store.save()
+        self.manifest.save()
+        self.engine.stats.print_report()
+        return results
+    
+    def _run_job(self, job):
+        uri, output_dir, filename, *key = job
+        replace = bool(key) and self.manifest.replacing(key[0])
+        path = self.download_from_uri(uri, output_dir, filename, replace=replace)
+        if key:
+            self.manifest.record_download(key[0], path)
+        if path:
+            self.verifier.submit(path)
+        return path
+    
+    def quarantine(self, path, reason):
+        """
+        Move a file that failed its decode check to <output>/.quarantine
+        
+        The blob behind it and every other token file sharing that media are
+        removed too, and the tokens marked 'corrupt' so the next sync
+        downloads them again.
+        """
+        entries = self.manifest.find(path=path)
+        uri = next(iter(entries.values()))['uri'] if entries else None
+        
+        with self.store.locked(uri) if uri else nullcontext():
+            if not os.path.exists(path):
                 return
-            
-            # Download
-            print(f"   ⬇️  Downloading: {filename}")
-            
-            response = requests.get(download_url, timeout=60, stream=True)
-            
-            if response.status_code == 200:
-                with open(output_path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
-                
-                file_size = os.path.getsize(output_path) / (1024 * 1024)
-                print(f"   ✅ Downloaded: {file_size:.2f}MB")
-            else:
-                print(f"   ❌ Failed: HTTP {response.status_code}")
-                
-                # Try alternative IPFS gateway
-                if uri.startswith('ipfs://'):
-                    print("   🔄 Trying alternative IPFS gateway...")
-                    self.try_alternative_gateways(uri, output_path, filename)
+            blob = self.store.resolve(path)
+            dest = os.path.join(self.quarantine_dir, os.path.relpath(path, self.output_dir))
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            shutil.move(path, dest)
+            if blob:
+                self.store.forget(blob)
+            
+            if uri:
+                for key, entry in self.manifest.find(uri=uri).items():
+                    token_path = os.path.join(self.output_dir, entry['path']) if entry.get('path') else None
+                    if token_path and os.path.lexists(token_path):
+                        os.remove(token_path)
+                    self.manifest.set_status(key, 'corrupt')
         
-        except Exception as e:
-            print(f"   ❌ Download error: {e}")
+        print(f"   🚫 Quarantined {os.path.basename(path)}: {reason}")
     
-    def try_alternative_gateways(self, ipfs_uri, output_path, filename):
-        """Try alternative IPFS gateways if first one fails"""
-        ipfs_hash = ipfs_uri.replace('ipfs://', '')
+    @contextmanager
+    def open_media(self, uri, headers=None):
+        """Stream a media URI: IPFS races the best gateways, everything else goes direct"""
+        path = ipfs_path(uri)
+        if path is not None:
+            with self.gateways.open(path, headers=headers) as (gateway, response):
+                yield response
+            return
+        
+        url = uri
+        if uri.startswith('ar://'):
+            # Arweave
+            url = f"https://arweave.net/{uri[len('ar://'):]}"
+        
+        with self.engine.stream(url, headers=headers) as response:
+            if response.status_code not in (200, 206):
+                raise requests.HTTPError(f"HTTP {response.status_code}", response=response)
+            yield response
+    
+    def fetch_to_path(self, uri, output_path, label=None):
+        """
+        Download into output_path + '.part', then rename into place
+        
+        A broken transfer keeps its .part file and the next attempt (this run
+        or a later one) asks for the rest with an HTTP Range request. The
+        final path only ever holds complete files. The first bytes are checked
+        before anything is written: HTML, JSON and other non-media bodies
+        raise NotMedia (for IPFS another gateway gets a turn first).
+        Returns (file size, extension sniffed from the content).
+        
+        Args:
+            label: Name shown in progress messages (default: the file name)
+        """
+        part_path = output_path + '.part'
+        attempt = 0
+        
+        def inspect(head, response):
+            media_extension(head, response.headers.get('Content-Type'))
         
-        for gateway in self.ipfs_gateways[1:]:  # Skip first one (already tried)
+        while True:
+            offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else None
+            
             try:
-                url = gateway + ipfs_hash
-                response = requests.get(url, timeout=60)
+                with self.open_media(uri, headers=headers) as response:
+                    content_type = response.headers.get('Content-Type')
+                    size = write_stream(response, part_path, offset, stats=self.engine.stats,
+                                        inspect=inspect, bandwidth=self.engine.bandwidth)
+                ext = sniff_file(part_path, content_type)
+                os.replace(part_path, output_path)
+                return size, ext
+            
+            except Exception as e:
+                if offset and self._range_rejected(e):
+                    os.remove(part_path)  # Stale .part the server can't resume; start over
+                    continue
+                if isinstance(e, NotMedia) and os.path.exists(part_path):
+                    os.remove(part_path)
                 
-                if response.status_code == 200:
-                    with open(output_path, 'wb') as f:
-                        f.write(response.content)
-                    print(f"   ✅ Success with alternative gateway")
-                    return
-            except:
-                continue
-        
-        print(f"   ❌ All gateways failed")
+                attempt += 1
+                # A gateway's error page is worth another gateway; another server isn't on offer
+                retryable = isinstance(e, (IncompleteDownload, GatewayError)) or (
+                    isinstance(e, NotMedia) and ipfs_path(uri) is not None) or (
+                    isinstance(e, requests.RequestException) and not isinstance(e, requests.HTTPError))
+                if not retryable or attempt >= self.engine.retry.attempts:
+                    raise
+                print(f"   🔄 {label or os.path.basename(output_path)}: {e}, resuming...")
+                time.sleep(self.engine.retry.delay(attempt - 1))
     
-    def get_extension_from_url(self, url):
-        """Get file extension from URL"""
-        # Common image/video extensions
-        if '.png' in url.lower():
-            return '.png'
-        elif '.jpg' in url.lower() or '.jpeg' in url.lower():
-            return '.jpg'
-        elif '.gif' in url.lower():
-            return '.gif'
-        elif '.mp4' in url.lower():
-            return '.mp4'
-        elif '.webp' in url.lower():
-            return '.webp'
-        elif '.svg' in url.lower():
-            return '.svg'
-        else:
-            return '.png'  # Default
+    @staticmethod
+    def _range_rejected(error):
+        """True if the server refused to resume (416, or a 206 from the wrong offset)"""
+        if isinstance(error, ResumeMismatch):
+            return True
+        if isinstance(error, requests.HTTPError):
+            return error.response is not None and error.response.status_code == 416
+        if isinstance(error, GatewayError):
+            return bool(error.errors) and set(error.errors.values()) == {'HTTP 416'}
+        return False
+    
+    def existing_file(self, output_dir, filename):
+        """A media file already saved under this base name, or None"""
+        for ext in MEDIA_EXTENSIONS:
+            path = os.path.join(output_dir, filename + ext)
+            if os.path.exists(path):
+                return path
+        return None
+    
+    def remove_stale(self, output_dir, filename, keep):
+        """Remove files saved under this base name with another extension than keep"""
+        for ext in MEDIA_EXTENSIONS:
+            path = os.path.join(output_dir, filename + ext)
+            if path != keep and os.path.lexists(path):
+                os.remove(path)
+    
+    def download_from_uri(self, uri, output_dir, filename, replace=False):
+        """
+        Download file from URI (supports IPFS, HTTP, etc.)
+        
+        The extension comes from the content's magic bytes (the Content-Type
+        header only for formats the bytes don't identify), not from the URI.
+        Safe to call from several threads at once. Returns the saved path,
+        or None if the download failed.
+        
+        Args:
+            filename: Base name without extension
+            replace: The file saved under this name is old media (the token's
+                     URI changed): download anyway, overwrite it atomically
+                     and remove it if the new media has another extension
+        """
+        stats = self.engine.stats
+        start = time.monotonic()
+        
+        try:
+            # Skip if already downloaded (only complete files reach the final path)
+            existing = None if replace else self.existing_file(output_dir, filename)
+            if existing:
+                try:
+                    sniff_file(existing)
+                    print(f"   ⏭️  Already exists: {os.path.basename(existing)}")
+                    stats.record_file('skipped')
+                    return existing
+                except NotMedia as e:
+                    self.quarantine(existing, e)
+            
+            # Editions and re-used artwork share one blob in the media store
+            with self.store.locked(uri):
+                blob = self.store.lookup(uri)
+                if blob is not None:
+                    try:
+                        output_path = os.path.join(output_dir, filename + sniff_file(blob))
+                        self.store.link(blob, output_path)
+                        if replace:
+                            self.remove_stale(output_dir, filename, output_path)
+                        stats.record_file('linked', time.monotonic() - start)
+                        print(f"   🔗 {os.path.basename(output_path)} (already in media store)")
+                        return output_path
+                    except NotMedia:
+                        self.store.forget(blob)  # Stored before content was checked; fetch again
+                
+                staging = self.store.staging_path(uri)
+                os.makedirs(os.path.dirname(staging), exist_ok=True)
+                size, ext = self.fetch_to_path(uri, staging, label=filename)
+                output_path = os.path.join(output_dir, filename + ext)
+                self.store.link(self.store.ingest(staging, uri), output_path)
+                if replace:
+                    self.remove_stale(output_dir, filename, output_path)
+            
+            stats.record_file('ok', time.monotonic() - start)
+            print(f"   ✅ {filename}{ext} ({size / (1024 * 1024):.2f}MB)")
+            return output_path
+        
+        except Exception as e:
+            print(f"   ❌ {filename}: {e}")
+        
+        stats.record_file('failed', time.monotonic() - start)
+        return None
     
     def sanitize_filename(self, filename):
         """Make filename safe for filesystem"""
@@ -447,25 +589,31 @@ def main():
     
     downloader = NFTDownloader(output_dir='my_nft_collection')
     
+    # Syncs are incremental after the first run; --full re-lists every holding
+    full = '--full' in sys.argv
+    
     print("\n📥 What would you like to download?")
     print("  1. Tezos NFTs only")
     print("  2. EVM NFTs only")
     print("  3. Both (recommended)")
     print("  4. Specific IPFS hash")
+    print("  5. Repair missing/corrupted files only (no wallet listing)")
     
-    choice = input("\nEnter choice (1-4) or press Enter for [3]: ").strip() or "3"
+    choice = input("\nEnter choice (1-5) or press Enter for [3]: ").strip() or "3"
     
     if choice == "1":
-        downloader.download_tezos_nfts(TEZOS_WALLET)
+        downloader.download_tezos_nfts(TEZOS_WALLET, full=full)
     elif choice == "2":
-        downloader.download_evm_nfts(EVM_WALLET)
+        downloader.download_evm_nfts(EVM_WALLET, full=full)
     elif choice == "3":
-        downloader.download_tezos_nfts(TEZOS_WALLET)
-        downloader.download_evm_nfts(EVM_WALLET)
+        downloader.download_tezos_nfts(TEZOS_WALLET, full=full)
+        downloader.download_evm_nfts(EVM_WALLET, full=full)
     elif choice == "4":
         ipfs_hash = input("Enter IPFS hash (ipfs://QmXXX or just QmXXX): ").strip()
         if ipfs_hash:
-            downloader.download_from_uri(ipfs_hash, 'my_nft_collection', 'downloaded_nft')
+            downloader.download_all([(ipfs_hash, 'my_nft_collection', 'downloaded_nft')])
+    elif choice == "5":
+        downloader.repair()
     
     print("\n" + "="*70)
     print("✅ DOWNLOAD COMPLETE!")
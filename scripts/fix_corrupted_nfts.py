@@ -2,82 +2,287 @@
 """
 Fix Corrupted NFT Downloads
 Find and re-download NFTs that failed to download properly
+
+Files are checked in process (magic bytes, optionally a Pillow header parse
+or full decode across a process pool). Results are cached in
+<collection>/.sync/validation.json keyed by path, size, mtime and inode, so
+unchanged files are never checked twice.
+
+Deleted tokens are marked 'corrupt' in the download manifest and can be
+re-downloaded on their own (no wallet listing), through the same concurrent,
+gateway-racing path the downloader uses.
+
+Usage:
+    python scripts/fix_corrupted_nfts.py                       # interactive
+    python scripts/fix_corrupted_nfts.py --level verify --delete --repair
+    python scripts/fix_corrupted_nfts.py --keep                # report only (exit 1 if corrupted)
 """
 
 import sys
 sys.path.append('..')
-import subprocess
+import argparse
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from download_my_nfts import NFTDownloader
+from nft_media import CHECK_LEVELS, MEDIA_EXTENSIONS, check_media
+from nft_store import MediaStore
+from nft_sync import SyncManifest
+
+
+# Suffixes worth checking (what the downloader saves, plus legacy .jpeg)
+SCAN_SUFFIXES = set(MEDIA_EXTENSIONS) | {'.jpeg'}
+
+CACHE_VERSION = 1
+
+
+class ValidationCache:
+    """
+    Check results per file, valid while (size, mtime, inode) are unchanged
+
+    A file that passed at one level also passed every cheaper level; a file
+    that failed is corrupted whatever level is asked for.
+    """
+
+    def __init__(self, collection_dir):
+        self.collection_dir = collection_dir
+        self.path = os.path.join(collection_dir, '.sync', 'validation.json')
+        self.files = {}
+        self.dirty = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == CACHE_VERSION:
+                    self.files = data.get('files', {})
+            except (OSError, ValueError):
+                pass
+
+    @staticmethod
+    def _stamp(st):
+        return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+    def get(self, rel_path, st, level):
+        """Cached (ok, detail) for this file at this level, or None"""
+        entry = self.files.get(rel_path)
+        if not entry or entry['stamp'] != self._stamp(st):
+            return None
+        if entry['ok'] and CHECK_LEVELS.index(entry['level']) < CHECK_LEVELS.index(level):
+            return None
+        return entry['ok'], entry['detail']
+
+    def put(self, rel_path, st, level, ok, detail):
+        self.files[rel_path] = {'stamp': self._stamp(st), 'level': level, 'ok': ok, 'detail': detail}
+        self.dirty = True
+
+    def prune(self, seen):
+        """Forget files that no longer exist"""
+        for rel_path in [p for p in self.files if p not in seen]:
+            del self.files[rel_path]
+            self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'files': self.files}, f)
+        os.replace(tmp_path, self.path)
+        self.dirty = False
+
+
+def _media_files(collection_dir):
+    """(path, stat) for each media file, skipping hidden state dirs (.store, .sync, ...)"""
+    for dirpath, dirnames, files in os.walk(collection_dir):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in files:
+            if os.path.splitext(name)[1].lower() in SCAN_SUFFIXES:
+                path = os.path.join(dirpath, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue
+
+
+def _check(args):
+    return check_media(*args)
+
+
+def scan_collection(collection_dir, level='magic', workers=None, use_cache=True):
+    """
+    Check every media file in a collection
+
+    Magic-byte checks run in this process; header and decode checks are
+    spread over a process pool. Hardlinked copies (editions sharing a media
+    store blob) are checked once.
+
+    Returns (corrupted, stats): corrupted is a list of {'path', 'name',
+    'reason'}; stats counts files 'scanned', 'cached' and 'checked'.
+    """
+    cache = ValidationCache(collection_dir) if use_cache else None
+    results = {}
+    todo = {}  # (dev, inode) -> [(rel_path, path, stat), ...]
+    seen = set()
+
+    for path, st in _media_files(collection_dir):
+        rel_path = os.path.relpath(path, collection_dir)
+        seen.add(rel_path)
+        cached = cache.get(rel_path, st, level) if cache else None
+        if cached is not None:
+            results[path] = cached
+        else:
+            todo.setdefault((st.st_dev, st.st_ino), []).append((rel_path, path, st))
+
+    jobs = [(copies[0][1], level) for copies in todo.values()]
+    if level == 'magic' or len(jobs) < 2:
+        checked = [check_media(*job) for job in jobs]
+    else:
+        workers = workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            checked = list(pool.map(_check, jobs, chunksize=chunksize))
+
+    for copies, result in zip(todo.values(), checked):
+        for rel_path, path, st in copies:
+            results[path] = result
+            if cache:
+                cache.put(rel_path, st, level, *result)
+
+    if cache:
+        cache.prune(seen)
+        cache.save()
+
+    corrupted = [{'path': path, 'name': os.path.basename(path), 'reason': detail}
+                 for path, (ok, detail) in sorted(results.items()) if not ok]
+    stats = {'scanned': len(results), 'cached': len(results) - sum(len(c) for c in todo.values()),
+             'checked': len(jobs)}
+    return corrupted, stats
+
+
+def check_and_list_corrupted(collection_dir=None, level='magic', workers=None, delete=None,
+                             repair=None, use_cache=True):
+    """
+    Find all corrupted NFT files
+
+    Args:
+        collection_dir: Downloader output folder (default: my_nft_collection)
+        level: 'magic', 'header' or 'verify' (see nft_media.check_media)
+        delete: True/False to delete without asking; None asks (keeps when
+                not run from a terminal)
+        repair: Re-download deleted and missing tokens from the download
+                manifest; None asks (as for delete)
+
+    Returns the corrupted files still on disk.
+    """
+    collection_dir = str(collection_dir or Path(__file__).parent.parent / 'my_nft_collection')
 
-def check_and_list_corrupted():
-    """Find all corrupted NFT files"""
-    
-    nft_dir = Path(__file__).parent.parent / 'my_nft_collection' / 'tezos'
-    corrupted = []
-    
     print("🔍 Scanning for corrupted files...")
     print("="*70)
-    
-    for file in nft_dir.glob('*'):
-        if file.suffix.lower() in ['.png', '.jpg', '.jpeg', '.gif']:
-            try:
-                result = subprocess.run(
-                    ['file', '--mime-type', '-b', str(file)],
-                    capture_output=True,
-                    text=True,
-                    timeout=2
-                )
-                
-                mime_type = result.stdout.strip()
-                
-                # Check if it's actually an image
-                valid_types = ['image/', 'video/']
-                is_valid = any(vtype in mime_type for vtype in valid_types)
-                
-                if not is_valid:
-                    corrupted.append({
-                        'path': str(file),
-                        'name': file.name,
-                        'mime': mime_type
-                    })
-                    print(f"❌ {file.name}")
-                    print(f"   Type: {mime_type}")
-                
-            except Exception as e:
-                print(f"⚠️  Error checking {file.name}: {e}")
-    
+
+    start = time.perf_counter()
+    corrupted, stats = scan_collection(collection_dir, level=level, workers=workers,
+                                       use_cache=use_cache)
+    elapsed = time.perf_counter() - start
+
+    for item in corrupted:
+        print(f"❌ {os.path.relpath(item['path'], collection_dir)}")
+        print(f"   Problem: {item['reason']}")
+
     print("="*70)
-    print(f"\n📊 Results:")
+    print(f"\n📊 Results ({level} check, {elapsed * 1000:.0f}ms):")
+    print(f"   Files: {stats['scanned']} ({stats['checked']} checked, {stats['cached']} unchanged since last scan)")
     print(f"   Corrupted files: {len(corrupted)}")
-    print(f"   Valid files: {len(list(nft_dir.glob('*')))-len(corrupted)}")
-    
-    if corrupted:
-        print(f"\n💡 Solutions:")
-        print(f"   1. Re-download from Tezos wallet (automatic)")
-        print(f"   2. Delete corrupted files and re-run NFT downloader")
-        print(f"   3. Manually download from Kukai/objkt.com")
-        
-        delete = input(f"\n🗑️  Delete {len(corrupted)} corrupted files? (y/n): ").lower()
-        
-        if delete == 'y':
-            for item in corrupted:
-                try:
-                    os.remove(item['path'])
-                    print(f"   Deleted: {item['name']}")
-                except Exception as e:
-                    print(f"   Error deleting {item['name']}: {e}")
-            
-            print(f"\n✅ Deleted {len(corrupted)} corrupted files")
-            print(f"\n📥 Now re-run: python scripts/download_my_nfts.py")
-            print(f"   Choose option 1 to re-download Tezos NFTs")
-    else:
+    print(f"   Valid files: {stats['scanned'] - len(corrupted)}")
+
+    manifest = SyncManifest(collection_dir)
+
+    if not corrupted:
         print(f"\n✅ All files are valid!")
-    
+    else:
+        print(f"\n💡 Solutions:")
+        print(f"   1. Delete corrupted files and re-download just those tokens")
+        print(f"   2. Manually download from Kukai/objkt.com")
+
+        if delete is None:
+            delete = _ask(f"\n🗑️  Delete {len(corrupted)} corrupted files? (y/n): ")
+
+        if delete:
+            corrupted = delete_corrupted(collection_dir, corrupted, manifest)
+
+    broken = [e for e in manifest.tokens.values() if e['wallets'] and manifest.needs_download(e)]
+    if broken:
+        if repair is None:
+            repair = _ask(f"\n📥 Re-download {len(broken)} missing or corrupted tokens now? (y/n): ")
+        if repair:
+            NFTDownloader(output_dir=collection_dir).repair()
+        else:
+            print(f"\n📥 Later: python scripts/fix_corrupted_nfts.py --repair")
+            print(f"   (or option 5 in python scripts/download_my_nfts.py)")
+    elif repair and not manifest.tokens:
+        print(f"\n⚠️  No download manifest in {collection_dir}; run download_my_nfts.py once first")
+
     return corrupted
 
 
-if __name__ == '__main__':
-    check_and_list_corrupted()
+def delete_corrupted(collection_dir, corrupted, manifest):
+    """
+    Delete corrupted files, their media store blobs and mark their tokens 'corrupt'
+
+    The blob has to go too, or the downloader would link it straight back.
+    Returns the files that could not be deleted.
+    """
+    store = MediaStore(collection_dir)
+    failed = []
+    for item in corrupted:
+        try:
+            store.discard(item['path'])
+            for key in manifest.find(path=item['path']):
+                manifest.set_status(key, 'corrupt')
+            print(f"   Deleted: {item['name']}")
+        except Exception as e:
+            failed.append(item)
+            print(f"   Error deleting {item['name']}: {e}")
+    store.save()
+    if manifest.tokens:
+        manifest.save()
+
+    print(f"\n✅ Deleted {len(corrupted) - len(failed)} corrupted files")
+    return failed
+
 
+def _ask(prompt):
+    """Yes/no prompt; 'no' when there is no terminal to ask"""
+    return sys.stdin.isatty() and input(prompt).lower() == 'y'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Find (and optionally delete and re-download) corrupted NFT downloads')
+    parser.add_argument('collection', nargs='?', default=None,
+                        help='Downloader output folder (default: my_nft_collection)')
+    parser.add_argument('--level', choices=CHECK_LEVELS, default='magic',
+                        help='magic: file signature; header: + image header parse; verify: + full decode')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Processes for header/verify checks (default: CPU count)')
+    parser.add_argument('--no-cache', action='store_true', help='Re-check every file')
+    action = parser.add_mutually_exclusive_group()
+    action.add_argument('--delete', action='store_true', default=None, help='Delete corrupted files without asking')
+    action.add_argument('--keep', dest='delete', action='store_false', default=None, help='Only report')
+    parser.add_argument('--repair', action='store_true', default=None,
+                        help='Re-download deleted and missing tokens from the download manifest without asking')
+    args = parser.parse_args()
+
+    if args.delete is False and args.repair is None:
+        args.repair = False  # --keep is report-only
+
+    remaining = check_and_list_corrupted(args.collection, level=args.level, workers=args.workers,
+                                         delete=args.delete, repair=args.repair,
+                                         use_cache=not args.no_cache)
+    sys.exit(1 if remaining else 0)
+
+
+if __name__ == '__main__':
+    main()
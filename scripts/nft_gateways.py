@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+"""
+IPFS Gateway Selection
+Persisted per-gateway latency/error scoreboard and hedged gateway racing
+"""
+
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+
+# Smoothing for the latency and error-rate moving averages
+EWMA_ALPHA = 0.3
+
+# Assumed time to first byte for a gateway with no history (seconds)
+DEFAULT_LATENCY = 1.0
+
+# Failing gateways sit out COOL_OFF_BASE * 2^(consecutive failures - 1), capped
+COOL_OFF_BASE = 30.0
+COOL_OFF_MAX = 600.0
+
+_CID = re.compile(r'^(Qm[1-9A-HJ-NP-Za-km-z]{44}|b[a-z2-7]{50,})')
+
+
+def ipfs_path(uri):
+    """
+    The '<cid>/optional/path' part of an IPFS reference, or None
+
+    Accepts ipfs://<cid>, ipfs://ipfs/<cid>, gateway URLs (https://host/ipfs/<cid>)
+    and bare CIDs, so gateway-hosted media can be raced like native IPFS URIs.
+    """
+    uri = uri.strip()
+    if uri.startswith('ipfs://'):
+        path = uri[len('ipfs://'):]
+        return path[len('ipfs/'):] if path.startswith('ipfs/') else path
+    if uri.startswith(('http://', 'https://')):
+        path = urlsplit(uri).path
+        if path.startswith('/ipfs/') and _CID.match(path[len('/ipfs/'):]):
+            return path[len('/ipfs/'):]
+        return None
+    return uri if _CID.match(uri) else None
+
+
+class GatewayScoreboard:
+    """
+    Latency and error history per gateway, persisted between runs
+
+    Gateways are ranked by expected time to first byte, inflated by their
+    recent error rate. A gateway that fails goes on an exponentially growing
+    cool-off and is only tried again after healthy gateways.
+    """
+
+    def __init__(self, gateways, path=None):
+        self.gateways = list(gateways)
+        self.path = path
+        self.lock = threading.Lock()
+        self.scores = {gw: self._blank() for gw in self.gateways}
+        self.load()
+
+    @staticmethod
+    def _blank():
+        return {'latency': None, 'error_rate': 0.0, 'successes': 0, 'failures': 0,
+                'consecutive_failures': 0, 'cool_until': 0.0}
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        for gw in self.gateways:
+            if gw in saved:
+                self.scores[gw].update(saved[gw])
+
+    def save(self):
+        if not self.path:
+            return
+        with self.lock:
+            snapshot = json.dumps(self.scores, indent=2)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass  # The scoreboard is an optimisation; never fail a download over it
+
+    def _expected(self, score):
+        latency = score['latency'] if score['latency'] is not None else DEFAULT_LATENCY
+        return latency * (1 + 4 * score['error_rate'])
+
+    def ranked(self):
+        """Gateways best first; cooling-off gateways last (soonest available first)"""
+        now = time.time()
+        with self.lock:
+            ready = [gw for gw in self.gateways if self.scores[gw]['cool_until'] <= now]
+            cooling = [gw for gw in self.gateways if self.scores[gw]['cool_until'] > now]
+            ready.sort(key=lambda gw: self._expected(self.scores[gw]))
+            cooling.sort(key=lambda gw: self.scores[gw]['cool_until'])
+        return ready + cooling
+
+    def expected_latency(self, gateway):
+        with self.lock:
+            return self._expected(self.scores[gateway])
+
+    def record_success(self, gateway, latency):
+        with self.lock:
+            score = self.scores[gateway]
+            previous = score['latency']
+            score['latency'] = latency if previous is None else (
+                EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * previous)
+            score['error_rate'] *= 1 - EWMA_ALPHA
+            score['successes'] += 1
+            score['consecutive_failures'] = 0
+            score['cool_until'] = 0.0
+
+    def record_failure(self, gateway):
+        with self.lock:
+            score = self.scores[gateway]
+            score['error_rate'] = EWMA_ALPHA + (1 - EWMA_ALPHA) * score['error_rate']
+            score['failures'] += 1
+            score['consecutive_failures'] += 1
+            cool_off = COOL_OFF_BASE * 2 ** (score['consecutive_failures'] - 1)
+            score['cool_until'] = time.time() + min(COOL_OFF_MAX, cool_off)
+
+
+class GatewayError(Exception):
+    """Every gateway failed for a CID"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class _Race:
+    """Shared state between the caller and the contending gateway requests"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.winner = None
+        self.failed = 0
+        self.errors = {}
+        self.finished = threading.Event()
+
+    def claim(self, gateway, response):
+        with self.cond:
+            if self.winner is not None or self.finished.is_set():
+                return False
+            self.winner = (gateway, response)
+            self.cond.notify_all()
+            return True
+
+    def lose(self, gateway, error):
+        with self.cond:
+            self.failed += 1
+            self.errors[gateway] = error
+            self.cond.notify_all()
+
+
+class GatewayRacer:
+    """
+    Hedged requests across IPFS gateways
+
+    The best-ranked gateway is asked first. If it has not started streaming
+    within the hedge delay (by default twice its usual time to first byte),
+    the runner-up is asked too, and whichever responds first wins; the other
+    response is closed as soon as it arrives. When a contender fails, the
+    next gateway in the ranking takes its place, so at most two requests are
+    in flight per file.
+    """
+
+    def __init__(self, engine, scoreboard, hedge_delay=None, max_hedge_delay=2.0):
+        """
+        Args:
+            engine: DownloadEngine (sessions, per-host limits, stats)
+            scoreboard: GatewayScoreboard
+            hedge_delay: Seconds before asking the second gateway
+                         (None = adaptive, 0 = race the best two immediately)
+            max_hedge_delay: Cap for the adaptive delay
+        """
+        self.engine = engine
+        self.scoreboard = scoreboard
+        self.hedge_delay = hedge_delay
+        self.max_hedge_delay = max_hedge_delay
+
+    def _delay(self, gateway):
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        return min(self.max_hedge_delay, 2 * self.scoreboard.expected_latency(gateway))
+
+    def _contend(self, race, gateway, url, headers):
+        start = time.monotonic()
+        try:
+            # No engine retries: the other gateways are the retry (and the
+            # caller resumes from its .part file if a stream breaks)
+            with self.engine.stream(url, headers=headers, attempts=1) as response:
+                if response.status_code not in (200, 206):
+                    if response.status_code != 416:  # Bad Range from us, not the gateway's fault
+                        self.scoreboard.record_failure(gateway)
+                    race.lose(gateway, f"HTTP {response.status_code}")
+                    return
+                self.scoreboard.record_success(gateway, time.monotonic() - start)
+                if race.claim(gateway, response):
+                    race.finished.wait()  # Keep the host slot until the caller is done
+                # Losers fall through: leaving the block closes (cancels) the response
+        except Exception as e:
+            self.scoreboard.record_failure(gateway)
+            race.lose(gateway, str(e))
+
+    @contextmanager
+    def open(self, path, headers=None):
+        """
+        Stream '<cid>/path' from the fastest gateway
+
+        Yields (gateway, response). Raises GatewayError if every gateway fails.
+        """
+        race = _Race()
+        queue = self.scoreboard.ranked()
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            gateway = queue[launched]
+            launched += 1
+            threading.Thread(target=self._contend, args=(race, gateway, gateway + path, headers),
+                             daemon=True).start()
+
+        launch()
+        hedge_at = time.monotonic() + self._delay(queue[0])
+
+        try:
+            with race.cond:
+                while race.winner is None:
+                    in_flight = launched - race.failed
+                    if in_flight == 0 and launched == len(queue):
+                        break
+                    # Replace failed contenders, and hedge once the delay passes
+                    if launched < len(queue) and (in_flight == 0 or
+                                                  (in_flight < 2 and time.monotonic() >= hedge_at)):
+                        launch()
+                        continue
+                    timeout = hedge_at - time.monotonic() if launched < 2 else None
+                    race.cond.wait(timeout if timeout is None or timeout > 0 else 0.01)
+
+            if race.winner is None:
+                errors = ', '.join(f"{urlsplit(gw).netloc}: {err}" for gw, err in race.errors.items())
+                raise GatewayError(f"All gateways failed ({errors})", race.errors)
+
+            yield race.winner
+        except Exception:
+            if race.winner is not None:
+                self.scoreboard.record_failure(race.winner[0])  # Failed mid-stream
+            raise
+        finally:
+            race.finished.set()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+NFT Media Checks
+Identify media from its first bytes, reject non-media before it is saved,
+and decode-check downloaded images in the background
+"""
+
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from PIL import Image
+
+
+# Bytes needed to identify anything below (SVG may open with a long XML prolog)
+SNIFF_BYTES = 4096
+
+# Extensions the sniffer can produce
+MEDIA_EXTENSIONS = ('.png', '.jpg', '.gif', '.webp', '.avif', '.heic', '.tiff', '.svg',
+                    '.mp4', '.mov', '.webm', '.glb', '.mp3', '.wav', '.ogg')
+
+# Formats Pillow can decode-check
+DECODABLE = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.tiff')
+
+# Used only when the bytes are inconclusive but not obviously wrong
+CONTENT_TYPES = {
+    'image/png': '.png',
+    'image/jpeg': '.jpg',
+    'image/gif': '.gif',
+    'image/webp': '.webp',
+    'image/avif': '.avif',
+    'image/heic': '.heic',
+    'image/tiff': '.tiff',
+    'image/svg+xml': '.svg',
+    'video/mp4': '.mp4',
+    'video/quicktime': '.mov',
+    'video/webm': '.webm',
+    'model/gltf-binary': '.glb',
+    'audio/mpeg': '.mp3',
+    'audio/wav': '.wav',
+    'audio/ogg': '.ogg',
+}
+
+
+class NotMedia(Exception):
+    """A response or file is not an image, video, model or audio file"""
+
+
+def sniff(head):
+    """Extension for the media whose first bytes are head, or None"""
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+        return '.wav'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand == b'qt  ':
+            return '.mov'
+        if brand in (b'avif', b'avis'):
+            return '.avif'
+        if brand in (b'heic', b'heix', b'mif1'):
+            return '.heic'
+        return '.mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return '.webm'
+    if head.startswith((b'II*\x00', b'MM\x00*')):
+        return '.tiff'
+    if head.startswith(b'glTF'):
+        return '.glb'
+    if head.startswith(b'ID3') or head[:2] in (b'\xff\xfb', b'\xff\xf3'):
+        return '.mp3'
+    if head.startswith(b'OggS'):
+        return '.ogg'
+
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if text.startswith((b'<svg', b'<?xml', b'<!doctype svg')) and b'<svg' in text:
+        return '.svg'
+    return None
+
+
+def describe(head):
+    """Short description of a non-media body, for error messages"""
+    text = head.lstrip(b'\xef\xbb\xbf \t\r\n').lower()
+    if not head:
+        return 'empty body'
+    if text.startswith((b'<!doctype html', b'<html', b'<head', b'<body')):
+        return 'HTML page'
+    if text.startswith((b'{', b'[')):
+        return 'JSON'
+    if all(32 <= b < 127 or b in (9, 10, 13) for b in head[:256]):
+        return 'text'
+    return 'unrecognised binary'
+
+
+def media_extension(head, content_type=None):
+    """
+    Extension for a media body, raising NotMedia for anything else
+
+    The magic bytes decide. The Content-Type is only trusted for binary
+    bodies the sniffer doesn't know, never for HTML, JSON or text (gateway
+    error pages are often served as image/png).
+    """
+    ext = sniff(head)
+    if ext:
+        return ext
+
+    kind = describe(head)
+    mime = (content_type or '').split(';')[0].strip().lower()
+    if kind == 'unrecognised binary' and mime in CONTENT_TYPES:
+        return CONTENT_TYPES[mime]
+    raise NotMedia(f"Not media: {kind}" + (f" ({mime})" if mime else ''))
+
+
+def sniff_file(path, content_type=None):
+    """media_extension() for a file on disk"""
+    with open(path, 'rb') as f:
+        return media_extension(f.read(SNIFF_BYTES), content_type)
+
+
+def verify_image(path):
+    """
+    Decode-check an image with Pillow
+
+    verify() checks the structure (PNG chunk CRCs etc.); load() then decodes
+    the pixels, which catches truncated files. Returns (ok, reason).
+    """
+    try:
+        with Image.open(path) as img:
+            img.verify()
+        with Image.open(path) as img:
+            img.load()
+        return True, None
+    except Image.DecompressionBombError:
+        return True, None  # Too large to decode-check safely; the header parsed
+    except Exception as e:
+        return False, f"{type(e).__name__}: {e}"
+
+
+# Check levels, cheapest first
+CHECK_LEVELS = ('magic', 'header', 'verify')
+
+
+def check_media(path, level='magic'):
+    """
+    Check a saved file at one of CHECK_LEVELS; returns (ok, detail)
+
+    magic   First bytes are a known media format (detail is the extension)
+    header  ...and Pillow can parse the image header
+    verify  ...and the image fully decodes (verify_image)
+    """
+    try:
+        ext = sniff_file(path)
+    except NotMedia as e:
+        return False, str(e)
+    except OSError as e:
+        return False, f"{type(e).__name__}: {e}"
+    if level == 'magic' or ext not in DECODABLE:
+        return True, ext
+
+    if level == 'header':
+        try:
+            with Image.open(path):
+                pass  # open() parses the header and leaves the pixels undecoded
+        except Exception as e:
+            return False, f"{type(e).__name__}: {e}"
+        return True, ext
+
+    ok, reason = verify_image(path)
+    return ok, ext if ok else reason
+
+
+class MediaVerifier:
+    """
+    Background decode checks for freshly downloaded images
+
+    Downloads don't wait for the check. Each file content is checked once
+    (editions linked to the same blob share an inode). Files that fail are
+    passed to on_invalid(path, reason) from a worker thread.
+    """
+
+    def __init__(self, on_invalid, workers=2):
+        self.on_invalid = on_invalid
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='verify')
+        self.pending = set()
+        self.checked = set()
+        self.lock = threading.Lock()
+
+    def submit(self, path):
+        if os.path.splitext(path)[1].lower() not in DECODABLE:
+            return
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self.lock:
+            if identity in self.checked:
+                return
+            self.checked.add(identity)
+        future = self.pool.submit(self._check, path)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self.lock:
+            self.pending.discard(future)
+
+    def _check(self, path):
+        ok, reason = verify_image(path)
+        if not ok:
+            self.on_invalid(path, reason)
+
+    def wait(self):
+        """Block until every submitted check has finished"""
+        with self.lock:
+            pending = list(self.pending)
+        wait(pending)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+"""
+NFT Stand-in Server
+Local imitation of the objkt, Alchemy, OpenSea, SimpleHash and IPFS gateway
+endpoints NFTDownloader talks to, for offline testing and benchmarking
+
+Serves a synthetic wallet of deterministic PNG artworks. Latency, error
+rates, slow gateways, 429 throttling and dropped connections are all
+configurable. The API and every gateway listen on their own port, so the
+downloader's per-host limits behave as they would against real hosts.
+
+Usage:
+    python scripts/nft_standin_server.py --tokens 500 --slow-gateways 1
+    (prints a config.json snippet pointing NFTDownloader at it)
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import random
+import re
+import sys
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from PIL import Image
+
+
+TEZOS_WALLET = 'tz1StandinWa11etXXXXXXXXXXXXXXXXXXX'
+EVM_WALLET = '0x57a0d1e000000000000000000000000000000000'
+
+_CID_BODY = re.compile(r'^/ipfs/(Qm[1-9A-HJ-NP-Za-km-z]{44})')
+_B58 = '123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz'
+
+
+def fake_cid(artwork):
+    """Deterministic CIDv0-shaped identifier for an artwork number"""
+    n = int(hashlib.sha256(f'standin-{artwork}'.encode('utf-8')).hexdigest(), 16)
+    digits = []
+    for _ in range(44):
+        n, r = divmod(n, 58)
+        digits.append(_B58[r])
+    return 'Qm' + ''.join(digits)
+
+
+class _Throttle:
+    """Non-blocking token bucket: allow() is False when the client should get a 429"""
+
+    def __init__(self, rate):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def allow(self):
+        if not self.rate:
+            return True
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+class _QuietServer(ThreadingHTTPServer):
+    """Clients hanging up mid-response (hedge losers, timeouts) is normal here"""
+
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionError, TimeoutError)):
+            super().handle_error(request, client_address)
+
+
+class StandinServer:
+    """Synthetic wallet plus the API and gateway servers that expose it"""
+
+    def __init__(self, tokens=200, unique_media=None, media_kb=64, page_size=100,
+                 latency_ms=20, jitter_ms=10, error_rate=0.0, throttle_rps=0,
+                 gateways=3, slow_gateways=0, slow_ms=1500, truncate_rate=0.0, seed=0):
+        """
+        Args:
+            tokens: Tokens held by each synthetic wallet
+            unique_media: Distinct artworks (tokens share them as editions; default: one each)
+            media_kb: Approximate artwork size
+            page_size: Max rows per REST page (GraphQL honours the requested limit)
+            latency_ms / jitter_ms: Delay before every response
+            error_rate: Fraction of requests answered 503
+            throttle_rps: Requests per second per server before answering 429 (0 = off)
+            gateways: Number of IPFS gateways
+            slow_gateways: How many gateways (listed first) add slow_ms of latency
+            truncate_rate: Fraction of media responses cut off halfway
+        """
+        self.tokens = tokens
+        self.unique_media = unique_media or tokens
+        self.media_kb = media_kb
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.throttle_rps = throttle_rps
+        self.gateway_count = gateways
+        self.slow_gateways = slow_gateways
+        self.slow_ms = slow_ms
+        self.truncate_rate = truncate_rate
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.random_lock = threading.Lock()
+        self.servers = []
+        self.requests = 0
+
+    # ------------------------------------------------------------------
+    # Synthetic wallet
+    # ------------------------------------------------------------------
+
+    def artwork(self, token):
+        return token % self.unique_media
+
+    def media_uri(self, token, chain):
+        """Tezos media is ipfs://; half of the EVM media is plain HTTP"""
+        artwork = self.artwork(token)
+        if chain == 'evm' and artwork % 2:
+            return f"{self.api_url}/media/{artwork}.png"
+        return f"ipfs://{fake_cid(artwork)}"
+
+    def changed_at(self, token):
+        return time.strftime('%Y-%m-%dT%H:%M:%S+00:00', time.gmtime(1735689600 + token * 60))
+
+    @lru_cache(maxsize=512)
+    def media(self, artwork):
+        """Deterministic noise PNG of roughly media_kb"""
+        side = max(8, int((self.media_kb * 1024 / 3) ** 0.5))
+        rng = np.random.default_rng(self.seed * 1_000_003 + artwork)
+        pixels = rng.integers(0, 256, (side, side, 3), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format='PNG', compress_level=0)
+        return buffer.getvalue()
+
+    def artwork_for_cid(self, cid):
+        return self.cids.get(cid)
+
+    # ------------------------------------------------------------------
+    # API responses
+    # ------------------------------------------------------------------
+
+    def objkt(self, body):
+        variables = body.get('variables', {})
+        if variables.get('address') != TEZOS_WALLET:
+            return {'data': {'token_holder': []}}
+
+        rows = []
+        for token in range(self.tokens):
+            changed = self.changed_at(token)
+            if variables.get('since') and changed <= variables['since']:
+                continue
+            rows.append({
+                'token': {
+                    'token_id': str(token),
+                    'name': f'Standin #{token}',
+                    'description': 'Synthetic token',
+                    'artifact_uri': self.media_uri(token, 'tezos'),
+                    'display_uri': None,
+                    'thumbnail_uri': None,
+                    'fa_contract': 'KT1StandinContractXXXXXXXXXXXXXXXXX',
+                },
+                'quantity': '1',
+                'last_incremented_at': changed,
+            })
+        offset = int(variables.get('offset', 0))
+        limit = int(variables.get('limit', 100))
+        return {'data': {'token_holder': rows[offset:offset + limit]}}
+
+    def _evm_page(self, offset, limit):
+        tokens = range(offset, min(self.tokens, offset + limit))
+        following = offset + limit if offset + limit < self.tokens else None
+        return tokens, following
+
+    def alchemy(self, query):
+        offset = int(query.get('pageKey', ['0'])[0])
+        limit = min(int(query.get('pageSize', ['100'])[0]), self.page_size)
+        tokens, following = self._evm_page(offset, limit)
+        return {
+            'ownedNfts': [{
+                'contract': {'address': '0xStandinContract', 'name': 'Standin'},
+                'tokenId': str(token),
+                'name': f'Standin #{token}',
+                'image': {'originalUrl': self.media_uri(token, 'evm')},
+                'balance': '1',
+                'acquiredAt': {'blockTimestamp': self.changed_at(token)},
+            } for token in tokens],
+            'pageKey': str(following) if following else None,
+            'totalCount': self.tokens,
+        }
+
+    def opensea(self, query):
+        offset = int(query.get('next', ['0'])[0])
+        limit = min(int(query.get('limit', ['50'])[0]), self.page_size)
+        tokens, following = self._evm_page(offset, limit)
+        return {
+            'nfts': [{
+                'identifier': str(token),
+                'collection': 'standin',
+                'contract': '0xStandinContract',
+                'name': f'Standin #{token}',
+                'image_url': self.media_uri(token, 'evm'),
+            } for token in tokens],
+            'next': str(following) if following else None,
+        }
+
+    def simplehash(self, query):
+        offset = int(query.get('cursor', ['0'])[0])
+        tokens, following = self._evm_page(offset, self.page_size)
+        return {
+            'nfts': [{
+                'chain': 'ethereum',
+                'contract_address': '0xStandinContract',
+                'token_id': str(token),
+                'name': f'Standin #{token}',
+                'collection': {'name': 'Standin'},
+                'image_url': self.media_uri(token, 'evm'),
+            } for token in tokens],
+            'next_cursor': str(following) if following else None,
+        }
+
+    # ------------------------------------------------------------------
+    # Servers
+    # ------------------------------------------------------------------
+
+    def roll(self, probability):
+        with self.random_lock:
+            return probability > 0 and self.random.random() < probability
+
+    def delay(self, extra_ms=0):
+        with self.random_lock:
+            jitter = self.random.uniform(0, self.jitter_ms)
+        time.sleep((self.latency_ms + jitter + extra_ms) / 1000)
+
+    def _serve(self, role, extra_ms=0):
+        standin = self
+        throttle = _Throttle(self.throttle_rps)
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, body=b'', content_type='application/json', headers=None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _json(self, payload):
+                self._send(200, json.dumps(payload).encode('utf-8'))
+
+            def _gate(self):
+                """Latency, throttling and injected errors; True if the request may proceed"""
+                with standin.random_lock:
+                    standin.requests += 1
+                standin.delay(extra_ms)
+                if not throttle.allow():
+                    self._send(429, b'{"error": "rate limited"}', headers={'Retry-After': '1'})
+                    return False
+                if standin.roll(standin.error_rate):
+                    self._send(503, b'<html>Service Unavailable</html>', content_type='text/html')
+                    return False
+                return True
+
+            def _media(self, artwork):
+                if artwork is None:
+                    self._send(404, b'not found', content_type='text/plain')
+                    return
+                body = standin.media(artwork)
+                start = 0
+                match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+                if match:
+                    start = int(match.group(1))
+                    if start >= len(body):
+                        self._send(416, headers={'Content-Range': f'bytes */{len(body)}'})
+                        return
+                    self.send_response(206)
+                    self.send_header('Content-Range', f'bytes {start}-{len(body) - 1}/{len(body)}')
+                else:
+                    self.send_response(200)
+                self.send_header('Content-Type', 'image/png')
+                self.send_header('Accept-Ranges', 'bytes')
+                self.send_header('Content-Length', str(len(body) - start))
+                self.end_headers()
+
+                if standin.roll(standin.truncate_rate):
+                    # Drop the connection halfway through
+                    self.wfile.write(body[start:start + (len(body) - start) // 2])
+                    self.wfile.flush()
+                    self.close_connection = True
+                    return
+                self.wfile.write(body[start:])
+
+            def do_GET(self):
+                if not self._gate():
+                    return
+                url = urlsplit(self.path)
+                query = parse_qs(url.query)
+
+                if role == 'gateway':
+                    match = _CID_BODY.match(url.path)
+                    self._media(standin.artwork_for_cid(match.group(1)) if match else None)
+                elif url.path.startswith('/media/'):
+                    number = url.path[len('/media/'):].split('.')[0]
+                    artwork = int(number) if number.isdigit() and int(number) < standin.unique_media else None
+                    self._media(artwork)
+                elif url.path.endswith('/getNFTsForOwner'):
+                    self._json(standin.alchemy(query) if query.get('owner') == [EVM_WALLET]
+                               else {'ownedNfts': [], 'pageKey': None})
+                elif url.path.startswith('/opensea/') and EVM_WALLET in url.path:
+                    self._json(standin.opensea(query))
+                elif url.path.startswith('/simplehash/'):
+                    self._json(standin.simplehash(query))
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                if not self._gate():
+                    return
+                if role == 'api' and urlsplit(self.path).path == '/objkt/v3/graphql':
+                    self._json(standin.objkt(json.loads(body or b'{}')))
+                else:
+                    self._send(404, b'{"error": "not found"}')
+
+        server = _QuietServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def start(self):
+        self.cids = {fake_cid(artwork): artwork for artwork in range(self.unique_media)}
+        self.api_url = self._serve('api')
+        self.gateway_urls = [
+            self._serve('gateway', self.slow_ms if i < self.slow_gateways else 0) + '/ipfs/'
+            for i in range(self.gateway_count)
+        ]
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            server.shutdown()
+            server.server_close()
+        self.servers = []
+
+    def downloader_config(self):
+        """config.json entries pointing NFTDownloader at this server"""
+        return {
+            'alchemy_api_key': 'standin',
+            'endpoints': {
+                'objkt': f"{self.api_url}/objkt/v3/graphql",
+                'alchemy': f"{self.api_url}/alchemy/nft/v3",
+                'opensea': f"{self.api_url}/opensea/api/v2",
+                'simplehash': f"{self.api_url}/simplehash/api/v0",
+            },
+            'ipfs_gateways': list(self.gateway_urls),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local stand-in for the NFT APIs and IPFS gateways')
+    parser.add_argument('--tokens', type=int, default=200, help='Tokens per synthetic wallet')
+    parser.add_argument('--unique-media', type=int, default=0, help='Distinct artworks (default: one per token)')
+    parser.add_argument('--media-kb', type=int, default=64, help='Approximate artwork size')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=10)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of 503 responses')
+    parser.add_argument('--throttle', type=float, default=0, help='Requests/s per server before 429s')
+    parser.add_argument('--gateways', type=int, default=3)
+    parser.add_argument('--slow-gateways', type=int, default=0)
+    parser.add_argument('--slow-ms', type=float, default=1500)
+    parser.add_argument('--truncate-rate', type=float, default=0.0,
+                        help='Fraction of media responses cut off halfway')
+    args = parser.parse_args()
+
+    standin = StandinServer(
+        tokens=args.tokens, unique_media=args.unique_media or None, media_kb=args.media_kb,
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        throttle_rps=args.throttle, gateways=args.gateways, slow_gateways=args.slow_gateways,
+        slow_ms=args.slow_ms, truncate_rate=args.truncate_rate,
+    ).start()
+
+    print("\n" + "="*70)
+    print("🧪 NFT STAND-IN SERVER")
+    print("="*70)
+    print(f"   API:      {standin.api_url}")
+    for url in standin.gateway_urls:
+        print(f"   Gateway:  {url}")
+    print(f"   Wallets:  {TEZOS_WALLET} (Tezos), {EVM_WALLET} (EVM)")
+    print("\nconfig.json entries:")
+    print(json.dumps(standin.downloader_config(), indent=2))
+    print("\nCtrl+C to stop")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        standin.stop()
+
+
+if __name__ == '__main__':
+    main()
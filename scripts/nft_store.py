@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+NFT Media Store
+Content-addressed storage for downloaded NFT media
+
+Each artwork is stored once under <output>/.store/blobs, keyed by its IPFS
+CID (known before downloading, so repeat editions are never fetched again)
+or by the SHA-256 of its bytes for HTTP and Arweave sources. The per-token
+files in tezos/ and evm/ are hardlinks to the blobs (symlinks when the
+filesystem can't hardlink).
+
+gc and downloads coordinate through a lock file (.store/lock): each
+download holds it shared from fetching to linking, gc holds it exclusively,
+so gc never deletes a blob that is about to be linked. (Where fcntl is
+unavailable, e.g. Windows, there is no lock: don't run gc during a sync.)
+
+Usage:
+    python scripts/nft_store.py gc my_nft_collection [--dry-run]
+    python scripts/nft_store.py adopt my_nft_collection
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from nft_gateways import ipfs_path
+
+try:
+    import fcntl
+except ImportError:  # Windows: no store-wide lock (see above)
+    fcntl = None
+
+
+LINK_MODES = ('hardlink', 'symlink')
+
+# Partial downloads older than this are abandoned and removed by gc (seconds)
+STAGING_MAX_AGE = 7 * 24 * 3600
+
+
+def _sha256_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class MediaStore:
+    """Blobs keyed by CID or SHA-256, linked into per-token filenames"""
+
+    def __init__(self, output_dir, link='hardlink'):
+        if link not in LINK_MODES:
+            raise ValueError(f"Unknown link mode: {link}")
+        self.output_dir = output_dir
+        self.root = os.path.join(output_dir, '.store')
+        self.blob_dir = os.path.join(self.root, 'blobs')
+        self.staging_dir = os.path.join(self.root, 'staging')
+        self.index_path = os.path.join(self.root, 'index.json')
+        self.lock_path = os.path.join(self.root, 'lock')
+        self.link_mode = link
+
+        self.lock = threading.Lock()
+        self._key_locks = {}
+        self.index = {}  # URI -> sha256 key, for sources without a CID
+        self.dirty = False
+        self._inodes = None  # (st_ino, st_dev) -> blob path, built on first resolve()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError):
+                pass
+
+    # ------------------------------------------------------------------
+    # Keys and paths
+    # ------------------------------------------------------------------
+
+    def cid_key(self, uri):
+        """Store key for IPFS URIs ('ipfs-<cid>[__sub__path]'), None otherwise"""
+        path = ipfs_path(uri)
+        if path is None:
+            return None
+        return 'ipfs-' + re.sub(r'[^A-Za-z0-9._-]', '_', path.strip('/').replace('/', '__'))[:200]
+
+    def blob_path(self, key):
+        shard = hashlib.sha1(key.encode('utf-8')).hexdigest()[:2]
+        return os.path.join(self.blob_dir, shard, key)
+
+    def staging_path(self, uri):
+        """Stable per-URI download path, so interrupted downloads resume"""
+        name = hashlib.sha1(uri.encode('utf-8')).hexdigest()
+        return os.path.join(self.staging_dir, name)
+
+    def lookup(self, uri):
+        """Blob path already holding this URI's content, or None"""
+        key = self.cid_key(uri)
+        if key is None:
+            with self.lock:
+                key = self.index.get(uri)
+        if key is None:
+            return None
+        path = self.blob_path(key)
+        return path if os.path.exists(path) else None
+
+    @contextmanager
+    def locked(self, uri):
+        """Serialise work on one URI (several tokens can share an artwork); holds the store lock shared"""
+        key = self.cid_key(uri) or uri
+        with self.lock:
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock, self.store_lock(exclusive=False):
+            yield
+
+    @contextmanager
+    def store_lock(self, exclusive):
+        """Store-wide lock across processes: shared for downloads, exclusive for gc"""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(self.root, exist_ok=True)
+        # One open file per holder: flock belongs to the open file, not the thread
+        with open(self.lock_path, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------
+    # Adding and linking
+    # ------------------------------------------------------------------
+
+    def ingest(self, path, uri=None):
+        """
+        Move a complete file into the store and return its blob path
+
+        Content that is already stored is not kept twice: the new copy is
+        deleted and the existing blob returned.
+        """
+        key = self.cid_key(uri) if uri else None
+        if key is None:
+            key = 'sha256-' + _sha256_file(path)
+            if uri:
+                with self.lock:
+                    self.index[uri] = key
+                    self.dirty = True
+
+        blob = self.blob_path(key)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.replace(path, blob)
+            self._remember_inode(blob)
+        return blob
+
+    def link(self, blob, dest):
+        """Point dest at a blob (hardlink, falling back to a relative symlink)"""
+        tmp = f"{dest}.{os.getpid()}.{threading.get_ident()}.link"
+        if self.link_mode == 'hardlink':
+            try:
+                os.link(blob, tmp)
+            except OSError:
+                os.symlink(os.path.relpath(blob, os.path.dirname(dest)), tmp)
+        else:
+            os.symlink(os.path.relpath(blob, os.path.dirname(dest)), tmp)
+        os.replace(tmp, dest)
+
+    def save(self):
+        """Write the URI index if it changed"""
+        # Written under the lock so concurrent saves can't land out of order
+        with self.lock:
+            if not self.dirty:
+                return
+            os.makedirs(self.root, exist_ok=True)
+            tmp_path = f"{self.index_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(self.index, f, indent=2)
+            os.replace(tmp_path, self.index_path)
+            self.dirty = False
+
+    def discard(self, path):
+        """Remove a bad file and the blob behind it, so it gets downloaded again"""
+        blob = self.resolve(path)
+        if os.path.lexists(path):
+            os.remove(path)
+        if blob:
+            self.forget(blob)
+
+    def forget(self, blob):
+        """Delete a blob and the URIs indexed to it"""
+        if os.path.exists(blob):
+            st = os.stat(blob)
+            os.remove(blob)
+            self._forget_inode(st)
+        key = os.path.basename(blob)
+        with self.lock:
+            for uri in [u for u, k in self.index.items() if k == key]:
+                del self.index[uri]
+                self.dirty = True
+
+    def resolve(self, path):
+        """
+        Blob behind a per-token file (via symlink or shared inode), or None
+
+        Hardlinks are matched through an inode -> blob map, built with one scan
+        of the store and kept current by this process's ingest, forget, gc
+        and adopt.
+        """
+        if os.path.islink(path):
+            target = os.path.realpath(path)
+            return target if target.startswith(os.path.realpath(self.blob_dir)) else None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if st.st_nlink < 2:
+            return None
+        with self.lock:
+            if self._inodes is None:
+                self._inodes = {}
+                for blob in self._blobs():
+                    b = os.stat(blob)
+                    self._inodes[(b.st_ino, b.st_dev)] = blob
+            return self._inodes.get((st.st_ino, st.st_dev))
+
+    def _remember_inode(self, blob):
+        """Add a new blob to the inode map (if it has been built)"""
+        with self.lock:
+            if self._inodes is not None:
+                b = os.stat(blob)
+                self._inodes[(b.st_ino, b.st_dev)] = blob
+
+    def _forget_inode(self, st):
+        """Drop a deleted blob (its stat result from before deleting) from the inode map"""
+        with self.lock:
+            if self._inodes is not None:
+                self._inodes.pop((st.st_ino, st.st_dev), None)
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _blobs(self):
+        for dirpath, _, files in os.walk(self.blob_dir):
+            for name in files:
+                yield os.path.join(dirpath, name)
+
+    def _token_files(self):
+        """Per-token files under the output dir (skipping hidden state dirs)"""
+        for dirpath, dirnames, files in os.walk(self.output_dir):
+            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+            for name in files:
+                yield os.path.join(dirpath, name)
+
+    def gc(self, dry_run=False):
+        """
+        Delete blobs no per-token file points to
+
+        Hardlinked blobs are referenced while their link count is above one;
+        symlinked blobs while some symlink under the output dir targets them.
+        Staging files from downloads abandoned over a week ago are removed too.
+        Holds the store lock exclusively, so it waits for downloads in progress.
+        Returns (blobs removed, bytes freed).
+        """
+        with self.store_lock(exclusive=True):
+            return self._gc(dry_run)
+
+    def _gc(self, dry_run):
+        symlinked = {os.path.realpath(p) for p in self._token_files() if os.path.islink(p)}
+
+        removed = freed = 0
+        for blob in list(self._blobs()):
+            st = os.stat(blob)
+            if st.st_nlink > 1 or os.path.realpath(blob) in symlinked:
+                continue
+            removed += 1
+            freed += st.st_size
+            if not dry_run:
+                os.remove(blob)
+                self._forget_inode(st)
+
+        if not dry_run:
+            if os.path.isdir(self.staging_dir):
+                cutoff = time.time() - STAGING_MAX_AGE
+                for name in os.listdir(self.staging_dir):
+                    path = os.path.join(self.staging_dir, name)
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+            live = {os.path.basename(b) for b in self._blobs()}
+            with self.lock:
+                for uri in [u for u, k in self.index.items() if k not in live]:
+                    del self.index[uri]
+                    self.dirty = True
+            self.save()
+
+        return removed, freed
+
+    def adopt(self):
+        """
+        Move existing plain per-token files into the store
+
+        Collections downloaded before the store existed keep one copy per
+        token; identical files collapse into a single blob. Returns
+        (files adopted, bytes saved).
+        """
+        with self.store_lock(exclusive=True):
+            return self._adopt()
+
+    def _adopt(self):
+        adopted = saved = 0
+        for path in list(self._token_files()):
+            if os.path.islink(path) or path.endswith('.part') or os.stat(path).st_nlink > 1:
+                continue
+            size = os.path.getsize(path)
+            key = 'sha256-' + _sha256_file(path)
+            blob = self.blob_path(key)
+            if os.path.exists(blob):
+                saved += size
+            else:
+                os.makedirs(os.path.dirname(blob), exist_ok=True)
+                os.replace(path, blob)
+                self._remember_inode(blob)
+            self.link(blob, path)
+            adopted += 1
+        return adopted, saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Maintain the NFT media store')
+    parser.add_argument('command', choices=['gc', 'adopt'],
+                        help='gc: delete unreferenced blobs; adopt: move existing files into the store')
+    parser.add_argument('output_dir', nargs='?', default='my_nft_collection')
+    parser.add_argument('--dry-run', action='store_true', help='gc: only report what would be deleted')
+    parser.add_argument('--link', choices=LINK_MODES, default='hardlink')
+    args = parser.parse_args()
+
+    store = MediaStore(args.output_dir, link=args.link)
+
+    if args.command == 'gc':
+        removed, freed = store.gc(dry_run=args.dry_run)
+        verb = 'Would remove' if args.dry_run else 'Removed'
+        print(f"🧹 {verb} {removed} unreferenced blobs ({freed / (1024 * 1024):.2f}MB)")
+    else:
+        adopted, saved = store.adopt()
+        print(f"📦 Adopted {adopted} files into the store ({saved / (1024 * 1024):.2f}MB of duplicates freed)")
+
+
+if __name__ == '__main__':
+    main()
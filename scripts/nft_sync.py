@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+NFT Wallet Sync
+Paginated holdings listings (objkt, Alchemy, OpenSea, SimpleHash) and the
+local manifest that makes repeat syncs incremental
+
+The manifest (<output>/.sync/manifest.json) records every token seen, its
+media URI, the file it was saved to and its download status, plus a cursor
+per wallet. Later syncs only ask the APIs for what changed since the cursor
+(where the API can filter) and only download tokens whose file is missing.
+"""
+
+import json
+import os
+import threading
+import time
+
+
+OBJKT_GRAPHQL = 'https://data.objkt.com/v3/graphql'
+ALCHEMY_NFT_API = 'https://eth-mainnet.g.alchemy.com/nft/v3'
+OPENSEA_API = 'https://api.opensea.io/api/v2'
+SIMPLEHASH_API = 'https://api.simplehash.com/api/v0'
+
+MANIFEST_VERSION = 1
+
+
+class SyncError(Exception):
+    """A holdings API returned an error"""
+
+    def __init__(self, message, status=None):
+        super().__init__(message)
+        self.status = status
+
+
+def token_key(record):
+    return f"{record['chain']}:{record['contract']}:{record['token_id']}"
+
+
+def wallet_key(chain, address):
+    return f"{chain}:{address}"
+
+
+def _json(response, source):
+    if response.status_code != 200:
+        raise SyncError(f"{source} returned status {response.status_code}", response.status_code)
+    try:
+        return response.json()
+    except ValueError:
+        raise SyncError(f"{source} returned invalid JSON", response.status_code)
+
+
+# ---------------------------------------------------------------------------
+# Tezos (objkt GraphQL, offset pagination)
+# ---------------------------------------------------------------------------
+
+_OBJKT_QUERY = """
+query GetUserTokens($address: String!, $limit: Int!, $offset: Int!%(since_var)s) {
+  token_holder(
+    where: {
+      holder_address: {_eq: $address}
+      quantity: {_gt: "0"}%(since_filter)s
+    }
+    order_by: {token_pk: asc}
+    limit: $limit
+    offset: $offset
+  ) {
+    token {
+      token_id
+      name
+      description
+      artifact_uri
+      display_uri
+      thumbnail_uri
+      fa_contract
+    }
+    quantity
+    last_incremented_at
+  }
+}
+"""
+
+
+def _objkt_record(holding):
+    token = holding['token']
+    token_id = token.get('token_id', 'unknown')
+    return {
+        'chain': 'tezos',
+        'contract': token.get('fa_contract', 'unknown'),
+        'token_id': token_id,
+        'name': token.get('name') or f'Token_{token_id}',
+        'collection': None,
+        # artifact_uri is usually the full quality
+        'uri': token.get('artifact_uri') or token.get('display_uri') or token.get('thumbnail_uri'),
+        'quantity': holding.get('quantity'),
+        'changed_at': holding.get('last_incremented_at'),
+    }
+
+
+def iter_objkt_pages(engine, address, since=None, page_size=500, url=OBJKT_GRAPHQL):
+    """
+    Yield lists of Tezos token records, one objkt page at a time
+
+    Args:
+        since: Only holdings incremented after this timestamp (incremental sync)
+    """
+    query = _OBJKT_QUERY % {
+        'since_var': ', $since: timestamptz!' if since else '',
+        'since_filter': '\n      last_incremented_at: {_gt: $since}' if since else '',
+    }
+    offset = 0
+    while True:
+        variables = {'address': address, 'limit': page_size, 'offset': offset}
+        if since:
+            variables['since'] = since
+        response = engine.request('POST', url, json={'query': query, 'variables': variables},
+                                  headers={'Content-Type': 'application/json'}, timeout=30)
+        data = _json(response, 'objkt')
+        if 'errors' in data:
+            raise SyncError(f"objkt API error: {data['errors']}")
+
+        holdings = (data.get('data') or {}).get('token_holder', [])
+        yield [_objkt_record(h) for h in holdings]
+        if len(holdings) < page_size:
+            return
+        offset += page_size
+
+
+# ---------------------------------------------------------------------------
+# EVM
+# ---------------------------------------------------------------------------
+
+def _alchemy_record(nft):
+    media = nft.get('image', {}) or {}
+    contract = nft.get('contract', {}) or {}
+    acquired = nft.get('acquiredAt') or {}
+    return {
+        'chain': 'ethereum',
+        'contract': contract.get('address', 'unknown'),
+        'token_id': nft.get('tokenId', 'unknown'),
+        'name': nft.get('name') or nft.get('title') or 'Unnamed',
+        'collection': contract.get('name') or 'Unknown',
+        'uri': media.get('originalUrl') or media.get('cachedUrl') or nft.get('gateway') or None,
+        'quantity': nft.get('balance'),
+        'changed_at': acquired.get('blockTimestamp'),
+    }
+
+
+def iter_alchemy_pages(engine, api_key, owner, page_size=100, newest_first=False, url=ALCHEMY_NFT_API):
+    """
+    Yield lists of Ethereum token records, following Alchemy's pageKey
+
+    Args:
+        newest_first: Order by transfer time, newest first, so an incremental
+                      sync can stop at the first page it has already seen
+    """
+    params = {'owner': owner, 'withMetadata': 'true', 'pageSize': page_size}
+    if newest_first:
+        params['orderBy'] = 'transferTime'
+    while True:
+        response = engine.request('GET', f"{url}/{api_key}/getNFTsForOwner", params=params, timeout=30)
+        data = _json(response, 'Alchemy')
+        yield [_alchemy_record(nft) for nft in data.get('ownedNfts', [])]
+        if not data.get('pageKey'):
+            return
+        params['pageKey'] = data['pageKey']
+
+
+def _opensea_record(nft):
+    return {
+        'chain': 'ethereum',
+        'contract': nft.get('contract', 'unknown'),
+        'token_id': nft.get('identifier', 'unknown'),
+        'name': nft.get('name') or 'Unnamed',
+        'collection': nft.get('collection') or 'Unknown',
+        'uri': nft.get('image_url') or nft.get('display_image_url'),
+        'quantity': None,
+        'changed_at': nft.get('updated_at'),
+    }
+
+
+def iter_opensea_pages(engine, address, api_key='', page_size=200, url=OPENSEA_API):
+    """Yield lists of Ethereum token records, following OpenSea's next cursor"""
+    params = {'limit': page_size}
+    headers = {'Accept': 'application/json', 'X-API-KEY': api_key}
+    while True:
+        response = engine.request('GET', f"{url}/chain/ethereum/account/{address}/nfts",
+                                  params=params, headers=headers, timeout=30)
+        data = _json(response, 'OpenSea')
+        yield [_opensea_record(nft) for nft in data.get('nfts', [])]
+        if not data.get('next'):
+            return
+        params['next'] = data['next']
+
+
+def _simplehash_record(nft):
+    return {
+        'chain': nft.get('chain', 'ethereum'),
+        'contract': nft.get('contract_address', 'unknown'),
+        'token_id': nft.get('token_id', 'unknown'),
+        'name': nft.get('name') or 'Unnamed',
+        'collection': (nft.get('collection') or {}).get('name') or 'Unknown',
+        'uri': nft.get('image_url') or (nft.get('previews') or {}).get('image_large_url'),
+        'quantity': None,
+        'changed_at': None,
+    }
+
+
+def iter_simplehash_pages(engine, address, api_key='', url=SIMPLEHASH_API):
+    """Yield lists of Ethereum/Polygon token records, following SimpleHash's next_cursor"""
+    params = {'chains': 'ethereum,polygon', 'wallet_addresses': address}
+    headers = {'Accept': 'application/json', 'X-API-KEY': api_key}
+    while True:
+        response = engine.request('GET', f"{url}/nfts/owners", params=params, headers=headers, timeout=30)
+        data = _json(response, 'SimpleHash')
+        yield [_simplehash_record(nft) for nft in data.get('nfts', [])]
+        if not data.get('next_cursor'):
+            return
+        params['cursor'] = data['next_cursor']
+
+
+# ---------------------------------------------------------------------------
+# Manifest
+# ---------------------------------------------------------------------------
+
+class SyncManifest:
+    """
+    Tokens seen per wallet, their media URIs and where they were saved
+
+    Token entries:
+        chain, contract, token_id, name, collection, uri, quantity, changed_at
+        path       File relative to the output dir (None until downloaded)
+        status     'pending', 'ok', 'failed', 'corrupt' or 'no_media'
+        wallets    Wallet keys ('tezos:tz1...') currently holding the token
+        last_seen  When a listing last returned the token (unix time)
+        replace    Set when the media URI changed: the file on disk is the old
+                   media and must be overwritten (cleared once downloaded)
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.path = os.path.join(output_dir, '.sync', 'manifest.json')
+        self.lock = threading.RLock()
+        self.wallets = {}
+        self.tokens = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == MANIFEST_VERSION:
+                    self.wallets = data.get('wallets', {})
+                    self.tokens = data.get('tokens', {})
+            except (OSError, ValueError):
+                pass
+
+    def save(self):
+        # Written under the lock so concurrent saves (one per wallet) can't land out of order
+        with self.lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': MANIFEST_VERSION, 'wallets': self.wallets,
+                           'tokens': self.tokens}, f)
+            os.replace(tmp_path, self.path)
+
+    def wallet(self, key):
+        """Sync state for a wallet: {'cursor', 'last_sync', 'tokens'}"""
+        with self.lock:
+            return dict(self.wallets.get(key, {}))
+
+    def update_wallet(self, key, **state):
+        with self.lock:
+            self.wallets.setdefault(key, {}).update(state)
+
+    def update(self, record, wallet):
+        """
+        Merge a listing record; returns True if the token is new or its media changed
+
+        A changed media URI resets the entry so the new media gets downloaded
+        over the old file.
+        """
+        key = token_key(record)
+        with self.lock:
+            entry = self.tokens.get(key)
+            changed = entry is None or entry.get('uri') != record['uri']
+            if changed:
+                old = entry
+                entry = dict(record, path=None, wallets=old['wallets'] if old else [],
+                             status='pending' if record['uri'] else 'no_media')
+                if old is not None:
+                    entry['replace'] = True
+                self.tokens[key] = entry
+            else:
+                entry.update(record)
+            if wallet not in entry['wallets']:
+                entry['wallets'].append(wallet)
+            entry['last_seen'] = time.time()
+            return changed
+
+    def retire(self, wallet, seen_keys):
+        """After a full listing: drop the wallet from tokens it no longer holds"""
+        with self.lock:
+            for key, entry in self.tokens.items():
+                if wallet in entry['wallets'] and key not in seen_keys:
+                    entry['wallets'].remove(wallet)
+
+    def tokens_for(self, wallet):
+        with self.lock:
+            return {k: e for k, e in self.tokens.items() if wallet in e['wallets']}
+
+    def is_current(self, key, uri):
+        """Token is known with this URI and its file is on disk"""
+        with self.lock:
+            entry = self.tokens.get(key)
+        return bool(entry and entry.get('uri') == uri and not self.needs_download(entry))
+
+    def needs_download(self, entry):
+        if not entry.get('uri'):
+            return False
+        if entry.get('status') != 'ok' or not entry.get('path'):
+            return True
+        return not os.path.exists(os.path.join(self.output_dir, entry['path']))
+
+    def find(self, uri=None, path=None):
+        """Copies of the token entries with this media URI or saved file (absolute path)"""
+        if path is not None:
+            path = os.path.relpath(path, self.output_dir)
+        with self.lock:
+            return {k: dict(e) for k, e in self.tokens.items()
+                    if (uri is None or e.get('uri') == uri) and (path is None or e.get('path') == path)}
+
+    def replacing(self, key):
+        """True if the token's file on disk is stale media to overwrite"""
+        with self.lock:
+            return bool(self.tokens.get(key, {}).get('replace'))
+
+    def set_status(self, key, status):
+        with self.lock:
+            if key in self.tokens:
+                self.tokens[key]['status'] = status
+
+    def record_download(self, key, path):
+        """Mark a token downloaded to path (absolute), or failed if path is None"""
+        with self.lock:
+            entry = self.tokens.get(key)
+            if entry is None:
+                return
+            if path:
+                entry['status'] = 'ok'
+                entry['path'] = os.path.relpath(path, self.output_dir)
+                entry.pop('replace', None)
+            else:
+                entry['status'] = 'failed'
@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+"""
+NFT Transfer Engine
+Concurrent HTTP downloads with pooled keep-alive sessions, per-host
+concurrency and token-bucket rate limits, jittered retries and throughput stats
+"""
+
+import copy
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# Statuses worth retrying: throttling and transient server/gateway errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class IncompleteDownload(Exception):
+    """The body ended before the length the server announced"""
+
+
+class ResumeMismatch(IncompleteDownload):
+    """The server answered a Range request from the wrong offset"""
+
+
+def parse_content_range(value):
+    """(start, total) from 'bytes 100-199/1000'; total is None when '*'"""
+    try:
+        unit, spec = value.split(' ', 1)
+        span, total = spec.split('/', 1)
+        start = int(span.split('-', 1)[0])
+        return start, (int(total) if total != '*' else None)
+    except (AttributeError, ValueError):
+        return None, None
+
+
+def write_stream(response, part_path, offset=0, chunk_size=65536, stats=None, inspect=None,
+                 bandwidth=None):
+    """
+    Stream a response into a .part file, resuming at offset when it is a 206
+
+    A 200 means the server ignored the Range header, so the file starts over.
+    Raises IncompleteDownload if the body is shorter or longer than the
+    announced length; the .part file is kept so the next attempt can resume.
+    Returns the size of the .part file.
+
+    Args:
+        inspect: Called as inspect(first_chunk, response) before anything is
+                 written to a fresh file; raise to reject the response
+        bandwidth: TokenBucket of bytes per second to pace the stream with
+    """
+    if response.status_code == 206:
+        start, total = parse_content_range(response.headers.get('Content-Range'))
+        if start != offset:
+            raise ResumeMismatch(f"Server resumed at byte {start}, expected {offset}")
+        mode = 'ab'
+    else:
+        offset = 0
+        mode = 'wb'
+        total = None
+        # Content-Length is the encoded size when the body is compressed in transit
+        if response.headers.get('Content-Encoding', 'identity') == 'identity':
+            length = response.headers.get('Content-Length', '')
+            total = int(length) if length.isdigit() else None
+
+    size = offset
+    chunks = response.iter_content(chunk_size=chunk_size)
+    if inspect is not None and mode == 'wb':
+        # Look before opening, so a rejected body never touches the disk
+        first = next(chunks, b'')
+        inspect(first, response)
+        chunks = itertools.chain([first], chunks)
+
+    with open(part_path, mode) as f:
+        for chunk in chunks:
+            f.write(chunk)
+            size += len(chunk)
+            if stats is not None:
+                stats.add_bytes(len(chunk))
+            if bandwidth is not None:
+                bandwidth.acquire(len(chunk))
+
+    if total is not None and size != total:
+        raise IncompleteDownload(f"Got {size} of {total} bytes")
+    return size
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, bursts up to `burst`"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate or 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1.0):
+        """
+        Take tokens, sleeping until they are available
+
+        Requests larger than the burst size are allowed: the bucket goes into
+        debt and later callers wait it off, so large byte counts still pace
+        correctly.
+        """
+        if not self.rate:
+            return 0.0
+
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, honouring Retry-After"""
+
+    def __init__(self, attempts=4, base=0.5, cap=30.0):
+        self.attempts = attempts
+        self.base = base
+        self.cap = cap
+
+    def delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                return min(self.cap, float(retry_after))
+        return random.uniform(0, min(self.cap, self.base * (2 ** attempt)))
+
+
+class TransferStats:
+    """Thread-safe counters for files, bytes received and request latency"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.started = time.monotonic()
+            self.files = {'ok': 0, 'linked': 0, 'skipped': 0, 'failed': 0}
+            self.bytes = 0
+            self.requests = 0
+            self.retries = 0
+            self.latencies = []
+            self.file_latencies = []
+
+    def record_request(self, seconds, retried=False):
+        with self.lock:
+            self.requests += 1
+            self.latencies.append(seconds)
+            if retried:
+                self.retries += 1
+
+    def record_file(self, status, seconds=None):
+        """Count a finished file; seconds is its wall time from start to finish"""
+        with self.lock:
+            self.files[status] = self.files.get(status, 0) + 1
+            if seconds is not None:
+                self.file_latencies.append(seconds)
+
+    def add_bytes(self, size):
+        with self.lock:
+            self.bytes += size
+
+    def _percentile(self, values, pct):
+        if not values:
+            return 0.0
+        values = sorted(values)
+        idx = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+        return values[idx]
+
+    def report(self):
+        """Summary dict: counts, bytes, throughput, request and per-file latency percentiles"""
+        with self.lock:
+            elapsed = max(time.monotonic() - self.started, 1e-9)
+            done = self.files['ok']
+            return {
+                'files': dict(self.files),
+                'bytes': self.bytes,
+                'elapsed_s': elapsed,
+                'files_per_s': done / elapsed,
+                'bytes_per_s': self.bytes / elapsed,
+                'requests': self.requests,
+                'retries': self.retries,
+                'latency_p50_s': self._percentile(self.latencies, 50),
+                'latency_p95_s': self._percentile(self.latencies, 95),
+                'latency_p99_s': self._percentile(self.latencies, 99),
+                'file_p50_s': self._percentile(self.file_latencies, 50),
+                'file_p95_s': self._percentile(self.file_latencies, 95),
+                'file_p99_s': self._percentile(self.file_latencies, 99),
+            }
+
+    def print_report(self):
+        r = self.report()
+        mb = r['bytes'] / (1024 * 1024)
+        print(f"\n📊 {r['files']['ok']} downloaded, {r['files']['linked']} linked from the media store, "
+              f"{r['files']['skipped']} skipped, {r['files']['failed']} failed")
+        print(f"   {mb:.2f}MB in {r['elapsed_s']:.1f}s "
+              f"({r['files_per_s']:.2f} files/s, {r['bytes_per_s'] / (1024 * 1024):.2f}MB/s)")
+        print(f"   Request latency p50 {r['latency_p50_s'] * 1000:.0f}ms, "
+              f"p95 {r['latency_p95_s'] * 1000:.0f}ms ({r['retries']} retried)")
+        if r['files']['ok']:
+            print(f"   Per-file time p50 {r['file_p50_s'] * 1000:.0f}ms, "
+                  f"p95 {r['file_p95_s'] * 1000:.0f}ms, p99 {r['file_p99_s'] * 1000:.0f}ms")
+
+
+class _Host:
+    """Pooled session, concurrency slots and rate limit for one host"""
+
+    def __init__(self, concurrency, rate, user_agent):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers['User-Agent'] = user_agent
+        self.slots = threading.BoundedSemaphore(max(1, concurrency))
+        self.bucket = TokenBucket(rate)
+
+
+class DownloadEngine:
+    """
+    Shared HTTP machinery for the NFT downloader
+
+    Every request goes through a keep-alive session for its host, waits for a
+    free per-host slot and a rate-limit token, and is retried with jittered
+    backoff on connection errors, timeouts, 429 and 5xx responses.
+    """
+
+    def __init__(self, max_workers=8, per_host_concurrency=4, per_host_rate=8.0,
+                 hosts=None, retry=None, timeout=60, user_agent='glitch-nft-downloader/1.0',
+                 bandwidth_mb_s=0):
+        """
+        Args:
+            max_workers: Files downloaded in parallel
+            per_host_concurrency: Open requests allowed per host
+            per_host_rate: Requests per second allowed per host (0 = unlimited)
+            hosts: Per-host overrides, e.g. {'ipfs.io': {'concurrency': 2, 'rate': 4}}
+            retry: RetryPolicy
+            timeout: Seconds to wait for a response (connect and between bytes)
+            bandwidth_mb_s: Download bandwidth cap across all files (0 = unlimited)
+        """
+        self.max_workers = max_workers
+        self.per_host_concurrency = per_host_concurrency
+        self.per_host_rate = per_host_rate
+        self.host_overrides = hosts or {}
+        self.retry = retry or RetryPolicy()
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.stats = TransferStats()
+        bandwidth = bandwidth_mb_s * 1024 * 1024
+        self.bandwidth = TokenBucket(bandwidth) if bandwidth else None
+        self._hosts = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='download')
+
+    @classmethod
+    def from_config(cls, config):
+        """Build from the 'download' section of config.json"""
+        config = dict(config or {})
+        retry = RetryPolicy(**config.pop('retry', {}))
+        return cls(retry=retry, **config)
+
+    def child(self):
+        """
+        Engine sharing this one's sessions, limits, bandwidth and workers, with its own stats
+
+        For running several syncs at once under one budget while reporting
+        each separately.
+        """
+        child = copy.copy(self)
+        child.stats = TransferStats()
+        return child
+
+    def _host(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                override = self.host_overrides.get(host, {})
+                self._hosts[host] = _Host(
+                    override.get('concurrency', self.per_host_concurrency),
+                    override.get('rate', self.per_host_rate),
+                    self.user_agent,
+                )
+            return self._hosts[host]
+
+    def _send(self, host, method, url, attempts=None, **kwargs):
+        """Send with retries; returns the last response (caller checks status)"""
+        kwargs.setdefault('timeout', self.timeout)
+        attempts = attempts or self.retry.attempts
+        last_error = None
+
+        for attempt in range(attempts):
+            host.bucket.acquire()
+            start = time.monotonic()
+            try:
+                response = host.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.stats.record_request(time.monotonic() - start, retried=attempt > 0)
+                last_error = e
+                if attempt + 1 < attempts:
+                    time.sleep(self.retry.delay(attempt))
+                continue
+
+            self.stats.record_request(time.monotonic() - start, retried=attempt > 0)
+            if response.status_code in RETRY_STATUSES and attempt + 1 < attempts:
+                delay = self.retry.delay(attempt, response)
+                response.close()
+                time.sleep(delay)
+                continue
+            return response
+
+        raise last_error
+
+    def request(self, method, url, **kwargs):
+        """Retried request for API calls (body read before the host slot is released)"""
+        host = self._host(url)
+        with host.slots:
+            response = self._send(host, method, url, **kwargs)
+            response.content  # Read the body while holding the slot
+            return response
+
+    @contextmanager
+    def stream(self, url, headers=None, attempts=None):
+        """
+        Open a streaming GET, holding a host slot until the block exits
+
+        Args:
+            attempts: Override the retry policy's attempt count (1 = no retries)
+        """
+        host = self._host(url)
+        with host.slots:
+            response = self._send(host, 'GET', url, attempts=attempts, stream=True, headers=headers)
+            try:
+                yield response
+            finally:
+                response.close()
+
+    def run(self, fn, items):
+        """
+        Call fn(item) for every item on the worker pool, returning results in order
+
+        The pool is shared with child engines, so concurrent runs queue for
+        the same max_workers threads.
+        """
+        items = list(items)
+        if not items:
+            return []
+        return list(self._pool.map(fn, items))
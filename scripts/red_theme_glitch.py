@@ -7,6 +7,7 @@ Create red/blood/crimson themed glitch art for competitions
 import sys
 sys.path.append('..')
 from src.glitch_effects import GlitchArtist
+from src import tone
 from PIL import Image, ImageEnhance
 import numpy as np
 import sys
@@ -140,12 +141,14 @@ def red_glitch_static(input_path, output_path=None, red_intensity=0.5):
     # Enhance red channel
     img_array = np.array(glitched)
     
-    # Boost red, reduce green and blue
-    img_array[:, :, 0] = np.clip(img_array[:, :, 0] * (1 + red_intensity), 0, 255)  # Red
-    img_array[:, :, 1] = np.clip(img_array[:, :, 1] * (1 - red_intensity * 0.5), 0, 255)  # Green
-    img_array[:, :, 2] = np.clip(img_array[:, :, 2] * (1 - red_intensity * 0.5), 0, 255)  # Blue
+    # Boost red, reduce green and blue (uint8 lookup tables, in place)
+    tone.scale_channels(img_array, (
+        1 + red_intensity,        # Red
+        1 - red_intensity * 0.5,  # Green
+        1 - red_intensity * 0.5,  # Blue
+    ))
     
-    result = Image.fromarray(img_array.astype(np.uint8))
+    result = Image.fromarray(img_array)
     result.save(output_path)
     
     print(f"✅ Saved: {output_path}")
@@ -185,18 +188,17 @@ def red_scraperboard_glitch(input_path, output_path=None):
     img_array = np.array(glitched)
     
     # Create red tint (keep whites, tint grays/blacks red)
-    red_tint = np.zeros_like(img_array)
-    red_tint[:, :, 0] = 255  # Red channel full
-    red_tint[:, :, 1] = img_array[:, :, 1] // 3  # Reduce green
-    red_tint[:, :, 2] = img_array[:, :, 2] // 3  # Reduce blue
+    third = (np.arange(256) // 3).astype(np.uint8)
+    red_tint = [
+        np.full(256, 255, dtype=np.uint8),  # Red channel full
+        third,  # Reduce green
+        third,  # Reduce blue
+    ]
     
-    # Blend based on brightness
-    brightness = np.mean(img_array, axis=2, keepdims=True)
-    blend_factor = np.clip(1 - brightness / 255, 0, 0.7)
+    # Blend based on brightness (fixed-point, in place)
+    tone.brightness_tint(img_array, red_tint, max_blend=0.7)
     
-    result = img_array * (1 - blend_factor) + red_tint * blend_factor
-    
-    final = Image.fromarray(result.astype(np.uint8))
+    final = Image.fromarray(img_array)
     final.save(output_path)
     
     print(f"✅ Saved: {output_path}")
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Multi-Wallet NFT Sync
+Sync several Tezos and EVM wallets in one non-interactive run (e.g. from cron)
+
+Wallet listings run concurrently; their downloads share one worker pool,
+per-host limits and bandwidth cap (the "download" section of config.json),
+so adding wallets doesn't multiply the load on gateways. Progress goes to
+stderr and a JSON summary (counts, bytes, durations per wallet) to stdout.
+
+Wallets come from the "wallets" list in config.json, a --wallets file with
+the same list, or --wallet options:
+
+    "wallets": [
+        {"name": "main", "chain": "tezos", "address": "tz1..."},
+        {"chain": "evm", "address": "0x..."}
+    ],
+    "sync": {"output_dir": "my_nft_collection", "parallel_wallets": 4}
+
+Usage:
+    python scripts/sync_wallets.py
+    python scripts/sync_wallets.py --wallets wallets.json --summary logs/sync.json 2>> logs/sync.log
+    python scripts/sync_wallets.py --wallet tezos:tz1... --wallet evm:0x... --bandwidth 5
+"""
+
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from download_my_nfts import NFTDownloader
+from nft_sync import wallet_key
+import argparse
+import contextlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+
+CHAINS = ('tezos', 'evm')
+
+
+def parse_wallets(entries):
+    """Normalise wallet entries (dicts, or 'chain:address' strings)"""
+    wallets = []
+    for entry in entries:
+        if isinstance(entry, str):
+            chain, _, address = entry.partition(':')
+            entry = {'chain': chain, 'address': address}
+        chain = entry.get('chain', '').lower()
+        address = entry.get('address', '').strip()
+        if chain not in CHAINS or not address:
+            raise ValueError(f"Bad wallet entry {entry!r}: need a chain ({', '.join(CHAINS)}) and an address")
+        wallets.append({'name': entry.get('name') or address[:10], 'chain': chain, 'address': address})
+    return wallets
+
+
+def sync_one(downloader, wallet, full=False):
+    """Sync one wallet on its own fork of the downloader; returns its summary"""
+    start = time.perf_counter()
+    error = None
+    try:
+        if wallet['chain'] == 'tezos':
+            ok = downloader.download_tezos_nfts(wallet['address'], full=full)
+        else:
+            ok = downloader.download_evm_nfts(wallet['address'], full=full)
+    except Exception as e:
+        ok, error = False, f"{type(e).__name__}: {e}"
+
+    report = downloader.engine.stats.report()
+    held = downloader.manifest.tokens_for(wallet_key(wallet['chain'], wallet['address']))
+    summary = dict(wallet, ok=bool(ok), tokens=len(held), files=report['files'],
+                   bytes=report['bytes'], retries=report['retries'],
+                   duration_s=round(time.perf_counter() - start, 3))
+    if error:
+        summary['error'] = error
+    return summary
+
+
+def sync_wallets(wallets, output_dir, config, parallel=4, full=False):
+    """
+    Sync every wallet, up to `parallel` listings at a time
+
+    Returns the run summary dict.
+    """
+    started_at = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    start = time.perf_counter()
+
+    downloader = NFTDownloader(output_dir=output_dir, config=config)
+    with ThreadPoolExecutor(max_workers=max(1, parallel)) as pool:
+        results = list(pool.map(lambda w: sync_one(downloader.fork(), w, full), wallets))
+
+    # Each wallet saved as it finished; save once more so the last write is complete
+    downloader.manifest.save()
+    downloader.store.save()
+    downloader.gateways.scoreboard.save()
+
+    duration = time.perf_counter() - start
+    files = {}
+    for r in results:
+        for status, count in r['files'].items():
+            files[status] = files.get(status, 0) + count
+    total_bytes = sum(r['bytes'] for r in results)
+
+    return {
+        'started_at': started_at,
+        'duration_s': round(duration, 3),
+        'output_dir': output_dir,
+        'budget': {
+            'parallel_wallets': parallel,
+            'max_workers': downloader.engine.max_workers,
+            'per_host_concurrency': downloader.engine.per_host_concurrency,
+            'bandwidth_mb_s': config.get('download', {}).get('bandwidth_mb_s', 0),
+        },
+        'totals': {
+            'wallets': len(results),
+            'failed_wallets': sum(1 for r in results if not r['ok']),
+            'tokens': len({k for k, e in downloader.manifest.tokens.items() if e['wallets']}),
+            'files': files,
+            'bytes': total_bytes,
+            'bytes_per_s': round(total_bytes / duration, 1) if duration else 0.0,
+        },
+        'wallets': results,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sync several NFT wallets non-interactively')
+    parser.add_argument('--config', default=os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'config.json'), help='config.json with API keys and settings')
+    parser.add_argument('--wallets', default='', help='JSON file with a wallet list (overrides config.json)')
+    parser.add_argument('--wallet', action='append', default=[], metavar='CHAIN:ADDRESS',
+                        help='Wallet to sync, e.g. tezos:tz1... (repeatable; overrides the lists)')
+    parser.add_argument('--output-dir', default=None, help='Collection folder (default: my_nft_collection)')
+    parser.add_argument('--parallel', type=int, default=None, help='Wallets listed at once (default: 4)')
+    parser.add_argument('--workers', type=int, default=None, help='Files downloaded at once, across all wallets')
+    parser.add_argument('--bandwidth', type=float, default=None, help='Download cap in MB/s across all wallets')
+    parser.add_argument('--full', action='store_true', help='Re-list every holding instead of only changes')
+    parser.add_argument('--summary', default='', help='Also write the JSON summary to this file')
+    parser.add_argument('--quiet', action='store_true', help='No progress output, only the summary')
+    args = parser.parse_args()
+
+    config = {}
+    if os.path.exists(args.config):
+        with open(args.config, 'r') as f:
+            config = json.load(f)
+
+    entries = config.get('wallets', [])
+    if args.wallets:
+        with open(args.wallets, 'r') as f:
+            data = json.load(f)
+        entries = data.get('wallets', []) if isinstance(data, dict) else data
+    if args.wallet:
+        entries = args.wallet
+    try:
+        wallets = parse_wallets(entries)
+    except ValueError as e:
+        parser.error(str(e))
+    if not wallets:
+        parser.error('No wallets configured (add a "wallets" list to config.json, or use --wallets/--wallet)')
+
+    sync = config.get('sync', {})
+    download = dict(config.get('download', {}))
+    if args.workers is not None:
+        download['max_workers'] = args.workers
+    if args.bandwidth is not None:
+        download['bandwidth_mb_s'] = args.bandwidth
+    config['download'] = download
+    output_dir = args.output_dir or sync.get('output_dir', 'my_nft_collection')
+    parallel = args.parallel or sync.get('parallel_wallets', 4)
+
+    # Keep stdout for the summary
+    with contextlib.ExitStack() as stack:
+        log = stack.enter_context(open(os.devnull, 'w')) if args.quiet else sys.stderr
+        stack.enter_context(contextlib.redirect_stdout(log))
+        summary = sync_wallets(wallets, output_dir, config, parallel=parallel, full=args.full)
+
+    text = json.dumps(summary, indent=2)
+    print(text)
+    if args.summary:
+        os.makedirs(os.path.dirname(args.summary) or '.', exist_ok=True)
+        with open(args.summary, 'w') as f:
+            f.write(text + '\n')
+
+    sys.exit(1 if summary['totals']['failed_wallets'] else 0)
+
+
+if __name__ == '__main__':
+    main()
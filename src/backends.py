@@ -0,0 +1,267 @@
+"""
+Kernel Backends
+Alternative implementations of GlitchArtist effects (NumPy reference and OpenCV)
+
+Each effect that has more than one implementation registers a kernel per
+backend. Kernels take a uint8 pixel array plus the effect parameters and
+return the result, which may be the input array modified in place. The
+OpenCV kernels must match the NumPy reference within the tolerance listed
+in TOLERANCE (max absolute difference per channel value).
+"""
+
+import json
+import os
+import platform
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from .tone import darken_rows
+
+try:
+    import cv2
+except ImportError:  # OpenCV is optional, the NumPy kernels always work
+    cv2 = None
+
+
+BACKENDS = ('numpy', 'opencv')
+
+# Max absolute per-value difference between the OpenCV and NumPy outputs.
+# jpeg_compression_artifacts is byte-identical when Pillow and OpenCV link
+# the same libjpeg-turbo (the case for the pip wheels); other builds may
+# differ by a few levels in flat areas.
+TOLERANCE = {
+    'wave_distortion': 0,
+    'scan_lines': 0,
+    'jpeg_compression_artifacts': 4,
+}
+
+# Parameters used by the startup micro-benchmark
+BENCH_PARAMS = {
+    'wave_distortion': {'amplitude': 10, 'frequency': 0.05, 'direction': 'horizontal'},
+    'scan_lines': {'line_height': 2, 'intensity': 0.3},
+    'jpeg_compression_artifacts': {'quality': 5, 'iterations': 3},
+}
+
+_KERNELS: Dict[str, Dict[str, Callable]] = {}
+_AUTO_CHOICE: Dict[str, str] = {}
+
+
+def register_kernel(effect: str, backend: str):
+    """Decorator registering a kernel implementation for an effect"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    def decorator(fn):
+        _KERNELS.setdefault(effect, {})[backend] = fn
+        return fn
+    return decorator
+
+
+def available_backends(effect: str) -> List[str]:
+    """Backends that can run this effect in the current environment"""
+    kernels = _KERNELS.get(effect, {})
+    return [b for b in BACKENDS if b in kernels and (b != 'opencv' or cv2 is not None)]
+
+
+def _supported(backend: str, arr: np.ndarray) -> bool:
+    """OpenCV kernels only handle uint8 images with 1-4 channels"""
+    if backend != 'opencv':
+        return True
+    channels = 1 if arr.ndim == 2 else arr.shape[2]
+    return arr.dtype == np.uint8 and channels <= 4
+
+
+def run_kernel(effect: str, arr: np.ndarray, backend: str = 'auto', **params) -> np.ndarray:
+    """
+    Run an effect kernel on a pixel array
+
+    Args:
+        effect: Effect name (a GlitchArtist method name)
+        arr: Input pixel array
+        backend: 'numpy', 'opencv' or 'auto' (pick the fastest measured backend)
+        **params: Effect parameters
+    """
+    if backend == 'auto':
+        backend = choose_backend(effect)
+    elif backend not in BACKENDS:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    if backend not in available_backends(effect) or not _supported(backend, arr):
+        backend = 'numpy'
+
+    return _KERNELS[effect][backend](arr, **params)
+
+
+def _cache_path() -> str:
+    cache_dir = os.environ.get('GLITCH_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'glitch'))
+    return os.path.join(cache_dir, 'backend_bench.json')
+
+
+def _fingerprint() -> dict:
+    """Identify the environment a benchmark result is valid for"""
+    return {
+        'numpy': np.__version__,
+        'opencv': cv2.__version__ if cv2 is not None else None,
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def benchmark_backends(effect: str, size: int = 512, repeats: int = 3) -> Dict[str, float]:
+    """Time every available backend for an effect, returning best seconds per call"""
+    rng = np.random.default_rng(0)
+    sample = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+    params = BENCH_PARAMS.get(effect, {})
+
+    timings = {}
+    for backend in available_backends(effect):
+        kernel = _KERNELS[effect][backend]
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            kernel(sample, **params)
+            best = min(best, time.perf_counter() - start)
+        timings[backend] = best
+    return timings
+
+
+def choose_backend(effect: str) -> str:
+    """
+    Pick the fastest backend for an effect
+
+    The micro-benchmark runs once per environment and the result is cached
+    in ~/.cache/glitch/backend_bench.json (or $GLITCH_CACHE_DIR). Set
+    GLITCH_BACKEND to force a backend for every 'auto' call.
+    """
+    forced = os.environ.get('GLITCH_BACKEND')
+    if forced in BACKENDS:
+        return forced
+
+    if effect in _AUTO_CHOICE:
+        return _AUTO_CHOICE[effect]
+
+    available = available_backends(effect)
+    if len(available) < 2:
+        _AUTO_CHOICE[effect] = available[0] if available else 'numpy'
+        return _AUTO_CHOICE[effect]
+
+    path = _cache_path()
+    fingerprint = _fingerprint()
+    cached = {}
+    try:
+        with open(path, 'r') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    if cached.get('fingerprint') != fingerprint:
+        cached = {'fingerprint': fingerprint, 'effects': {}}
+
+    entry = cached['effects'].get(effect)
+    if entry is None or entry.get('backend') not in available:
+        timings = benchmark_backends(effect)
+        entry = {'backend': min(timings, key=timings.get), 'timings': timings}
+        cached['effects'][effect] = entry
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(cached, f, indent=2)
+            os.replace(tmp_path, path)
+        except OSError:
+            pass  # Unwritable cache dir: just re-benchmark next process
+
+    _AUTO_CHOICE[effect] = entry['backend']
+    return entry['backend']
+
+
+# ---------------------------------------------------------------------------
+# wave_distortion
+# ---------------------------------------------------------------------------
+
+def _wave_shifts(length: int, amplitude: int, frequency: float) -> np.ndarray:
+    """Integer shift per row/column, truncated toward zero like int()"""
+    return (amplitude * np.sin(2 * np.pi * frequency * np.arange(length))).astype(np.int64)
+
+
+@register_kernel('wave_distortion', 'numpy')
+def _wave_numpy(arr, amplitude=10, frequency=0.05, direction='horizontal'):
+    output = np.zeros_like(arr)
+    height, width = arr.shape[:2]
+
+    if direction == 'horizontal':
+        for y, shift in enumerate(_wave_shifts(height, amplitude, frequency)):
+            output[y] = np.roll(arr[y], shift, axis=0)
+    else:
+        for x, shift in enumerate(_wave_shifts(width, amplitude, frequency)):
+            output[:, x] = np.roll(arr[:, x], shift, axis=0)
+
+    return output
+
+
+@register_kernel('wave_distortion', 'opencv')
+def _wave_opencv(arr, amplitude=10, frequency=0.05, direction='horizontal'):
+    height, width = arr.shape[:2]
+    xs = np.arange(width, dtype=np.int64)
+    ys = np.arange(height, dtype=np.int64)
+
+    # np.roll by s means output[i] = input[(i - s) % n]
+    if direction == 'horizontal':
+        shifts = _wave_shifts(height, amplitude, frequency)
+        map_x = (xs[None, :] - shifts[:, None]) % width
+        map_y = np.broadcast_to(ys[:, None], (height, width))
+    else:
+        shifts = _wave_shifts(width, amplitude, frequency)
+        map_x = np.broadcast_to(xs[None, :], (height, width))
+        map_y = (ys[:, None] - shifts[None, :]) % height
+
+    return cv2.remap(arr, map_x.astype(np.float32), map_y.astype(np.float32),
+                     interpolation=cv2.INTER_NEAREST)
+
+
+# ---------------------------------------------------------------------------
+# scan_lines
+# ---------------------------------------------------------------------------
+
+@register_kernel('scan_lines', 'numpy')
+def _scan_lines_numpy(arr, line_height=2, intensity=0.3):
+    return darken_rows(arr, line_height, intensity, use_opencv=False)
+
+
+@register_kernel('scan_lines', 'opencv')
+def _scan_lines_opencv(arr, line_height=2, intensity=0.3):
+    return darken_rows(arr, line_height, intensity, use_opencv=True)
+
+
+# ---------------------------------------------------------------------------
+# jpeg_compression_artifacts (expects an RGB array)
+# ---------------------------------------------------------------------------
+
+@register_kernel('jpeg_compression_artifacts', 'numpy')
+def _jpeg_numpy(arr, quality=5, iterations=3):
+    import io
+    from PIL import Image
+
+    img = Image.fromarray(arr)
+    for _ in range(iterations):
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=quality)
+        buffer.seek(0)
+        img = Image.open(buffer)
+
+    return np.array(img)
+
+
+@register_kernel('jpeg_compression_artifacts', 'opencv')
+def _jpeg_opencv(arr, quality=5, iterations=3):
+    bgr = cv2.cvtColor(arr, cv2.COLOR_RGB2BGR)
+    for _ in range(iterations):
+        ok, encoded = cv2.imencode('.jpg', bgr, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError("OpenCV JPEG encoding failed")
+        bgr = cv2.imdecode(encoded, cv2.IMREAD_COLOR)
+
+    return cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
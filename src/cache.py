@@ -0,0 +1,271 @@
+"""
+Effect Result Cache
+Content-addressed on-disk cache of GlitchArtist effect results
+
+Each result is keyed by a hash of (input key, effect name, parameters, RNG
+state), where the input key is either the hash of the source pixels or the
+key of the previous cached step. A re-run of the same chain on the same image
+therefore finds every step by key alone. Cached steps are not even loaded
+until something needs the pixels, so an unchanged prefix of the chain costs
+a few stat() calls.
+
+Effects that draw random numbers only hit when the RNG is in the same state
+(seed with random.seed / np.random.seed before running). The RNG state after
+the effect is stored with the result and restored on a hit, so later effects
+see the same random numbers as an uncached run.
+
+Usage:
+    glitcher = GlitchArtist(image_path='art.png', cache=True)
+    glitcher = GlitchArtist(image_path='art.png', cache=EffectCache(max_bytes=5 * 1024**3))
+
+or set GLITCH_EFFECT_CACHE=1 to enable the default cache for every GlitchArtist.
+"""
+
+import functools
+import hashlib
+import inspect
+import json
+import os
+import random
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+
+# Bump when an effect's output changes, so stale results are never reused
+CACHE_VERSION = 1
+
+CACHEABLE_MODES = ('L', 'RGB', 'RGBA')
+
+
+def default_cache_dir() -> str:
+    cache_dir = os.environ.get('GLITCH_CACHE_DIR',
+                               os.path.join(os.path.expanduser('~'), '.cache', 'glitch'))
+    return os.path.join(cache_dir, 'effects')
+
+
+def image_key(image: Image.Image) -> str:
+    """Content hash of an image's pixels"""
+    digest = hashlib.sha256()
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def _rng_state() -> dict:
+    """Python and NumPy global RNG state as JSON-friendly data"""
+    py_version, py_keys, py_gauss = random.getstate()
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = np.random.get_state()
+    return {
+        'python': [py_version, list(py_keys), py_gauss],
+        'numpy': [np_name, np_keys.tolist(), int(np_pos), int(np_has_gauss), float(np_gauss)],
+    }
+
+
+def _set_rng_state(state: dict):
+    py_version, py_keys, py_gauss = state['python']
+    random.setstate((py_version, tuple(py_keys), py_gauss))
+    np_name, np_keys, np_pos, np_has_gauss, np_gauss = state['numpy']
+    np.random.set_state((np_name, np.array(np_keys, dtype=np.uint32), np_pos, np_has_gauss, np_gauss))
+
+
+def _rng_digest() -> str:
+    digest = hashlib.sha256()
+    digest.update(repr(random.getstate()).encode())
+    np_state = np.random.get_state()
+    digest.update(np_state[1].tobytes())
+    digest.update(repr(np_state[2:]).encode())
+    return digest.hexdigest()
+
+
+class EffectCache:
+    """Size-bounded LRU store of effect results on disk"""
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = None, compress: bool = False):
+        """
+        Args:
+            cache_dir: Where results live (default: ~/.cache/glitch/effects
+                       or $GLITCH_CACHE_DIR/effects)
+            max_bytes: Evict least recently used results beyond this size
+                       (default: $GLITCH_CACHE_MAX_MB or 2048 MB)
+            compress: Deflate stored pixels. Glitched images are noisy and
+                      only shrink ~1.4x, at ~100x the write time, so this is
+                      off by default (results are always stored as raw uint8)
+        """
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.compress = compress
+        if max_bytes is None:
+            max_bytes = int(os.environ.get('GLITCH_CACHE_MAX_MB', 2048)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self._size = None  # Running total, computed on first write
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def chain_key(self, input_key: str, effect: str, params: dict, rng_digest: str = None) -> str:
+        """Key for applying an effect to the image identified by input_key"""
+        payload = json.dumps({
+            'version': CACHE_VERSION,
+            'input': input_key,
+            'effect': effect,
+            'params': params,
+            'rng': rng_digest,
+        }, sort_keys=True, default=repr)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _paths(self, key: str):
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.npz", f"{base}.json"
+
+    def lookup(self, key: str) -> Optional[dict]:
+        """Return a result's metadata (without loading pixels), marking it recently used"""
+        pixels_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            os.utime(pixels_path)
+            os.utime(meta_path)
+        except (OSError, ValueError):
+            return None
+        return meta
+
+    def load(self, key: str) -> Image.Image:
+        """Load a cached result's pixels"""
+        pixels_path, _ = self._paths(key)
+        with np.load(pixels_path, allow_pickle=False) as data:
+            return Image.fromarray(data['pixels'])
+
+    def store(self, key: str, image: Image.Image, rng_state: dict = None):
+        """Save a result (atomically, so concurrent readers never see partial files)"""
+        pixels_path, meta_path = self._paths(key)
+        os.makedirs(os.path.dirname(pixels_path), exist_ok=True)
+
+        tmp_pixels = f"{pixels_path}.{os.getpid()}.tmp"
+        with open(tmp_pixels, 'wb') as f:
+            save = np.savez_compressed if self.compress else np.savez
+            save(f, pixels=np.asarray(image))
+        os.replace(tmp_pixels, pixels_path)
+
+        tmp_meta = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_meta, 'w') as f:
+            json.dump({'mode': image.mode, 'size': list(image.size), 'rng': rng_state}, f)
+        os.replace(tmp_meta, meta_path)
+
+        written = os.path.getsize(pixels_path) + os.path.getsize(meta_path)
+        if self._size is None:
+            self._size = self._scan_size()
+        else:
+            self._size += written
+
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        """(mtime, bytes, paths) for every cached result"""
+        entries = []
+        for sub in os.listdir(self.cache_dir):
+            sub_dir = os.path.join(self.cache_dir, sub)
+            if not os.path.isdir(sub_dir):
+                continue
+            for name in os.listdir(sub_dir):
+                if not name.endswith('.npz'):
+                    continue
+                pixels_path = os.path.join(sub_dir, name)
+                meta_path = pixels_path[:-4] + '.json'
+                try:
+                    stat = os.stat(pixels_path)
+                    size = stat.st_size + os.path.getsize(meta_path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, size, (pixels_path, meta_path)))
+        return entries
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_bytes: int = None):
+        """Delete least recently used results until the cache is under target (default 90% of max)"""
+        if target_bytes is None:
+            target_bytes = int(self.max_bytes * 0.9)
+
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+
+        for _, size, paths in entries:
+            if total <= target_bytes:
+                break
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+
+        self._size = total
+
+    def clear(self):
+        """Delete every cached result"""
+        self.evict(target_bytes=0)
+
+
+_DEFAULT_CACHE = None
+
+
+def resolve_cache(cache) -> Optional[EffectCache]:
+    """Turn GlitchArtist's cache argument (None, True, or an EffectCache) into a cache"""
+    global _DEFAULT_CACHE
+
+    if cache is None:
+        cache = os.environ.get('GLITCH_EFFECT_CACHE') == '1'
+    if cache is True:
+        if _DEFAULT_CACHE is None:
+            _DEFAULT_CACHE = EffectCache()
+        return _DEFAULT_CACHE
+    if cache is False:
+        return None
+    return cache
+
+
+def cached_effect(randomized: bool = False):
+    """
+    Decorator for GlitchArtist effect methods
+
+    Args:
+        randomized: The effect draws from random / np.random, so the RNG state
+                    is part of the key and is restored on a hit
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(self, *args, **kwargs):
+            cache = self.cache
+            if cache is None or self.image_mode not in CACHEABLE_MODES:
+                return fn(self, *args, **kwargs)
+
+            bound = signature.bind(self, *args, **kwargs)
+            bound.apply_defaults()
+            # Every backend matches the reference within tolerance, so results are shared
+            params = {k: v for k, v in bound.arguments.items() if k not in ('self', 'backend')}
+
+            rng_digest = _rng_digest() if randomized else None
+            key = cache.chain_key(self.cache_key(), fn.__name__, params, rng_digest)
+
+            meta = cache.lookup(key)
+            if meta is not None:
+                cache.hits += 1
+                if randomized and meta.get('rng'):
+                    _set_rng_state(meta['rng'])
+                self._defer_image(key, meta['mode'])
+                return self
+
+            cache.misses += 1
+            result = fn(self, *args, **kwargs)
+            if self.image.mode in CACHEABLE_MODES:
+                cache.store(key, self.image, _rng_state() if randomized else None)
+                self._set_cache_key(key)
+            return result
+
+        return wrapper
+    return decorator
@@ -9,6 +9,8 @@ import random
 from typing import Tuple, List
 import colorsys
 
+from .instrumentation import instrumented
+
 
 class GenerativeGlitchArt:
     """Generate glitch art from scratch using procedural generation"""
@@ -18,6 +20,7 @@ class GenerativeGlitchArt:
         self.height = height
         self.image = None
     
+    @instrumented
     def create_base_gradient(self, colors: List[Tuple[int, int, int]] = None) -> Image.Image:
         """Create a gradient base image"""
         if colors is None:
@@ -52,6 +55,7 @@ class GenerativeGlitchArt:
         self.image = img
         return img
     
+    @instrumented
     def create_geometric_base(self, num_shapes: int = 50) -> Image.Image:
         """Create a base with random geometric shapes"""
         img = Image.new('RGB', (self.width, self.height), color=(0, 0, 0))
@@ -93,6 +97,7 @@ class GenerativeGlitchArt:
         self.image = img
         return img
     
+    @instrumented
     def create_noise_base(self, noise_type: str = 'color') -> Image.Image:
         """Create a noise-based image"""
         if noise_type == 'color':
@@ -124,6 +129,7 @@ class GenerativeGlitchArt:
         
         return np.array(img)
     
+    @instrumented
     def create_vaporwave_aesthetic(self) -> Image.Image:
         """Create a vaporwave-style base"""
         # Vaporwave color palette
@@ -161,6 +167,7 @@ class GenerativeGlitchArt:
         self.image = img
         return img
     
+    @instrumented
     def create_cyberpunk_aesthetic(self) -> Image.Image:
         """Create a cyberpunk-style base"""
         # Dark background with neon accents
@@ -203,6 +210,7 @@ class GenerativeGlitchArt:
         self.image = img
         return img
     
+    @instrumented
     def generate_unique_nft(self, seed: int = None, style: str = 'random') -> Image.Image:
         """
         Generate a unique NFT-ready glitch art piece
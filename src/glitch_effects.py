@@ -7,14 +7,32 @@ import numpy as np
 from PIL import Image
 import random
 from typing import Tuple, List
-import io
+
+from .backends import run_kernel
+from .cache import cached_effect, image_key, resolve_cache
+from .instrumentation import instrumented
 
 
 class GlitchArtist:
     """Main class for applying glitch effects to images"""
     
-    def __init__(self, image_path: str = None, image: Image.Image = None):
-        """Initialize with either a path or PIL Image object"""
+    def __init__(self, image_path: str = None, image: Image.Image = None,
+                 backend: str = 'auto', cache=None):
+        """
+        Initialize with either a path or PIL Image object
+        
+        Args:
+            backend: Default kernel backend for effects that have one
+                     ('numpy', 'opencv' or 'auto'), see src/backends.py
+            cache: True or an EffectCache to reuse results of earlier runs,
+                   see src/cache.py (default: on if GLITCH_EFFECT_CACHE=1)
+        """
+        self.cache = resolve_cache(cache)
+        self._pending_key = None
+        self._pending_mode = None
+        self._cache_key = None
+        self._original_key = None
+        
         if image_path:
             self.image = Image.open(image_path)
         elif image:
@@ -24,12 +42,59 @@ class GlitchArtist:
         
         self.width, self.height = self.image.size
         self.original = self.image.copy()
+        self.backend = backend
+    
+    @property
+    def image(self) -> Image.Image:
+        """
+        Current image (loads a deferred cache hit on first access)
+        
+        With the effect cache on, edit a copy and assign it back rather than
+        editing this image in place, so the cache key is recomputed.
+        """
+        if self._pending_key is not None:
+            self._image = self.cache.load(self._pending_key)
+            self._pending_key = None
+            self._pending_mode = None
+        return self._image
+    
+    @image.setter
+    def image(self, value: Image.Image):
+        self._image = value
+        self._pending_key = None
+        self._pending_mode = None
+        self._cache_key = None
+    
+    @property
+    def image_mode(self) -> str:
+        """Mode of the current image, without loading a deferred cache hit"""
+        return self._pending_mode or self._image.mode
+    
+    def cache_key(self) -> str:
+        """Content key of the current image: a pixel hash, or the chain key of the last cached effect"""
+        if self._cache_key is None:
+            self._cache_key = image_key(self.image)
+        return self._cache_key
+    
+    def _set_cache_key(self, key: str):
+        self._cache_key = key
+    
+    def _defer_image(self, key: str, mode: str):
+        """Point at a cached result without loading it yet"""
+        self._pending_key = key
+        self._pending_mode = mode
+        self._cache_key = key
     
     def reset(self):
         """Reset to original image"""
+        if self.cache is not None and self._original_key is None:
+            self._original_key = image_key(self.original)
         self.image = self.original.copy()
+        self._cache_key = self._original_key
         return self
     
+    @instrumented
+    @cached_effect()
     def pixel_sort(self, threshold: int = 128, direction: str = 'horizontal', 
                    reverse: bool = False) -> 'GlitchArtist':
         """
@@ -86,6 +151,8 @@ class GlitchArtist:
         self.image = Image.fromarray(img_array)
         return self
     
+    @instrumented
+    @cached_effect()
     def rgb_shift(self, r_shift: Tuple[int, int] = (0, 0), 
                   g_shift: Tuple[int, int] = (0, 0),
                   b_shift: Tuple[int, int] = (0, 0)) -> 'GlitchArtist':
@@ -109,23 +176,26 @@ class GlitchArtist:
         self.image = Image.fromarray(shifted.astype(np.uint8))
         return self
     
-    def scan_lines(self, line_height: int = 2, intensity: float = 0.3) -> 'GlitchArtist':
+    @instrumented
+    @cached_effect()
+    def scan_lines(self, line_height: int = 2, intensity: float = 0.3,
+                   backend: str = None) -> 'GlitchArtist':
         """
         Add CRT-style scan lines
         
         Args:
             line_height: Height of each scan line in pixels
             intensity: Darkness of scan lines (0-1)
+            backend: Kernel backend for this call (defaults to self.backend)
         """
-        img_array = np.array(self.image).astype(float)
+        img_array = run_kernel('scan_lines', np.array(self.image), backend or self.backend,
+                               line_height=line_height, intensity=intensity)
         
-        for i in range(0, self.height, line_height * 2):
-            end = min(i + line_height, self.height)
-            img_array[i:end] *= (1 - intensity)
-        
-        self.image = Image.fromarray(img_array.astype(np.uint8))
+        self.image = Image.fromarray(img_array)
         return self
     
+    @instrumented
+    @cached_effect(randomized=True)
     def data_mosh(self, corruption_rate: float = 0.01, block_size: int = 10) -> 'GlitchArtist':
         """
         Simulate data corruption by randomly corrupting blocks
@@ -169,13 +239,17 @@ class GlitchArtist:
         self.image = Image.fromarray(img_array.astype(np.uint8))
         return self
     
-    def jpeg_compression_artifacts(self, quality: int = 5, iterations: int = 3) -> 'GlitchArtist':
+    @instrumented
+    @cached_effect()
+    def jpeg_compression_artifacts(self, quality: int = 5, iterations: int = 3,
+                                   backend: str = None) -> 'GlitchArtist':
         """
         Create JPEG compression artifacts by repeatedly compressing
         
         Args:
             quality: JPEG quality (1-100, lower = more artifacts)
             iterations: Number of compression cycles
+            backend: Kernel backend for this call (defaults to self.backend)
         """
         img = self.image
         
@@ -187,17 +261,16 @@ class GlitchArtist:
         elif img.mode != 'RGB':
             img = img.convert('RGB')
         
-        for _ in range(iterations):
-            buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=quality)
-            buffer.seek(0)
-            img = Image.open(buffer)
+        img_array = run_kernel('jpeg_compression_artifacts', np.array(img), backend or self.backend,
+                               quality=quality, iterations=iterations)
         
-        self.image = img
+        self.image = Image.fromarray(img_array)
         return self
     
+    @instrumented
+    @cached_effect()
     def wave_distortion(self, amplitude: int = 10, frequency: float = 0.05, 
-                       direction: str = 'horizontal') -> 'GlitchArtist':
+                       direction: str = 'horizontal', backend: str = None) -> 'GlitchArtist':
         """
         Apply wave distortion effect
         
@@ -205,22 +278,16 @@ class GlitchArtist:
             amplitude: Wave amplitude in pixels
             frequency: Wave frequency
             direction: 'horizontal' or 'vertical'
+            backend: Kernel backend for this call (defaults to self.backend)
         """
-        img_array = np.array(self.image)
-        output = np.zeros_like(img_array)
-        
-        if direction == 'horizontal':
-            for y in range(self.height):
-                shift = int(amplitude * np.sin(2 * np.pi * frequency * y))
-                output[y] = np.roll(img_array[y], shift, axis=0)
-        else:
-            for x in range(self.width):
-                shift = int(amplitude * np.sin(2 * np.pi * frequency * x))
-                output[:, x] = np.roll(img_array[:, x], shift, axis=0)
+        output = run_kernel('wave_distortion', np.array(self.image), backend or self.backend,
+                            amplitude=amplitude, frequency=frequency, direction=direction)
         
         self.image = Image.fromarray(output)
         return self
     
+    @instrumented
+    @cached_effect(randomized=True)
     def color_channel_swap(self, swap_type: str = 'random') -> 'GlitchArtist':
         """
         Swap color channels
@@ -244,6 +311,8 @@ class GlitchArtist:
         self.image = Image.fromarray(img_array)
         return self
     
+    @instrumented
+    @cached_effect(randomized=True)
     def slice_and_shift(self, num_slices: int = 10, max_shift: int = 50) -> 'GlitchArtist':
         """
         Slice image horizontally and shift slices randomly
@@ -264,6 +333,7 @@ class GlitchArtist:
         self.image = Image.fromarray(img_array)
         return self
     
+    @instrumented
     def random_glitch_combo(self, intensity: str = 'medium') -> 'GlitchArtist':
         """
         Apply a random combination of glitch effects
@@ -327,6 +397,15 @@ class GlitchArtist:
         return self
     
     def get_image(self) -> Image.Image:
-        """Return the PIL Image object"""
+        """
+        Return the PIL Image object
+        
+        With the effect cache on this is a copy: the cache key follows the
+        effects applied, so editing the image in place would make later
+        effects return results computed from the unedited one. To apply
+        manual edits, assign the edited image back to `image`.
+        """
+        if self.cache is not None:
+            return self.image.copy()
         return self.image
 
@@ -0,0 +1,335 @@
+"""
+Effect Instrumentation
+Record wall time, CPU time, memory and image size for every effect call
+
+Usage:
+    from src.instrumentation import profile_effects
+
+    with profile_effects(track_memory=True) as prof:
+        GlitchArtist(image=base).random_glitch_combo('high')
+
+    print(prof.summary())
+    prof.save_json('profile.json')
+    prof.save_chrome_trace('trace.json')  # open in chrome://tracing or Perfetto
+
+Or without code changes, set environment variables before running a script:
+    GLITCH_PROFILE=profile.json        summary + raw records on exit
+    GLITCH_PROFILE_TRACE=trace.json    Chrome trace on exit
+    GLITCH_PROFILE_MEMORY=1            also track bytes allocated (slower)
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+import tracemalloc
+from typing import Callable, List
+
+import numpy as np
+
+
+_ACTIVE: List['EffectProfiler'] = []
+_local = threading.local()
+
+
+def _clean_params(bound: dict) -> dict:
+    """Keep only JSON-friendly parameter values"""
+    params = {}
+    for key, value in bound.items():
+        if isinstance(value, (bool, int, float, str)) or value is None:
+            params[key] = value
+        elif isinstance(value, (tuple, list)) and all(isinstance(v, (int, float)) for v in value):
+            params[key] = list(value)
+    return params
+
+
+def _param_bucket(value):
+    """Group parameter values so random floats don't all get their own bucket"""
+    if isinstance(value, float):
+        return float(f"{value:.2g}")
+    if isinstance(value, list):
+        return str(value)
+    return value
+
+
+def _histogram(durations: List[float]) -> dict:
+    """Power-of-two millisecond buckets: {'<1ms': n, '1-2ms': n, '2-4ms': n, ...}"""
+    buckets = {}
+    for seconds in durations:
+        ms = seconds * 1000
+        if ms < 1:
+            label = '<1ms'
+        else:
+            low = 2 ** int(np.floor(np.log2(ms)))
+            label = f"{low}-{low * 2}ms"
+        buckets[label] = buckets.get(label, 0) + 1
+
+    def order(label):
+        return 0 if label == '<1ms' else int(label.split('-')[0])
+
+    return {label: buckets[label] for label in sorted(buckets, key=order)}
+
+
+class EffectProfiler:
+    """Collects one record per instrumented effect call while active"""
+
+    def __init__(self, track_memory: bool = False):
+        """
+        Args:
+            track_memory: Record bytes allocated per call using tracemalloc
+                          (accurate for NumPy buffers, adds noticeable overhead)
+        """
+        self.track_memory = track_memory
+        self.records = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._started_tracemalloc = False
+
+    def start(self):
+        """Begin recording (also usable as a context manager)"""
+        if self.track_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._t0 = time.perf_counter()
+        _ACTIVE.append(self)
+        return self
+
+    def stop(self):
+        """Stop recording"""
+        if self in _ACTIVE:
+            _ACTIVE.remove(self)
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+        return self
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+        return False
+
+    def _add(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+
+    def summary(self) -> dict:
+        """
+        Aggregate records per effect
+
+        Returns {effect: {calls, total_s, mean_s, p95_s, max_s, cpu_s,
+        peak_bytes, megapixels, histogram, by_param}}, where by_param maps
+        each parameter value (floats bucketed to 2 significant figures) to
+        its call count and total time.
+        """
+        grouped = {}
+        for record in self.records:
+            grouped.setdefault(record['effect'], []).append(record)
+
+        summary = {}
+        for effect, records in grouped.items():
+            walls = [r['wall_s'] for r in records]
+            allocated = [r['bytes_allocated'] for r in records if r['bytes_allocated'] is not None]
+
+            by_param = {}
+            for r in records:
+                for key, value in r['params'].items():
+                    bucket = by_param.setdefault(key, {}).setdefault(str(_param_bucket(value)),
+                                                                     {'calls': 0, 'total_s': 0.0})
+                    bucket['calls'] += 1
+                    bucket['total_s'] += r['wall_s']
+
+            summary[effect] = {
+                'calls': len(records),
+                'total_s': float(np.sum(walls)),
+                'mean_s': float(np.mean(walls)),
+                'p95_s': float(np.percentile(walls, 95)),
+                'max_s': float(np.max(walls)),
+                'cpu_s': float(sum(r['cpu_s'] for r in records)),
+                'peak_bytes': max(allocated) if allocated else None,
+                'megapixels': float(sum(r['width'] * r['height'] for r in records) / 1e6),
+                'histogram': _histogram(walls),
+                'by_param': by_param,
+            }
+
+        return dict(sorted(summary.items(), key=lambda item: item[1]['total_s'], reverse=True))
+
+    def save_json(self, path: str):
+        """Write the summary plus every raw record"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'summary': self.summary(), 'records': self.records}, f, indent=2)
+
+    def save_chrome_trace(self, path: str):
+        """Write records in Chrome trace-event format (chrome://tracing, Perfetto)"""
+        pid = os.getpid()
+        events = []
+        for r in self.records:
+            events.append({
+                'name': r['effect'],
+                'cat': 'effect',
+                'ph': 'X',
+                'ts': r['start_s'] * 1e6,
+                'dur': r['wall_s'] * 1e6,
+                'pid': pid,
+                'tid': r['thread'],
+                'args': {
+                    'params': r['params'],
+                    'size': f"{r['width']}x{r['height']}",
+                    'mode': r['mode'],
+                    'cpu_ms': r['cpu_s'] * 1000,
+                    'bytes_allocated': r['bytes_allocated'],
+                },
+            })
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def profile_effects(track_memory: bool = False) -> EffectProfiler:
+    """Context manager recording every instrumented effect call in the block"""
+    return EffectProfiler(track_memory=track_memory)
+
+
+def _image_info(obj):
+    """(width, height, mode) of the object's current image"""
+    # GlitchArtist reports its mode without loading deferred cache hits
+    mode = getattr(obj, 'image_mode', None)
+    if mode is None:
+        image = getattr(obj, 'image', None)
+        if image is not None:
+            return image.size[0], image.size[1], image.mode
+    return getattr(obj, 'width', 0), getattr(obj, 'height', 0), mode
+
+
+def instrumented(fn: Callable) -> Callable:
+    """
+    Decorator for effect methods
+
+    Costs a single list check when no profiler is active.
+    """
+    signature = inspect.signature(fn)
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        if not _ACTIVE:
+            return fn(self, *args, **kwargs)
+
+        bound = signature.bind(self, *args, **kwargs)
+        bound.apply_defaults()
+        params = _clean_params({k: v for k, v in bound.arguments.items() if k != 'self'})
+
+        track_memory = tracemalloc.is_tracing() and any(p.track_memory for p in _ACTIVE)
+        frames = getattr(_local, 'frames', None)
+        if frames is None:
+            frames = _local.frames = []
+
+        # Nested calls (random_glitch_combo → rgb_shift) reset the tracemalloc
+        # peak, so fold each inner peak into its parent frame
+        frame = {'start_bytes': 0, 'child_peak': 0}
+        if track_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if frames:
+                frames[-1]['child_peak'] = max(frames[-1]['child_peak'], peak)
+            tracemalloc.reset_peak()
+            frame['start_bytes'] = current
+        frames.append(frame)
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            return fn(self, *args, **kwargs)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            frames.pop()
+
+            allocated = None
+            if track_memory:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                if frames:
+                    frames[-1]['child_peak'] = max(frames[-1]['child_peak'], peak)
+                allocated = max(0, peak - frame['start_bytes'])
+
+            width, height, mode = _image_info(self)
+            for profiler in list(_ACTIVE):
+                profiler._add({
+                    'effect': name,
+                    'start_s': wall_start - profiler._t0,
+                    'wall_s': wall,
+                    'cpu_s': cpu,
+                    'bytes_allocated': allocated,
+                    'width': width,
+                    'height': height,
+                    'mode': mode,
+                    'depth': len(frames),
+                    'thread': threading.get_ident(),
+                    'params': params,
+                })
+
+    return wrapper
+
+
+def profile_call(fn: Callable, *args, capture: str = 'cprofile', **kwargs):
+    """
+    Run a single call under cProfile or tracemalloc
+
+    Args:
+        fn: Callable to run, e.g. glitcher.pixel_sort
+        capture: 'cprofile' (returns pstats.Stats) or 'tracemalloc'
+                 (returns a tracemalloc.Snapshot taken at the call's end)
+
+    Returns:
+        (result, stats)
+    """
+    if capture == 'cprofile':
+        import cProfile
+        import pstats
+
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args, **kwargs)
+        return result, pstats.Stats(profiler)
+
+    if capture == 'tracemalloc':
+        was_tracing = tracemalloc.is_tracing()
+        if not was_tracing:
+            tracemalloc.start()
+        try:
+            result = fn(*args, **kwargs)
+            snapshot = tracemalloc.take_snapshot()
+        finally:
+            if not was_tracing:
+                tracemalloc.stop()
+        return result, snapshot
+
+    raise ValueError(f"Unknown capture type: {capture}")
+
+
+def _start_from_environment():
+    """Enable a process-wide profiler when GLITCH_PROFILE* variables are set"""
+    json_path = os.environ.get('GLITCH_PROFILE')
+    trace_path = os.environ.get('GLITCH_PROFILE_TRACE')
+    if not json_path and not trace_path:
+        return None
+
+    profiler = EffectProfiler(track_memory=os.environ.get('GLITCH_PROFILE_MEMORY') == '1')
+    profiler.start()
+
+    def dump():
+        profiler.stop()
+        if json_path:
+            profiler.save_json(json_path)
+        if trace_path:
+            profiler.save_chrome_trace(trace_path)
+
+    atexit.register(dump)
+    return profiler
+
+
+ENV_PROFILER = _start_from_environment()
@@ -0,0 +1,152 @@
+"""
+Tone Operations
+In-place uint8 tone adjustments using lookup tables and fixed-point blends
+
+Scaling a channel by a constant factor (and truncating like the float code it
+replaces) only has 256 possible inputs, so it is a 256-entry lookup table.
+Applying LUTs to the uint8 pixels in place avoids the float64 copies
+(8x the image size) that np.clip(arr * factor, 0, 255) creates.
+
+Every function modifies the array it is given and returns it.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+
+try:
+    import cv2
+except ImportError:  # NumPy fallback below
+    cv2 = None
+
+
+# Rows processed per step by the NumPy fallbacks, bounding temporaries to a strip
+CHUNK_ROWS = 256
+
+
+def scale_lut(factor: float) -> np.ndarray:
+    """LUT for value * factor, clipped to 0-255 and truncated (same as the float path)"""
+    return np.clip(np.floor(np.arange(256) * factor), 0, 255).astype(np.uint8)
+
+
+def identity_lut() -> np.ndarray:
+    return np.arange(256, dtype=np.uint8)
+
+
+def _channels(arr: np.ndarray) -> int:
+    return 1 if arr.ndim == 2 else arr.shape[2]
+
+
+def _use_opencv(use_opencv: Optional[bool]) -> bool:
+    return cv2 is not None if use_opencv is None else (use_opencv and cv2 is not None)
+
+
+def apply_luts(arr: np.ndarray, luts: Sequence[Optional[np.ndarray]],
+               use_opencv: bool = None) -> np.ndarray:
+    """
+    Map each channel through its own 256-entry LUT, in place
+
+    Args:
+        arr: uint8 array (H, W) or (H, W, C)
+        luts: One LUT per channel (None leaves that channel unchanged).
+              Channels beyond len(luts), e.g. alpha, are left unchanged.
+        use_opencv: Use cv2.LUT (default: when OpenCV is installed)
+    """
+    if arr.dtype != np.uint8:
+        raise ValueError("Tone operations need a uint8 array")
+
+    channels = _channels(arr)
+    luts = [luts[c] if c < len(luts) else None for c in range(channels)]
+    if all(lut is None for lut in luts):
+        return arr
+
+    if _use_opencv(use_opencv) and channels in (1, 3, 4) and arr.flags['C_CONTIGUOUS']:
+        table = np.stack([lut if lut is not None else identity_lut() for lut in luts], axis=1)
+        table = table.reshape(256, 1, channels) if channels > 1 else table.reshape(256)
+        cv2.LUT(arr, table, dst=arr)
+        return arr
+
+    for start in range(0, arr.shape[0], CHUNK_ROWS):
+        strip = arr[start:start + CHUNK_ROWS]
+        if channels == 1 and arr.ndim == 2:
+            strip[...] = luts[0][strip]
+            continue
+        for c, lut in enumerate(luts):
+            if lut is not None:
+                strip[..., c] = lut[strip[..., c]]
+    return arr
+
+
+def scale_channels(arr: np.ndarray, factors: Sequence[float], use_opencv: bool = None) -> np.ndarray:
+    """
+    Boost or cut channels by constant factors, in place
+
+    Matches np.clip(arr[..., c] * factor, 0, 255) written back to uint8 exactly.
+
+    Args:
+        factors: One factor per channel, e.g. (1.5, 0.5, 0.5) for a red boost
+    """
+    return apply_luts(arr, [scale_lut(f) if f != 1 else None for f in factors], use_opencv)
+
+
+def darken_rows(arr: np.ndarray, line_height: int = 2, intensity: float = 0.3,
+                use_opencv: bool = None) -> np.ndarray:
+    """
+    CRT scan lines: darken line_height rows out of every 2 * line_height, in place
+
+    Matches the float path (value * (1 - intensity), truncated) exactly,
+    across every channel including alpha.
+    """
+    lut = scale_lut(1 - intensity)
+    height = arr.shape[0]
+    opencv = _use_opencv(use_opencv)
+
+    for i in range(0, height, line_height * 2):
+        band = arr[i:min(i + line_height, height)]
+        if opencv and band.flags['C_CONTIGUOUS'] and _channels(band) <= 4:
+            cv2.LUT(band, lut, dst=band)
+        else:
+            band[...] = lut[band]
+    return arr
+
+
+def brightness_tint(arr: np.ndarray, tint_luts: Sequence[np.ndarray],
+                    max_blend: float = 0.7) -> np.ndarray:
+    """
+    Blend toward a tint in dark areas, in place
+
+    Each pixel moves toward its tint by blend = min(max_blend, 1 - brightness / 255),
+    where brightness is the mean of all channels (alpha included, as in the
+    original float code). The tint for channel c is tint_luts[c][value of
+    channel c], so tints can be constant (a LUT full of 255) or derived from
+    the pixel (value // 3); channels without a LUT blend toward 0.
+
+    Uses 8-bit fixed-point weights on uint16 strips instead of float64
+    full-frame copies. Results are within 1 level of the float formula.
+    """
+    if arr.dtype != np.uint8 or arr.ndim != 3 or arr.shape[2] < 3:
+        raise ValueError("brightness_tint needs a uint8 RGB(A) array")
+
+    channels = arr.shape[2]
+    zero = np.zeros(256, dtype=np.uint8)
+    luts = [tint_luts[c] if c < len(tint_luts) else zero for c in range(channels)]
+
+    # Weight (out of 256) for every possible channel sum 0..255 * channels
+    full = 255 * channels
+    weight_lut = np.round(np.clip(1 - np.arange(full + 1) / full, 0, max_blend) * 256).astype(np.uint16)
+
+    for start in range(0, arr.shape[0], CHUNK_ROWS):
+        strip = arr[start:start + CHUNK_ROWS]
+        channel_sum = strip[..., 0].astype(np.uint16)
+        for c in range(1, channels):
+            channel_sum += strip[..., c]
+        weight = weight_lut[channel_sum]
+        keep = 256 - weight
+
+        for c, lut in enumerate(luts):
+            value = strip[..., c]
+            blended = value * keep  # uint16: 255 * 256 fits
+            blended += lut[value].astype(np.uint16) * weight
+            blended >>= 8
+            strip[..., c] = blended
+    return arr